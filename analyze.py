@@ -1,102 +1,343 @@
-from database import get_db, get_habit_data, get_completion_data
-from datetime import datetime, timedelta
+from collections import Counter
+from datetime import date, timedelta
+from database import DEFAULT_USER, get_habit_data, get_habit_periods, get_data_version
+from periods import day_number, parse_periodicity, period_index
+from streaks import gap_lengths, period_runs
 from habit import Habit
 
 
-def list_tracked_habits(db):
+def list_tracked_habits(db, user=DEFAULT_USER):
     """
     Function that return a list of all tracked habits from the database
     :param: db Sqlite database connection object
+    :param user: the user owning the habits
     :returns: list of habits.
     """
     cur = db.cursor()
-    # Query to get all habit names from the Habits table
-    cur.execute("SELECT habit_name FROM habits")
+    # Query to get all habit names of the user from the Habits table
+    cur.execute("SELECT habit_name FROM habits WHERE user_id = ?", (user,))
     habits = cur.fetchall()
     return [habit[0] for habit in habits]
 
-def list_habit_by_periodicity(db,periodicity):
+def list_habit_by_periodicity(db,periodicity,user=DEFAULT_USER):
     """
-    Function that returns habits filtered by their periodicity (daily or weekly)
+    Function that returns habits filtered by their periodicity (daily, weekly, ...)
 
-    :param periodicity:"daily" or "weekly"
+    :param periodicity: a periodicity spec, see periods.parse_periodicity
     :param db: Sqlite database connection object
+    :param user: the user owning the habits
     :return: List of habit names that match the periodicity
     """
 
+    periodicity = parse_periodicity(periodicity).spec # the form stored in the habits table
     cur = db.cursor()
     # Query to fetch habits based on periodicity
-    cur.execute("SELECT habit_name FROM Habits WHERE periodicity = ?", (periodicity,))
+    cur.execute("SELECT habit_name FROM Habits WHERE user_id = ? AND periodicity = ?", (user, periodicity))
     habits = cur.fetchall()
     # Convert list of tuples to a flat list
     return [habit[0] for habit in habits]
 
-def longest_historical_streak_for_habit(db,habit_name):
+def longest_historical_streak_for_habit(db,habit_name,user=DEFAULT_USER):
     """
-    Function that calculates the longest historical streak for a habit.
+    Function that returns the longest historical streak for a habit.
+    A streak is a run of consecutive periods (days or weeks) with at least one completion,
+    it is read from the streak cache that database.add_completion_date keeps up to date.
     :param db: Sqlite database connection object
     :param habit_name : Name of the habit to be calculated the longest streak
+    :param user: the user owning the habit
     :returns: the longest historical streak of consecutive completions for the habit.
     """
-    # Fetch habit details from database
-    habit_data = get_habit_data(db,habit_name)
+    cur = db.cursor()
+    cur.execute("SELECT longest_streak FROM habits WHERE user_id = ? AND habit_name = ?", (user, habit_name))
+    habit_data = cur.fetchone()
     if not habit_data:
         return 0 # Habit not found
 
-    periodicity = habit_data [2]
-
-    # Retrieve completions dates
-    completions = get_completion_data(db,habit_name)
-    if not completions:
-        return 0 # No completions, no longest streak
-
-    # Sort completion dates and convert to datetime objects
-    completion_dates = sorted(datetime.fromisoformat(date[0]) for date in completions)
+    return habit_data[0]
 
-    # Define the time interval to check consecutive completions
-    # if daily we check 1 day, if weekly we will check 1 week
-    delta = timedelta(days=1) if periodicity == 'daily' else timedelta(weeks=1)
-
-    # Initialize the variables to track the longest and the current streaks
-    longest_streak = current_streak = 1
-    # Loop trough completions dates to check if it keeps the interval defined by the periodicity
-    for i in range(1,len(completion_dates)):
-        if completion_dates[i] - completion_dates[i-1] <= delta:
-            current_streak += 1
-        else:
-            current_streak = 1
-
-        #update longest_streak if the current streak exceed the longest previous streak
-        longest_streak = max(longest_streak, current_streak)
-
-    return longest_streak
+def longest_streaks(db, user=DEFAULT_USER):
+    """
+    Function that returns the longest historical streak of every habit in a single query,
+    read from the streak cache of the habits table.
+    :param db: Sqlite database connection object
+    :param user: the user owning the habits
+    :returns: dict mapping each habit name to its longest historical streak
+    """
+    cur = db.cursor()
+    cur.execute("SELECT habit_name, longest_streak FROM habits WHERE user_id = ? ORDER BY habit_name", (user,))
+    return dict(cur.fetchall())
 
-def longest_historical_streak(db):
+def longest_historical_streak(db, user=DEFAULT_USER):
     """
     Function that calculates the longest historical streak across all tracked habits
     :param db: Sqlite database connection object
+    :param user: the user owning the habits
     :returns: the longest historical streak among all habits and the name of that habit
     """
-    # Get all tracked habits names
-    cur = db.cursor()
-    cur.execute("SELECT habit_name FROM habits")
-    habits = cur.fetchall()
+    # Get the longest streak of every habit in one pass
+    streaks = longest_streaks(db, user)
 
-    if not habits:
+    if not streaks:
         return 0 , None # No habits found
 
     # initialize the variable to track the longest streak across all habits
     longest_streak = 0
     longest_streak_habit = None
 
-    # calculate the longest streak for each habit and update the max found.
-    for habit in habits:
-        habit_name = habit[0]
-        habit_streak = longest_historical_streak_for_habit(db,habit_name)
-
+    # update the max found with each habit's streak
+    for habit_name, habit_streak in streaks.items():
         # Update the longest streak if the current habit's streak is higher
         if habit_streak > longest_streak:
             longest_streak = habit_streak
             longest_streak_habit = habit_name
 
     return longest_streak, longest_streak_habit
+
+def streak_details(db, habit_name, backend=None, user=DEFAULT_USER):
+    """
+    Function that analyzes the whole completion history of a habit: its runs of consecutive
+    periods, the gaps between them and the current and longest streaks.
+    It reads the habit_periods rollup, one row per completed period, and the run-length
+    encoding is vectorized with NumPy for long histories when it is installed.
+    :param db: Sqlite database connection object
+    :param habit_name: name of the habit
+    :param backend: "numpy" or "python", defaults to streaks.BACKEND for long histories
+    :param user: the user owning the habit
+    :returns: dict with current_streak, longest_streak, runs (list of (first_period, length))
+              and gaps (list of missed periods between runs), or None if the habit doesn't exist
+    """
+    habit_data = get_habit_data(db, habit_name, user)
+    if not habit_data:
+        return None # Habit not found
+
+    periods = [period for period, _ in get_habit_periods(db, habit_name, user)]
+    runs = period_runs(periods, backend)
+
+    return {
+        "current_streak": runs[-1][1] if runs else 0,
+        "longest_streak": max((length for _, length in runs), default=0),
+        "runs": runs,
+        "gaps": gap_lengths(periods, backend),
+    }
+
+def completion_histogram(db, habit_name, user=DEFAULT_USER):
+    """
+    Function that counts how many periods (days or weeks) of a habit were completed once,
+    twice, and so on, from the habit_periods rollup.
+    :param db: Sqlite database connection object
+    :param habit_name: name of the habit
+    :param user: the user owning the habit
+    :returns: dict mapping a number of completions in a period to the number of periods
+              with that many completions, in ascending order
+    """
+    histogram = Counter(count for _, count in get_habit_periods(db, habit_name, user))
+    return dict(sorted(histogram.items()))
+
+
+""" Time-windowed analytics: each function reads every habit in one aggregate query """
+
+def _current_periods(db, today, user):
+    """
+    Returns the index of the period of today in each periodicity of the user's habits,
+    the latest periods of the windows, as a CTE named current(periodicity, period)
+    :param today: date of the end of the windows, defaults to the current date
+    :returns: (SQL of the CTE, its parameters), (None, ()) when the user has no habits
+    """
+    day = day_number(today or date.today())
+    cur = db.cursor()
+    cur.execute("SELECT DISTINCT periodicity FROM habits WHERE user_id = ?", (user,))
+    current = [(periodicity, period_index(day, periodicity)) for periodicity, in cur]
+    if not current:
+        return None, ()
+    sql = f"current(periodicity, period) AS (VALUES {', '.join(['(?, ?)'] * len(current))})"
+    return sql, tuple(value for row in current for value in row)
+
+def completion_rates(db, periods=7, today=None, user=DEFAULT_USER):
+    """
+    Function that returns the completion rate of every habit over its last periods
+    (days for daily habits, weeks for weekly habits and so on, the current one included):
+    the share of those periods with at least one completion. Periods before the
+    creation of the habit are not counted.
+    :param db: Sqlite database connection object
+    :param periods: number of periods of the window
+    :param today: date of the end of the window, defaults to the current date
+    :param user: the user owning the habits
+    :returns: dict mapping each habit name to its completion rate, between 0 and 1
+    """
+    current, params = _current_periods(db, today, user)
+    if current is None:
+        return {}
+    cur = db.cursor()
+    # the completed periods are counted from the habit_periods rollup
+    cur.execute(f"""
+        WITH {current}
+        SELECT h.habit_name, h.periodicity, h.creation_date, c.period, COUNT(p.period_index)
+        FROM habits h JOIN current c ON c.periodicity = h.periodicity
+        LEFT JOIN habit_periods p ON p.habit_id = h.habit_id
+            AND p.period_index BETWEEN c.period - ? AND c.period
+        WHERE h.user_id = ?
+        GROUP BY h.habit_id
+        ORDER BY h.habit_name
+    """, (*params, periods - 1, user))
+
+    rates = {}
+    for habit_name, periodicity, creation_date, current, completed in cur:
+        since_creation = current - period_index(day_number(creation_date), periodicity) + 1
+        window = max(1, min(periods, since_creation))
+        rates[habit_name] = min(1.0, completed / window)
+    return rates
+
+def weekday_heatmap(db, since=None, until=None, user=DEFAULT_USER):
+    """
+    Function that counts the completions of every habit per day of the week.
+    :param db: Sqlite database connection object
+    :param since: only completions at or after this date (ISO string or date)
+    :param until: only completions before this date (ISO string or date)
+    :param user: the user owning the habits
+    :returns: dict mapping each habit name to a list of 7 counts, Monday first
+    """
+    conditions = ""
+    params = []
+    if since is not None:
+        conditions += " AND c.completion_date >= ?"
+        params.append(since if isinstance(since, str) else since.isoformat())
+    if until is not None:
+        conditions += " AND c.completion_date < ?"
+        params.append(until if isinstance(until, str) else until.isoformat())
+
+    cur = db.cursor()
+    # day 0 (1970-01-01) is a Thursday, weekday 3 when Monday is 0
+    cur.execute(f"""
+        SELECT h.habit_name, ((c.completion_day % 7) + 10) % 7 AS weekday, COUNT(c.completion_day)
+        FROM habits h LEFT JOIN completions c
+            ON c.user_id = h.user_id AND c.habit_name = h.habit_name{conditions}
+        WHERE h.user_id = ?
+        GROUP BY h.habit_name, weekday
+        ORDER BY h.habit_name
+    """, (*params, user))
+
+    heatmap = {}
+    for habit_name, weekday, count in cur:
+        counts = heatmap.setdefault(habit_name, [0] * 7)
+        if weekday is not None:
+            counts[weekday] = count
+    return heatmap
+
+def rolling_counts(db, windows=(7, 30), today=None, user=DEFAULT_USER):
+    """
+    Function that counts the completions of every habit over the last days, for several
+    window lengths at once.
+    :param db: Sqlite database connection object
+    :param windows: lengths of the windows in days, today included
+    :param today: date of the end of the windows, defaults to the current date
+    :param user: the user owning the habits
+    :returns: dict mapping each habit name to a dict {window length: number of completions}
+    """
+    today = today or date.today()
+    day = day_number(today)
+    since = (today - timedelta(days=max(windows) - 1)).isoformat()[:10]
+    columns = ", ".join(f"COUNT(CASE WHEN c.completion_day > {day - window} THEN 1 END)" for window in windows)
+
+    cur = db.cursor()
+    # the date range on completion_date is served by idx_completions_habit_date
+    cur.execute(f"""
+        SELECT h.habit_name, {columns}
+        FROM habits h LEFT JOIN completions c ON c.user_id = h.user_id AND c.habit_name = h.habit_name
+            AND c.completion_date >= ? AND c.completion_day <= ?
+        WHERE h.user_id = ?
+        GROUP BY h.habit_name
+        ORDER BY h.habit_name
+    """, (since, day, user))
+    return {habit_name: dict(zip(windows, counts)) for habit_name, *counts in cur}
+
+def completion_trends(db, periods=4, today=None, user=DEFAULT_USER):
+    """
+    Function that compares the completions of every habit in its last periods with the
+    same number of periods just before (days for daily habits, weeks for weekly habits and so on).
+    :param db: Sqlite database connection object
+    :param periods: number of periods of each window
+    :param today: date of the end of the recent window, defaults to the current date
+    :param user: the user owning the habits
+    :returns: dict mapping each habit name to a dict with the "recent" and "previous"
+              number of completions and the "trend" (recent minus previous)
+    """
+    current, params = _current_periods(db, today, user)
+    if current is None:
+        return {}
+    cur = db.cursor()
+    # the completions are summed from the habit_periods rollup, c.period is the latest period
+    cur.execute(f"""
+        WITH {current}
+        SELECT h.habit_name,
+               COALESCE(SUM(CASE WHEN p.period_index > c.period - ? THEN p.count END), 0),
+               COALESCE(SUM(CASE WHEN p.period_index <= c.period - ? THEN p.count END), 0)
+        FROM habits h JOIN current c ON c.periodicity = h.periodicity
+        LEFT JOIN habit_periods p ON p.habit_id = h.habit_id
+            AND p.period_index BETWEEN c.period - ? AND c.period
+        WHERE h.user_id = ?
+        GROUP BY h.habit_id
+        ORDER BY h.habit_name
+    """, (*params, periods, periods, 2 * periods - 1, user))
+    return {habit_name: {"recent": recent, "previous": previous, "trend": recent - previous}
+            for habit_name, recent, previous in cur}
+
+def habit_summaries(db, since=None, user=DEFAULT_USER):
+    """
+    Function that returns the periodicity, number of completions and streaks of the habits:
+    all of them, or only the ones changed after a version of the habit_changes log, so a
+    dashboard is refreshed by reading the changed habits only:
+
+        version, summaries = habit_summaries(db)
+        ...
+        version = refresh_summaries(db, summaries, version)
+
+    :param db: Sqlite database connection object
+    :param since: version returned by a previous call, None for all the habits
+    :param user: the user owning the habits
+    :returns: (version, dict mapping each habit name to a dict with its periodicity,
+              times_completed, current_streak and longest_streak), with since the deleted
+              habits map to None
+    """
+    version = get_data_version(db)
+    cur = db.cursor()
+    if since is None:
+        cur.execute("""
+            SELECT habit_name, periodicity, times_completed, current_streak, longest_streak
+            FROM habits WHERE user_id = ?
+        """, (user,))
+    else:
+        # a habit missing from the habits table was deleted
+        cur.execute("""
+            SELECT c.habit_name, h.periodicity, h.times_completed, h.current_streak, h.longest_streak
+            FROM habit_changes c
+            LEFT JOIN habits h ON h.user_id = c.user_id AND h.habit_name = c.habit_name
+            WHERE c.version > ? AND c.version <= ? AND c.user_id = ?
+        """, (since, version, user))
+
+    summaries = {}
+    for habit_name, periodicity, times_completed, current_streak, longest_streak in cur:
+        summaries[habit_name] = None if periodicity is None else {
+            "periodicity": periodicity,
+            "times_completed": times_completed,
+            "current_streak": current_streak,
+            "longest_streak": longest_streak,
+        }
+    return version, summaries
+
+def refresh_summaries(db, summaries, version, user=DEFAULT_USER):
+    """
+    Function that updates the summaries returned by habit_summaries with the habits
+    changed since their version, in place.
+    :param db: Sqlite database connection object
+    :param summaries: dict returned by habit_summaries, updated in place
+    :param version: version of the summaries
+    :param user: the user owning the habits
+    :returns: the new version of the summaries
+    """
+    version, changed = habit_summaries(db, version, user)
+    for habit_name, summary in changed.items():
+        if summary is None:
+            summaries.pop(habit_name, None)
+        else:
+            summaries[habit_name] = summary
+    return version
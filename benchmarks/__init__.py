@@ -0,0 +1,4 @@
+"""
+Benchmarks for the Habit Grower App.
+Each module can be run on its own, e.g. python -m benchmarks.completion_lookup
+"""
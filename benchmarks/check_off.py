@@ -0,0 +1,56 @@
+import os
+import tempfile
+import time
+from datetime import datetime
+
+import database
+from habit import Habit
+
+
+def time_per_call_connections(path, habit_name, repeat):
+    """
+    Measures the old check_off path: a new connection (and CREATE TABLE IF NOT EXISTS)
+    for every completion.
+    :returns: (float) seconds per operation
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        db = database.get_db(path)
+        try:
+            database.add_completion_date(db, habit_name, datetime.now().isoformat())
+        finally:
+            db.close()
+    return (time.perf_counter() - start) / repeat
+
+
+def time_pooled_check_off(path, habit_name, repeat):
+    """
+    Measures Habit.check_off using the pooled connection.
+    :returns: (float) seconds per operation
+    """
+    class BenchHabit(Habit):
+        db_name = path
+
+    habit = BenchHabit(habit_name, "benchmark habit", "daily")
+    start = time.perf_counter()
+    for _ in range(repeat):
+        habit.check_off()
+    return (time.perf_counter() - start) / repeat
+
+
+def run(repeat=500):
+    """ Prints the per-operation cost of check_off with and without the connection pool """
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        with database.connection(path) as db:
+            database.add_habit(db, "per call", "benchmark habit", "daily", datetime.now())
+        per_call = time_per_call_connections(path, "per call", repeat)
+        pooled = time_pooled_check_off(path, "pooled", repeat)
+        database.close_pools()
+
+    print(f"new connection per call: {per_call * 1e6:10.1f} us/op")
+    print(f"pooled connection:       {pooled * 1e6:10.1f} us/op")
+
+
+if __name__ == "__main__":
+    run()
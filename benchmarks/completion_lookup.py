@@ -0,0 +1,61 @@
+import os
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import database
+
+
+def build_database(path, habits, completions_per_habit):
+    """
+    Creates a database with the given number of habits and daily completions per habit.
+    :param path(str): path of the SQLite file to create
+    :param habits(int): number of habits
+    :param completions_per_habit(int): number of completions for each habit
+    :returns: sqlite3.connection to the new database
+    """
+    db = sqlite3.connect(path)
+    database.create_table(db)
+    start = datetime(2020, 1, 1)
+    cur = db.cursor()
+    for h in range(habits):
+        name = f"habit {h}"
+        cur.execute("INSERT INTO habits(habit_name, habit_description, periodicity, creation_date) VALUES (?,?,?,?)",
+                    (name, "benchmark habit", "daily", start.isoformat()))
+        cur.executemany("INSERT INTO completions(habit_name, completion_date) VALUES (?,?)",
+                        ((name, (start + timedelta(days=d)).isoformat()) for d in range(completions_per_habit)))
+    db.commit()
+    return db
+
+
+def time_lookups(db, habits, repeat=200):
+    """
+    Measures the average time of get_completion_data for one habit.
+    :returns: (float) seconds per lookup
+    """
+    names = [f"habit {h % habits}" for h in range(repeat)]
+    start = time.perf_counter()
+    for name in names:
+        database.get_completion_data(db, name)
+    return (time.perf_counter() - start) / repeat
+
+
+def run(sizes=(100, 1000, 5000), completions_per_habit=100):
+    """
+    Prints the per-habit lookup time with and without idx_completions_habit_date
+    as the completions table grows.
+    """
+    print(f"{'completions':>12} {'indexed (ms)':>14} {'full scan (ms)':>16}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for habits in sizes:
+            db = build_database(os.path.join(tmp, f"bench_{habits}.db"), habits, completions_per_habit)
+            indexed = time_lookups(db, habits)
+            db.execute("DROP INDEX idx_completions_habit_date")
+            scan = time_lookups(db, habits, repeat=20)
+            db.close()
+            print(f"{habits * completions_per_habit:>12} {indexed * 1000:>14.3f} {scan * 1000:>16.3f}")
+
+
+if __name__ == "__main__":
+    run()
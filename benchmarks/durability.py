@@ -0,0 +1,72 @@
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+import database
+
+
+def new_database(path, habits):
+    """ creates the habits written to by the benchmark threads """
+    with database.connection(path) as db:
+        database.add_habits_bulk(db, ((f"habit {h}", "benchmark habit", "daily", datetime(2024, 1, 1))
+                                      for h in range(habits)))
+    database.close_pools()
+
+
+def run_writers(threads, writes, write):
+    """
+    Runs writer threads that each complete their own habit writes times, one day after the other.
+    :param write: function(habit_name, completion_date) doing one write
+    :returns: (float) writes per second over all the threads
+    """
+    def writer(t):
+        for i in range(writes):
+            write(f"habit {t}", (datetime(2024, 1, 1) + timedelta(days=i)).isoformat())
+
+    workers = [threading.Thread(target=writer, args=(t,)) for t in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return threads * writes / (time.perf_counter() - start)
+
+
+def pooled_writes(path, durability, threads, writes):
+    """ every write is its own transaction on a pooled connection """
+    pool = database.ConnectionPool(path, size=threads, durability=durability)
+
+    def write(habit_name, completion_date):
+        with pool.connection() as db:
+            database.add_completion_date(db, habit_name, completion_date)
+
+    rate = run_writers(threads, writes, write)
+    pool.close()
+    return rate
+
+
+def group_commit_writes(path, durability, threads, writes):
+    """ the writes of all the threads go through one GroupCommitter """
+    committer = database.GroupCommitter(path, durability=durability)
+    rate = run_writers(threads, writes, lambda habit_name, completion_date: committer.write(
+        database.add_completion_date, habit_name, completion_date))
+    committer.close()
+    return rate
+
+
+def run(threads=8, writes=200):
+    """ Prints the completions written per second in each durability mode, with and without group commit """
+    print(f"{threads} writer threads, {writes} completions each")
+    for durability in database.DURABILITY_MODES:
+        for label, method in (("one commit per write", pooled_writes), ("group commit", group_commit_writes)):
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, "bench.db")
+                new_database(path, threads)
+                rate = method(path, durability, threads, writes)
+            print(f"{durability:<8} {label:<22} {rate:10.0f} writes/s")
+
+
+if __name__ == "__main__":
+    run()
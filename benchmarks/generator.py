@@ -0,0 +1,71 @@
+import random
+from datetime import datetime, timedelta
+
+import database
+
+
+def habit_rows(habits, weekly_ratio=0.3, start=datetime(2020, 1, 1), seed=0):
+    """
+    Generates synthetic habits.
+    :param habits(int): number of habits
+    :param weekly_ratio(float): share of weekly habits, the others are daily
+    :param start(datetime): creation date of the habits
+    :param seed(int): seed of the random generator
+    :returns: generator of (habit_name, habit_description, periodicity, creation_date) tuples
+    """
+    rng = random.Random(seed)
+    for h in range(habits):
+        periodicity = "weekly" if rng.random() < weekly_ratio else "daily"
+        yield f"habit {h}", f"synthetic {periodicity} habit", periodicity, start
+
+
+def completion_rows(habits, completions, gap_probability=0.1, max_gap=5, repeat_probability=0.05,
+                    start=datetime(2020, 1, 1), seed=0):
+    """
+    Generates synthetic completions, in ascending date order for each habit.
+    Each period is completed, skipped for a gap of 1 to max_gap periods with gap_probability,
+    and completed a second time with repeat_probability.
+    :param habits: list of (habit_name, periodicity) tuples
+    :param completions(int): total number of completions, spread evenly over the habits
+    :param gap_probability(float): probability that a gap follows a completed period
+    :param max_gap(int): longest gap, in periods
+    :param repeat_probability(float): probability of several completions in the same period
+    :param start(datetime): date of the first period
+    :param seed(int): seed of the random generator
+    :returns: generator of (habit_name, completion_date) tuples
+    """
+    rng = random.Random(seed)
+    per_habit, extra = divmod(completions, len(habits)) if habits else (0, 0)
+    for h, (habit_name, periodicity) in enumerate(habits):
+        period_length = timedelta(weeks=1) if periodicity == "weekly" else timedelta(days=1)
+        period = 0
+        previous = None
+        remaining = per_habit + (1 if h < extra else 0)
+        while remaining > 0:
+            completion_date = start + period * period_length + timedelta(minutes=rng.randrange(1440))
+            if previous is not None and completion_date <= previous:
+                completion_date = previous + timedelta(minutes=1) # repeat later in the same period
+            previous = completion_date
+            yield habit_name, completion_date
+            remaining -= 1
+            if rng.random() < repeat_probability:
+                continue # another completion in the same period
+            period += 1
+            if rng.random() < gap_probability:
+                period += rng.randint(1, max_gap)
+
+
+def populate(db, habits=100, completions=10_000, weekly_ratio=0.3, gap_probability=0.1, max_gap=5,
+             repeat_probability=0.05, start=datetime(2020, 1, 1), seed=0):
+    """
+    Fills a database with synthetic habits and completions through the bulk insert path.
+    The same parameters and seed always produce the same data.
+    :param db: connection object to interact with the SQLite database.
+    :returns: list of (habit_name, periodicity) tuples of the generated habits
+    """
+    rows = list(habit_rows(habits, weekly_ratio, start, seed))
+    database.add_habits_bulk(db, rows)
+    generated = [(name, periodicity) for name, _, periodicity, _ in rows]
+    database.add_completions_bulk(db, completion_rows(generated, completions, gap_probability, max_gap,
+                                                      repeat_probability, start, seed))
+    return generated
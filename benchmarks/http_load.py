@@ -0,0 +1,107 @@
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import database
+from server import serve_in_thread
+
+
+def build_database(path, habits, completions_per_habit):
+    """
+    Creates a database with daily habits and their completions, using the bulk insert path.
+    :returns: list of habit names
+    """
+    db = sqlite3.connect(path)
+    database.create_table(db)
+    names = [f"habit{h}" for h in range(habits)]
+    start = datetime(2023, 1, 1, 8, 0)
+    database.add_habits_bulk(db, ((name, "load test habit", "daily", start) for name in names))
+    database.add_completions_bulk(db, ((name, start + timedelta(days=d))
+                                       for name in names for d in range(completions_per_habit)))
+    db.close()
+    return names
+
+
+async def request(reader, writer, method, path, body=b""):
+    """ sends one keep-alive HTTP request and reads the response, returns the status """
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: localhost\r\n"
+                 f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line == b"\r\n":
+            break
+        if line.lower().startswith(b"content-length:"):
+            length = int(line.split(b":")[1])
+    await reader.readexactly(length)
+    return status
+
+
+async def client(host, port, names, deadline, write_ratio, latencies, rng):
+    """ one connection sending requests until the deadline, recording each latency """
+    reader, writer = await asyncio.open_connection(host, port)
+    day = 0
+    while time.perf_counter() < deadline:
+        name = rng.choice(names)
+        roll = rng.random()
+        start = time.perf_counter()
+        if roll < write_ratio:
+            day += 1
+            body = f'{{"date": "{(datetime(2030, 1, 1) + timedelta(days=day)).isoformat()}"}}'.encode()
+            await request(reader, writer, "POST", f"/habits/{name}/completions", body)
+        elif roll < 0.6:
+            await request(reader, writer, "GET", f"/habits/{name}")
+        elif roll < 0.9:
+            await request(reader, writer, "GET", f"/habits/{name}/completions?limit=20")
+        else:
+            await request(reader, writer, "GET", "/streaks/longest")
+        latencies.append(time.perf_counter() - start)
+    writer.close()
+
+
+async def load(url, names, clients, seconds, write_ratio, seed):
+    """ runs the clients concurrently, returns the list of latencies """
+    host, port = url.split("//")[1].split(":")
+    latencies = []
+    deadline = time.perf_counter() + seconds
+    rng = random.Random(seed)
+    await asyncio.gather(*(client(host, int(port), names, deadline, write_ratio, latencies,
+                                  random.Random(rng.random())) for _ in range(clients)))
+    return latencies
+
+
+def run(habits=1000, completions_per_habit=100, clients=32, seconds=5.0, write_ratio=0.1, seed=1):
+    """ Prints requests/sec and latency percentiles of the HTTP API on a local SQLite file """
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "load.db")
+        names = build_database(path, habits, completions_per_habit)
+        with serve_in_thread(path) as url:
+            latencies = asyncio.run(load(url, names, clients, seconds, write_ratio, seed))
+        database.close_pools()
+
+    latencies.sort()
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+    print(f"{habits} habits, {habits * completions_per_habit} completions, {clients} clients, "
+          f"{write_ratio:.0%} writes")
+    print(f"requests: {len(latencies)}  requests/sec: {len(latencies) / seconds:.0f}")
+    print(f"latency p50: {percentile(0.50):.2f} ms  p99: {percentile(0.99):.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test of the HTTP API")
+    parser.add_argument("--habits", type=int, default=1000)
+    parser.add_argument("--completions", type=int, default=100, help="completions per habit")
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--writes", type=float, default=0.1, help="ratio of write requests")
+    args = parser.parse_args()
+    run(args.habits, args.completions, args.clients, args.seconds, args.writes)
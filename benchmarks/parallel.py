@@ -0,0 +1,39 @@
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+
+import database
+import reports
+from benchmarks.generator import populate
+
+
+def run(habits=100_000, completions=5_000_000, workers=(1, 2, 4, 8), backend=None, seed=0):
+    """ Prints the time of the streak report of every habit with each number of worker processes """
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        db = sqlite3.connect(path)
+        database.create_table(db)
+        populate(db, habits, completions, seed=seed)
+        db.close()
+        print(f"{habits} habits, {completions} completions, {os.cpu_count()} CPUs")
+
+        baseline = None
+        for count in workers:
+            start = time.perf_counter()
+            report = reports.streak_report(path, count, partition_size=max(1, habits // (4 * count)),
+                                           backend=backend)
+            seconds = time.perf_counter() - start
+            baseline = baseline or seconds
+            print(f"{count:>3} workers {seconds:8.2f} s  speedup x{baseline / seconds:.2f}  ({len(report)} habits)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Streak report of every habit in parallel processes")
+    parser.add_argument("--habits", type=int, default=100_000)
+    parser.add_argument("--completions", type=int, default=5_000_000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--backend", choices=["numpy", "python"])
+    args = parser.parse_args()
+    run(args.habits, args.completions, args.workers, args.backend)
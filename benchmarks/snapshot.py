@@ -0,0 +1,62 @@
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+
+import database
+import snapshot
+from benchmarks.generator import populate
+from streaks import completion_periods, streak_summary
+
+
+def longest_streaks_from_database(db_path):
+    """ batch job reading the whole history from SQLite: the longest streak of every habit """
+    db = sqlite3.connect(db_path)
+    result = {}
+    for habit_name, periodicity in db.execute("SELECT habit_name, periodicity FROM habits ORDER BY habit_name"):
+        days = database.get_completion_days(db, habit_name)
+        result[habit_name] = streak_summary(completion_periods(days, periodicity))[1]
+    db.close()
+    return result
+
+
+def longest_streaks_from_snapshot(snapshot_path):
+    """ the same job reading a snapshot """
+    with snapshot.Snapshot(snapshot_path) as snap:
+        return snap.longest_streaks()
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def run(habits=1000, completions=1_000_000, seed=0):
+    """ Prints the time of a batch streak analysis read from SQLite and from a snapshot """
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path, snapshot_path = os.path.join(tmp, "bench.db"), os.path.join(tmp, "bench.snap")
+        db = sqlite3.connect(db_path)
+        database.create_table(db)
+        populate(db, habits, completions, seed=seed)
+        _, seconds = timed(snapshot.write_snapshot, db, snapshot_path)
+        db.close()
+        print(f"{habits} habits, {completions} completions, snapshot of "
+              f"{os.path.getsize(snapshot_path) / 1e6:.1f} MB written in {seconds:.2f} s")
+
+        _, open_seconds = timed(lambda: snapshot.Snapshot(snapshot_path).close())
+        print(f"snapshot opened in {open_seconds * 1000:.1f} ms")
+        from_database, database_seconds = timed(longest_streaks_from_database, db_path)
+        from_snapshot, snapshot_seconds = timed(longest_streaks_from_snapshot, snapshot_path)
+        assert from_database == from_snapshot
+        print(f"longest streaks from SQLite   {database_seconds * 1000:10.1f} ms")
+        print(f"longest streaks from snapshot {snapshot_seconds * 1000:10.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batch streak analysis from SQLite and from a snapshot")
+    parser.add_argument("--habits", type=int, default=1000)
+    parser.add_argument("--completions", type=int, default=1_000_000)
+    args = parser.parse_args()
+    run(args.habits, args.completions)
@@ -0,0 +1,49 @@
+import random
+import time
+
+import streaks
+
+
+def make_periods(count, seed=1):
+    """
+    Generates sorted period indexes with random repeats and gaps.
+    :param count(int): number of completions
+    :param seed(int): seed of the random generator
+    :returns: list of period indexes in ascending order
+    """
+    rng = random.Random(seed)
+    periods = []
+    period = 0
+    for _ in range(count):
+        period += rng.choices((0, 1, 2, 5), weights=(2, 10, 2, 1))[0]
+        periods.append(period)
+    return periods
+
+
+def time_call(function, *args, repeat=3):
+    """ best time of a few calls, in seconds """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(count=1_000_000):
+    """ Prints the time of the streak functions for each available backend """
+    periods = make_periods(count)
+    backends = ["python"] + (["numpy"] if streaks.HAS_NUMPY else [])
+    print(f"{count} completions")
+    for backend in backends:
+        # the numpy backend gets an array, as loaded by streaks.completion_periods
+        data = streaks.completion_periods(periods, "daily", backend)
+        for function in (streaks.streak_summary, streaks.period_runs, streaks.gap_lengths):
+            seconds = time_call(function, data, backend)
+            print(f"{backend:>7} {function.__name__:<15} {seconds * 1000:10.1f} ms")
+    if not streaks.HAS_NUMPY:
+        print("NumPy is not installed, only the python backend was measured")
+
+
+if __name__ == "__main__":
+    run()
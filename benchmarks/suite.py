@@ -0,0 +1,211 @@
+"""
+Timed scenarios for the public functions of analyze.py, database.py and Habit, on synthetic data.
+The connection and migration helpers of database.py are not timed, except create_table.
+
+    python -m benchmarks.suite --habits 1000 --completions 100000 --output results.json
+    python -m benchmarks.suite --compare results.json
+
+The results are written as JSON, so the runs of two versions can be compared.
+"""
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+import analyze
+import database
+import streaks
+from benchmarks.generator import completion_rows, populate
+from habit import Habit
+
+
+def scenarios(habits, seed):
+    """
+    The timed scenarios, as (name, repeat, function(db, i)) tuples. Call i of a scenario
+    works on the habit number i of the sample, so writes never hit the same habit twice in a row.
+    :param habits: list of (habit_name, periodicity) of the generated data
+    :param seed(int): seed used for the data
+    """
+    names = [name for name, _ in habits]
+    today = date(2020, 6, 1) # inside the generated history
+
+    def name(i):
+        return names[(i * 7919) % len(names)] # spread the calls over the habits
+
+    def new_habit(i):
+        return f"benchmark habit {i}"
+
+    def later(i):
+        return (datetime(2100, 1, 1) + timedelta(days=i)).isoformat()
+
+    def load_habit(db, i):
+        habit = Habit.load(db, name(i))
+        habit.completion_dates # fetch the history
+        return habit.check_streak()
+
+    # version and summaries read before the writes, refreshed after them (all the habits without the read)
+    summaries = {"version": 0, "habits": {}}
+
+    def read_summaries(db, i):
+        summaries["version"], summaries["habits"] = analyze.habit_summaries(db)
+
+    def bulk_completions(db, i):
+        rows = completion_rows([(new_habit(i), "daily")], 1000, start=datetime(2000, 1, 1), seed=seed)
+        database.add_completions_bulk(db, rows)
+
+    return [
+        # database.py reads
+        ("database.create_table", 20, lambda db, i: database.create_table(db)),
+        ("database.get_habit_data", 1000, lambda db, i: database.get_habit_data(db, name(i))),
+        ("database.get_habit_id", 1000, lambda db, i: database.get_habit_id(db, name(i))),
+        ("database.get_completion_data", 200, lambda db, i: database.get_completion_data(db, name(i))),
+        ("database.get_completion_days", 200, lambda db, i: database.get_completion_days(db, name(i))),
+        ("database.get_completion_page", 500, lambda db, i: database.get_completion_page(db, name(i), batch=20, reverse=True)),
+        ("database.iter_completions", 200, lambda db, i: sum(1 for _ in database.iter_completions(db, name(i), batch=100))),
+        ("database.get_habit_periods", 500, lambda db, i: database.get_habit_periods(db, name(i))),
+        ("database.count_completions", 500, lambda db, i: database.count_completions(db, name(i))),
+        ("database.get_habit_info", 1000, lambda db, i: database.get_habit_info(db, name(i))),
+        ("database.get_data_version", 1000, lambda db, i: database.get_data_version(db)),
+        ("database.get_calendar", 1000, lambda db, i: database.get_calendar(db)),
+        # analyze.py
+        ("analyze.list_tracked_habits", 20, lambda db, i: analyze.list_tracked_habits(db)),
+        ("analyze.list_habit_by_periodicity", 20, lambda db, i: analyze.list_habit_by_periodicity(db, "weekly")),
+        ("analyze.longest_historical_streak_for_habit", 1000, lambda db, i: analyze.longest_historical_streak_for_habit(db, name(i))),
+        ("analyze.longest_streaks", 20, lambda db, i: analyze.longest_streaks(db)),
+        ("analyze.longest_historical_streak", 20, lambda db, i: analyze.longest_historical_streak(db)),
+        ("analyze.streak_details", 200, lambda db, i: analyze.streak_details(db, name(i))),
+        ("analyze.completion_histogram", 200, lambda db, i: analyze.completion_histogram(db, name(i))),
+        ("analyze.completion_rates", 10, lambda db, i: analyze.completion_rates(db, 30, today)),
+        ("analyze.weekday_heatmap", 10, lambda db, i: analyze.weekday_heatmap(db)),
+        ("analyze.rolling_counts", 10, lambda db, i: analyze.rolling_counts(db, (7, 30), today)),
+        ("analyze.completion_trends", 10, lambda db, i: analyze.completion_trends(db, 4, today)),
+        ("analyze.habit_summaries", 10, read_summaries),
+        # habit.py
+        ("Habit.load + check_streak", 200, load_habit),
+        # writes last, so the reads above time the generated data only
+        ("database.add_habit", 200, lambda db, i: database.add_habit(db, new_habit(i), "benchmark", "daily", datetime(2000, 1, 1))),
+        ("database.add_completion_date", 500, lambda db, i: database.add_completion_date(db, name(i), later(i))),
+        ("database.add_completion_date (out of order)", 50, lambda db, i: database.add_completion_date(db, name(i), "2000-01-01T08:00:00")),
+        ("database.add_completions_bulk (1000 rows)", 20, bulk_completions),
+        ("database.add_habits_bulk (1000 rows)", 5, lambda db, i: database.add_habits_bulk(
+            db, ((f"bulk habit {i} {h}", "benchmark", "weekly", datetime(2000, 1, 1)) for h in range(1000)))),
+        ("database.update_habit", 100, lambda db, i: database.update_habit(db, name(i), "updated", "daily")),
+        ("database.delete_completion_date", 50, lambda db, i: database.delete_completion_date(db, name(i), later(i))),
+        ("database.delete_habit", 200, lambda db, i: database.delete_habit(db, new_habit(i))),
+        # the habits changed by the writes above, since the version read by analyze.habit_summaries
+        ("database.get_changed_habits", 100, lambda db, i: database.get_changed_habits(db, summaries["version"])),
+        ("analyze.refresh_summaries", 100, lambda db, i: analyze.refresh_summaries(
+            db, dict(summaries["habits"]), summaries["version"])),
+        ("database.rebuild_streak_cache", 3, lambda db, i: database.rebuild_streak_cache(db)),
+    ]
+
+
+def time_scenario(db, function, repeat):
+    """
+    Calls a scenario repeat times and measures every call.
+    :returns: dict with the number of calls and the min, mean, p95 and total times in ms
+    """
+    times = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        function(db, i)
+        times.append(time.perf_counter() - start)
+    times.sort()
+    return {
+        "repeat": repeat,
+        "min_ms": times[0] * 1000,
+        "mean_ms": sum(times) / repeat * 1000,
+        "p95_ms": times[min(repeat - 1, int(repeat * 0.95))] * 1000,
+        "total_ms": sum(times) * 1000,
+    }
+
+
+def git_revision():
+    """ commit of the working tree, to label the results """
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(habits=1000, completions=100_000, weekly_ratio=0.3, gap_probability=0.1, seed=0, only=None):
+    """
+    Generates a database in a temporary file and times every scenario on it.
+    :param only: substring selecting the scenarios to run, all of them when None
+    :returns: dict with the parameters ("meta") and the timings of each scenario ("results")
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        db = sqlite3.connect(os.path.join(tmp, "suite.db"))
+        database.create_table(db)
+        start = time.perf_counter()
+        generated = populate(db, habits, completions, weekly_ratio, gap_probability, seed=seed)
+        generate_seconds = time.perf_counter() - start
+
+        for name, repeat, function in scenarios(generated, seed):
+            if only is None or only in name:
+                results[name] = time_scenario(db, function, repeat)
+        db.close()
+
+    return {
+        "meta": {
+            "revision": git_revision(),
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "streak_backend": streaks.BACKEND,
+            "habits": habits,
+            "completions": completions,
+            "weekly_ratio": weekly_ratio,
+            "gap_probability": gap_probability,
+            "seed": seed,
+            "generate_seconds": generate_seconds,
+        },
+        "results": results,
+    }
+
+
+def print_results(report, baseline=None):
+    """ prints the mean time of each scenario, and the ratio to a baseline report if given """
+    print(f"{report['meta']['habits']} habits, {report['meta']['completions']} completions, "
+          f"generated in {report['meta']['generate_seconds']:.2f} s")
+    for name, result in report["results"].items():
+        line = f"{name:<48} {result['mean_ms']:10.3f} ms  p95 {result['p95_ms']:10.3f} ms"
+        previous = (baseline or {}).get("results", {}).get(name)
+        if previous and previous["mean_ms"]:
+            line += f"  x{result['mean_ms'] / previous['mean_ms']:.2f} vs baseline"
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark suite of the Habit Grower App")
+    parser.add_argument("--habits", type=int, default=1000)
+    parser.add_argument("--completions", type=int, default=100_000)
+    parser.add_argument("--weekly-ratio", type=float, default=0.3)
+    parser.add_argument("--gap-probability", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", help="only run the scenarios whose name contains this text")
+    parser.add_argument("--output", help="write the JSON results to this file")
+    parser.add_argument("--compare", help="JSON results of a previous run to compare with")
+    args = parser.parse_args(argv)
+
+    report = run(args.habits, args.completions, args.weekly_ratio, args.gap_probability, args.seed, args.only)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_results(report, baseline)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+import argparse
+import os
+import resource
+import sqlite3
+import tempfile
+
+import database
+import transfer
+from benchmarks.generator import populate
+
+
+def peak_memory_mb():
+    """ peak resident memory of the process, in MB (Linux reports it in KB) """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run(habits=1000, completions=1_000_000, fmt="csv", seed=0):
+    """
+    Round-trips a generated database through export and import files,
+    and prints the rows per second of each step and the peak memory.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        source = sqlite3.connect(os.path.join(tmp, "source.db"))
+        database.create_table(source)
+        populate(source, habits, completions, seed=seed)
+        print(f"{habits} habits, {completions} completions, generated (peak memory {peak_memory_mb():.0f} MB)")
+
+        habits_file, completions_file = os.path.join(tmp, f"habits.{fmt}"), os.path.join(tmp, f"completions.{fmt}")
+        target = sqlite3.connect(os.path.join(tmp, "target.db"))
+        database.create_table(target)
+        for label, report in (
+                ("export habits", transfer.export_habits(source, habits_file)),
+                ("export completions", transfer.export_completions(source, completions_file)),
+                ("import habits", transfer.import_habits(target, habits_file)),
+                ("import completions", transfer.import_completions(target, completions_file))):
+            print(f"{label:<20} {report['rows']:>10} rows {report['seconds']:8.2f} s "
+                  f"{report['rows_per_second']:10.0f} rows/s  (peak memory {peak_memory_mb():.0f} MB)")
+        source.close()
+        target.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Round trip of a generated database through export files")
+    parser.add_argument("--habits", type=int, default=1000)
+    parser.add_argument("--completions", type=int, default=1_000_000)
+    parser.add_argument("--format", choices=["csv", "jsonl"], default="csv")
+    args = parser.parse_args()
+    run(args.habits, args.completions, args.format)
@@ -0,0 +1,136 @@
+import threading
+from collections import OrderedDict
+
+import analyze
+import database
+from database import DEFAULT_USER
+
+# Number of habits (and lists of habits) kept in a cache
+CACHE_SIZE = 256
+
+
+class HabitCache:
+    """
+    In-memory LRU cache of the habit metadata and streaks of one database.
+
+    The reads are memoized per habit, and the list of tracked habits per user. The
+    writes go through the cache, which drops exactly the entries they change:
+    a completion drops its habit, an update drops its habit, and adding or deleting
+    a habit also drops the list of habits of its user. Writes made without the cache
+    are not seen by it, call invalidate or clear after them.
+
+    Every method takes a connection as its first argument, like the functions of
+    database.py, so they can be submitted to a DatabaseWorker as they are.
+
+    Attributes:
+        size(int): maximum number of cached habits and lists.
+        hits(int): number of reads answered from the cache.
+        misses(int): number of reads that went to the database.
+    """
+
+    def __init__(self, size=CACHE_SIZE):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict() # (user, habit_name) -> {kind: value}, (user, None) for the list
+        self._lock = threading.Lock()
+        self._generation = 0 # bumped by every invalidation
+
+    def _get(self, key, kind, load, db, *args):
+        """ value of one kind of a cache entry, loaded from the database on a miss """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and kind in entry:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[kind]
+            self.misses += 1
+            generation = self._generation
+
+        value = load(db, *args)
+
+        with self._lock:
+            # a write invalidated entries while the value was loaded, it may already be stale
+            if generation == self._generation:
+                self._entries.setdefault(key, {})[kind] = value
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.size:
+                    self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, habit_name=None, user=DEFAULT_USER):
+        """
+        Drops the cached values of a habit, or the list of habits of the user when habit_name is None.
+        :returns: None
+        """
+        with self._lock:
+            self._generation += 1
+            self._entries.pop((user, habit_name), None)
+
+    def clear(self):
+        """ drops every cached value """
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Counters of the cache.
+        :returns: dict with the hits, misses, hit_rate and number of cached entries
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses,
+                    "hit_rate": self.hits / lookups if lookups else 0.0, "entries": len(self._entries)}
+
+    # reads
+    def list_tracked_habits(self, db, user=DEFAULT_USER):
+        """ cached analyze.list_tracked_habits """
+        return list(self._get((user, None), "habits", analyze.list_tracked_habits, db, user))
+
+    def get_habit_data(self, db, habit_name, user=DEFAULT_USER):
+        """ cached database.get_habit_data """
+        return self._get((user, habit_name), "data", database.get_habit_data, db, habit_name, user)
+
+    def longest_historical_streak_for_habit(self, db, habit_name, user=DEFAULT_USER):
+        """ cached analyze.longest_historical_streak_for_habit """
+        return self._get((user, habit_name), "longest_streak", analyze.longest_historical_streak_for_habit,
+                         db, habit_name, user)
+
+    # writes
+    def add_habit(self, db, habit_name, habit_description, periodicity, creation_date, user=DEFAULT_USER):
+        """ database.add_habit, drops the habit and the list of habits of the user """
+        try:
+            return database.add_habit(db, habit_name, habit_description, periodicity, creation_date, user)
+        finally:
+            self.invalidate(habit_name, user)
+            self.invalidate(None, user)
+
+    def add_completion_date(self, db, habit_name, completion_date=None, user=DEFAULT_USER):
+        """ database.add_completion_date, drops the habit """
+        try:
+            return database.add_completion_date(db, habit_name, completion_date, user)
+        finally:
+            self.invalidate(habit_name, user)
+
+    def delete_completion_date(self, db, habit_name, completion_date, user=DEFAULT_USER):
+        """ database.delete_completion_date, drops the habit """
+        try:
+            return database.delete_completion_date(db, habit_name, completion_date, user)
+        finally:
+            self.invalidate(habit_name, user)
+
+    def update_habit(self, db, habit_name, habit_description, periodicity, user=DEFAULT_USER):
+        """ database.update_habit, drops the habit """
+        try:
+            return database.update_habit(db, habit_name, habit_description, periodicity, user)
+        finally:
+            self.invalidate(habit_name, user)
+
+    def delete_habit(self, db, habit_name, user=DEFAULT_USER):
+        """ database.delete_habit, drops the habit and the list of habits of the user """
+        try:
+            return database.delete_habit(db, habit_name, user)
+        finally:
+            self.invalidate(habit_name, user)
+            self.invalidate(None, user)
@@ -0,0 +1,54 @@
+import random
+import pytest
+import database
+from datetime import datetime, timedelta
+
+# Generated daily and weekly habits of the default user, completed in date order
+HABITS = 30
+COMPLETIONS_PER_HABIT = 100
+
+# Habits added next to the generated ones: (name, description, periodicity, user, completion dates)
+EXTRA_HABITS = [
+    ("Unused", "Never completed", "weekly", database.DEFAULT_USER, []),
+    ("Review", "Monthly review", "monthly", database.DEFAULT_USER,
+     ["2024-01-03T09:00:00", "2024-02-28T09:00:00", "2024-03-01T09:00:00", "2024-05-02T09:00:00"]),
+    ("Stretch", "Every other day", "every 2 days", database.DEFAULT_USER,
+     ["2024-01-01T07:00:00", "2024-01-02T07:00:00", "2024-01-04T07:00:00", "2024-01-10T07:00:00"]),
+    ("Commute", "Cycle to work", "weekdays", database.DEFAULT_USER,
+     ["2024-01-04T08:00:00", "2024-01-05T08:00:00", "2024-01-06T08:00:00", "2024-01-08T08:00:00"]),
+    ("Exercise", "Her workout, \"daily\"", "daily", "alice", ["2024-01-01T08:00:00"]),
+]
+
+
+def completion_rows(habit_name, periodicity, start, rng):
+    """
+    Completions of a generated habit: a period is completed again, the next one or
+    the one after a gap, so the streaks have breaks of every length.
+    """
+    period = timedelta(weeks=1) if periodicity == "weekly" else timedelta(days=1)
+    completion_date = start
+    for _ in range(COMPLETIONS_PER_HABIT):
+        completion_date += period * rng.choice((0, 1, 1, 1, 1, 2, 5))
+        completion_date = completion_date.replace(hour=rng.randrange(24)) # repeats can be earlier in the day
+        yield habit_name, completion_date
+
+
+@pytest.fixture
+def habits_db(tmp_path):
+    """
+    Path of a database file with HABITS generated habits of the default user plus EXTRA_HABITS:
+    a habit without completions, habits with other periodicities and a habit of alice.
+    """
+    path = str(tmp_path / "habits.db")
+    rng = random.Random(0)
+    start = datetime(2020, 1, 1)
+    habits = [(f"habit {h}", "generated habit", "weekly" if h % 3 == 0 else "daily", start) for h in range(HABITS)]
+    db = database.get_db(path)
+    database.add_habits_bulk(db, habits)
+    database.add_completions_bulk(db, (row for habit_name, _, periodicity, _ in habits
+                                       for row in completion_rows(habit_name, periodicity, start, rng)))
+    for habit_name, description, periodicity, user, dates in EXTRA_HABITS:
+        database.add_habit(db, habit_name, description, periodicity, datetime(2024, 1, 1), user)
+        database.add_completions_bulk(db, [(habit_name, date) for date in dates], user)
+    db.close()
+    return path
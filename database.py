@@ -1,19 +1,349 @@
+import os
+import queue
 import sqlite3
+import threading
+import time
+import zlib
+from collections import Counter
+from contextlib import contextmanager
 from datetime import datetime
+from itertools import groupby
 
+import periods
+import querystats
+from periods import day_number, parse_periodicity, period_index
+from streaks import extend_streak, streak_summary
 
-def get_db(name="db/main.db"):
+# Database used by the app when no other file is given
+DEFAULT_DB = "db/main.db"
+
+# Maximum number of open connections kept by each pool
+POOL_SIZE = 5
+
+# (journal_mode, synchronous) of each durability mode of the pooled connections
+DURABILITY_MODES = {
+    # rollback journal, every commit is synced to disk (SQLite's defaults)
+    "full": ("DELETE", "FULL"),
+    # write-ahead log, every commit is synced to disk
+    "wal": ("WAL", "FULL"),
+    # write-ahead log, synced only at checkpoints: a power loss can undo the
+    # last commits but never corrupts the database
+    "normal": ("WAL", "NORMAL"),
+}
+DEFAULT_DURABILITY = "normal"
+
+# User owning the habits when no other user is given, the habits of databases
+# created before users existed belong to this user
+DEFAULT_USER = "default"
+
+
+def get_db(name=DEFAULT_DB):
     """
-    open the connection to the SQLite database and ensure the creation of the tables
+    open the connection to the SQLite database and ensure the creation of the tables.
+    Every call opens a new connection that the caller has to close, prefer connection()
+    for repeated operations.
     :returns: sqlite3.connection: connection object to interact with the SQLite database.
     """
-    db = sqlite3.connect(name)
+    db = sqlite3.connect(name, factory=querystats.connection_factory())
     create_table(db) # ensure tables are creates
     return db
 
+def get_readonly_db(name=DEFAULT_DB):
+    """
+    open a read-only connection to an existing database, for jobs that only analyze it
+    (such as the worker processes of reports.py). Writing through it raises sqlite3.OperationalError.
+    :returns: sqlite3.connection opened with the URI mode=ro
+    """
+    from urllib.request import pathname2url # imports http.client, too slow for every start of the app
+    uri = f"file:{pathname2url(os.path.abspath(name))}?mode=ro"
+    return sqlite3.connect(uri, uri=True, factory=querystats.connection_factory())
+
+def configure(db, durability=DEFAULT_DURABILITY):
+    """
+    Applies the connection settings used by the pooled connections.
+    :param db: connection object to interact with the SQLite database.
+    :param durability(str): one of DURABILITY_MODES
+    :returns: None
+    """
+    if durability not in DURABILITY_MODES:
+        raise ValueError(f"Unknown durability mode '{durability}', choose one of {', '.join(DURABILITY_MODES)}")
+    journal_mode, synchronous = DURABILITY_MODES[durability]
+    db.execute(f"PRAGMA journal_mode = {journal_mode}") # with WAL, readers don't block the writer
+    db.execute(f"PRAGMA synchronous = {synchronous}")
+    db.execute("PRAGMA busy_timeout = 5000") # wait for locks instead of failing right away
+
+
+class ConnectionPool:
+    """
+    Bounded pool of open connections to one SQLite database file.
+
+    Connections are opened lazily, configured once when they are opened and
+    handed back to the pool after use instead of being closed. The tables are
+    created only when the pool opens its first connection. A thread that is
+    already holding a connection gets the same one again on nested use.
+
+    Attributes:
+        name(string): path of the database file.
+        size(integer): maximum number of connections open at the same time.
+        durability(string): durability mode of the connections, see DURABILITY_MODES.
+    """
+
+    def __init__(self, name=DEFAULT_DB, size=POOL_SIZE, durability=DEFAULT_DURABILITY):
+        self.name = name
+        self.size = size
+        self.durability = durability
+        self._idle = queue.LifoQueue() # most recently used connection first
+        self._slots = threading.BoundedSemaphore(size)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._schema_ready = False
+
+    def _open(self):
+        """ open and configure a new connection, creating the tables on first use """
+        db = sqlite3.connect(self.name, check_same_thread=False, factory=querystats.connection_factory())
+        configure(db, self.durability)
+        with self._lock:
+            if not self._schema_ready:
+                create_table(db)
+                self._schema_ready = True
+        return db
+
+    @contextmanager
+    def connection(self):
+        """
+        Context manager that lends a connection from the pool.
+        Commits when the block succeeds, rolls back when it raises.
+        """
+        db = getattr(self._local, "db", None)
+        if db is not None:
+            yield db # nested use in the same thread, the outer block commits
+            return
+
+        self._slots.acquire()
+        try:
+            try:
+                db = self._idle.get_nowait()
+            except queue.Empty:
+                db = self._open()
+            self._local.db = db
+            try:
+                yield db
+                db.commit()
+            except BaseException:
+                db.rollback()
+                raise
+            finally:
+                self._local.db = None
+                self._idle.put(db)
+        finally:
+            self._slots.release()
+
+    def close(self):
+        """ close every idle connection of the pool """
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_pool(name=DEFAULT_DB, size=POOL_SIZE, durability=DEFAULT_DURABILITY):
+    """
+    Returns the connection pool of a database file, creating it on first use.
+    :param name(str): path of the database file
+    :param size(int): maximum number of connections, only used when the pool is created
+    :param durability(str): durability mode, only used when the pool is created
+    :returns: ConnectionPool
+    """
+    with _pools_lock:
+        pool = _pools.get(name)
+        if pool is None:
+            pool = _pools[name] = ConnectionPool(name, size, durability)
+        return pool
+
+def connection(name=DEFAULT_DB):
+    """
+    Borrows a pooled connection to a database file, to be used in a with statement:
+        with connection() as db:
+            add_completion_date(db, "Exercise")
+    :param name(str): path of the database file
+    :returns: context manager yielding a sqlite3.connection
+    """
+    return get_pool(name).connection()
+
+def close_pools():
+    """ close the idle connections of every pool and forget the pools """
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
+
+
+class _GroupConnection(sqlite3.Connection):
+    """ connection whose commits and rollbacks are left to the GroupCommitter while it runs a group """
+    in_group = False
+
+    def commit(self):
+        if not self.in_group:
+            super().commit()
+
+    def rollback(self):
+        if not self.in_group:
+            super().rollback()
+
+
+class GroupCommitter:
+    """
+    Writer thread that groups the writes submitted close together into one transaction,
+    so a burst of writes pays for one commit (one sync to disk) instead of one each.
+    A group holds the writes queued while the previous group was committing, plus
+    those arriving within the window after its first write.
+
+    The database functions are used unchanged: while a group runs, their own commit
+    and rollback calls are ignored. Each write runs in a savepoint, so a failing write
+    is undone alone and the others of its group are still committed. The future of a
+    write is only resolved once its group is committed.
+
+    Attributes:
+        name(string): path of the database file.
+        window(float): seconds to wait for more writes after the first one of a group,
+            0 only groups the writes already queued, without adding latency.
+        max_batch(integer): maximum number of writes in a group.
+        durability(string): durability mode of the connection, see DURABILITY_MODES.
+    """
+
+    def __init__(self, name=DEFAULT_DB, window=0.0, max_batch=100, durability=DEFAULT_DURABILITY):
+        self.name = name
+        self.window = window
+        self.max_batch = max_batch
+        self.durability = durability
+        self._jobs = queue.Queue()
+        self._db = sqlite3.connect(name, factory=querystats.connection_factory(_GroupConnection),
+                                   check_same_thread=False)
+        configure(self._db, durability)
+        create_table(self._db)
+        self._thread = threading.Thread(target=self._run, name="group-commit", daemon=True)
+        self._thread.start()
+
+    def submit(self, function, *args, **kwargs):
+        """
+        Queues function(db, *args, **kwargs) to run in the next group.
+        :returns: concurrent.futures.Future of the result, resolved after the commit
+        """
+        from concurrent.futures import Future # not imported with the module, to keep the app start fast
+        future = Future()
+        self._jobs.put((future, function, args, kwargs))
+        return future
+
+    def write(self, function, *args, **kwargs):
+        """ runs function(db, *args, **kwargs) in the next group and waits for the commit """
+        return self.submit(function, *args, **kwargs).result()
+
+    def close(self):
+        """ commits the queued writes, then stops the thread and closes the connection """
+        self._jobs.put(None)
+        self._thread.join()
+        self._db.close()
+
+    def _run(self):
+        """ writer thread: collects the writes of a group and commits them together """
+        stopping = False
+        while not stopping:
+            job = self._jobs.get()
+            if job is None:
+                break
+            group = [job]
+            deadline = time.monotonic() + self.window
+            while len(group) < self.max_batch:
+                try:
+                    job = self._jobs.get(timeout=max(0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if job is None:
+                    stopping = True
+                    break
+                group.append(job)
+            self._commit_group(group)
+
+    def _commit_group(self, group):
+        """ runs the writes of a group in one transaction, one savepoint each """
+        db = self._db
+        results = []
+        try:
+            db.execute("BEGIN")
+        except sqlite3.Error as e: # e.g. the database stayed locked longer than busy_timeout
+            for future, *_ in group:
+                future.set_exception(e)
+            return
+        db.in_group = True
+        try:
+            for future, function, args, kwargs in group:
+                db.execute("SAVEPOINT write")
+                try:
+                    result = function(db, *args, **kwargs)
+                except BaseException as e:
+                    db.execute("ROLLBACK TO write")
+                    db.execute("RELEASE write")
+                    future.set_exception(e)
+                else:
+                    db.execute("RELEASE write")
+                    results.append((future, result))
+        finally:
+            db.in_group = False
+        try:
+            db.commit()
+        except sqlite3.Error as e:
+            db.rollback()
+            for future, _ in results:
+                future.set_exception(e)
+            return
+        for future, result in results:
+            future.set_result(result)
+
+
+class ShardRouter:
+    """
+    Spreads the users over several database files (shards) so each file only holds
+    the habits of some users. A user always goes to the same shard: the shard is
+    chosen from a CRC32 of the user name, so the list of files must not change
+    once users have been stored.
+
+    Attributes:
+        names(list): paths of the shard files.
+        size(integer): maximum number of open connections of each shard's pool.
+    """
+
+    def __init__(self, names, size=POOL_SIZE):
+        if not names:
+            raise ValueError("a ShardRouter needs at least one database file")
+        self.names = list(names)
+        self.size = size
+
+    def db_name(self, user=DEFAULT_USER):
+        """ path of the shard holding the habits of a user """
+        return self.names[zlib.crc32(user.encode()) % len(self.names)]
+
+    def connection(self, user=DEFAULT_USER):
+        """
+        Borrows a pooled connection to the shard of a user, to be used in a with statement:
+            with router.connection("alice") as db:
+                add_completion_date(db, "Exercise", user="alice")
+        :param user(str): the user
+        :returns: context manager yielding a sqlite3.connection
+        """
+        return get_pool(self.db_name(user), self.size).connection()
+
+# Version of the schema created by create_table, stored in PRAGMA user_version
+SCHEMA_VERSION = 7
+
+
 def create_table(db):
     """
-    Creates the habits and completions tables in the database if they don't exist.
+    Creates the habits, completions, habit_periods, habit_changes and settings tables in the database if they
+    don't exist, and upgrades databases created by older versions of the app.
     :arg: db : connection object to interact with the SQLite database.
     :returns: None
 
@@ -21,110 +351,890 @@ def create_table(db):
     cur = db.cursor()
 
     # Create habits table
-    cur.execute("""
+    # new columns are declared last so SELECT * keeps the original column positions,
+    # the streak columns are a cache maintained by add_completion_date.
+    # Habit names are unique per user, the unique index also serves the per-user lookups
+    cur.execute(f"""
         CREATE TABLE IF NOT EXISTS habits(
-            habit_name TEXT PRIMARY KEY,
+            habit_name TEXT NOT NULL,
             habit_description TEXT NOT NULL,
             periodicity TEXT NOT NULL,
             creation_date TEXT NOT NULL,
-            times_completed INTEGER DEFAULT 0
+            times_completed INTEGER DEFAULT 0,
+            habit_id INTEGER PRIMARY KEY,
+            current_streak INTEGER NOT NULL DEFAULT 0,
+            longest_streak INTEGER NOT NULL DEFAULT 0,
+            last_period_index INTEGER,
+            user_id TEXT NOT NULL DEFAULT '{DEFAULT_USER}',
+            UNIQUE (user_id, habit_name)
        )
  """)
 
     # Create completions table
-    cur.execute("""
+    # completion_day is the day number of completion_date, used by the streak calculations
+    cur.execute(f"""
     CREATE TABLE IF NOT EXISTS completions(
         habit_name TEXT,
         completion_date TEXT NOT NULL,
-        FOREIGN KEY (habit_name) REFERENCES habits(habit_name)
+        completion_day INTEGER,
+        user_id TEXT NOT NULL DEFAULT '{DEFAULT_USER}',
+        FOREIGN KEY (user_id, habit_name) REFERENCES habits(user_id, habit_name)
+        )
+    """)
+
+    # Create habit_periods table
+    # rollup of the completions: number of completions of a habit in each period (day or week),
+    # kept up to date by the functions writing completions, the streaks are computed from it
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS habit_periods(
+        habit_id INTEGER NOT NULL,
+        period_index INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (habit_id, period_index),
+        FOREIGN KEY (habit_id) REFERENCES habits(habit_id)
+        ) WITHOUT ROWID
+    """)
+
+    # Create habit_changes table
+    # change log of the habits: version of the latest change of each habit, increasing
+    # with every change, so readers can ask which habits changed since a version they saw
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS habit_changes(
+        version INTEGER PRIMARY KEY,
+        user_id TEXT NOT NULL,
+        habit_name TEXT NOT NULL,
+        UNIQUE (user_id, habit_name)
+        )
+    """)
+
+    # Create settings table
+    # the week start and timezone the day numbers, the rollup and the streaks were computed with
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS settings(
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL
         )
     """)
 
+    # bring tables created by an older version up to date
+    migrate(db)
+
+    # new databases, and those created before the settings, store the calendar of the process
+    week_start, timezone = periods.calendar()
+    cur.executemany("INSERT OR IGNORE INTO settings(key, value) VALUES (?, ?)",
+                    (("week_start", str(week_start)), ("timezone", timezone)))
+
+    # every write to a habit or its completions updates its row of the habits table,
+    # the triggers give the habit the next version of the change log
+    for event, row in (("INSERT", "new"), ("UPDATE", "new"), ("DELETE", "old")):
+        cur.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS log_habit_{event.lower()} AFTER {event} ON habits
+            BEGIN
+                INSERT INTO habit_changes(user_id, habit_name) VALUES ({row}.user_id, {row}.habit_name)
+                ON CONFLICT(user_id, habit_name) DO UPDATE
+                SET version = (SELECT max(version) + 1 FROM habit_changes);
+            END
+        """)
+
+    # covering index for the per-habit lookups and deletes on completions
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_completions_habit_date
+        ON completions(user_id, habit_name, completion_date, completion_day)
+    """)
+
+    db.commit()
+
+
+def _columns(db, table):
+    """
+    Returns the column names of a table
+    :param db: connection object to interact with the SQLite database.
+    :param table(str): name of the table
+    :returns: (list) column names
+    """
+    return [row[1] for row in db.execute(f"PRAGMA table_info({table})")]
+
+
+def _add_habit_id(db):
+    """
+    Migration 1: rebuilds the habits table so every habit gets an integer
+    rowid-backed habit_id, keeping habit_name unique.
+    """
+    if "habit_id" in _columns(db, "habits"):
+        return # table already created with the current schema
+
+    cur = db.cursor()
+    cur.execute("""
+        CREATE TABLE habits_new(
+            habit_name TEXT NOT NULL UNIQUE,
+            habit_description TEXT NOT NULL,
+            periodicity TEXT NOT NULL,
+            creation_date TEXT NOT NULL,
+            times_completed INTEGER DEFAULT 0,
+            habit_id INTEGER PRIMARY KEY
+       )
+    """)
+    cur.execute("""
+        INSERT INTO habits_new(habit_name, habit_description, periodicity, creation_date, times_completed)
+        SELECT habit_name, habit_description, periodicity, creation_date, times_completed
+        FROM habits ORDER BY rowid
+    """)
+    cur.execute("DROP TABLE habits")
+    cur.execute("ALTER TABLE habits_new RENAME TO habits")
+
+
+def _add_streak_cache(db):
+    """
+    Migration 2: adds the cached streak columns to the habits table and fills them.
+    """
+    if "current_streak" in _columns(db, "habits"):
+        return
+
+    cur = db.cursor()
+    cur.execute("ALTER TABLE habits ADD COLUMN current_streak INTEGER NOT NULL DEFAULT 0")
+    cur.execute("ALTER TABLE habits ADD COLUMN longest_streak INTEGER NOT NULL DEFAULT 0")
+    cur.execute("ALTER TABLE habits ADD COLUMN last_period_index INTEGER")
+    # the columns are filled by _add_completion_day, once the day numbers exist
+
+
+def _add_completion_day(db):
+    """
+    Migration 3: adds the integer day number of every completion, and adds it to
+    the completions index so the streak calculations read it from the index.
+    """
+    cur = db.cursor()
+    if "completion_day" not in _columns(db, "completions"):
+        cur.execute("ALTER TABLE completions ADD COLUMN completion_day INTEGER")
+        # with the timezone of the process, stored with the calendar by create_table
+        _recompute_completion_days(db)
+    cur.execute("DROP INDEX IF EXISTS idx_completions_habit_date") # recreated by create_table
+    # the streaks are recomputed by _add_user_id, from the day numbers
+
+
+def _add_habit_periods(db):
+    """
+    Migration 4: adds the habit_periods rollup. The table itself is created by create_table,
+    it is filled by _add_user_id once completions are matched to their habit by user.
+    """
+
+
+def _add_user_id(db):
+    """
+    Migration 5: adds the user owning each habit and completion. The habits table is
+    rebuilt so habit names are unique per user instead of globally, the existing
+    habits and completions go to DEFAULT_USER.
+    """
+    cur = db.cursor()
+    if "user_id" not in _columns(db, "habits"):
+        cur.execute(f"""
+            CREATE TABLE habits_new(
+                habit_name TEXT NOT NULL,
+                habit_description TEXT NOT NULL,
+                periodicity TEXT NOT NULL,
+                creation_date TEXT NOT NULL,
+                times_completed INTEGER DEFAULT 0,
+                habit_id INTEGER PRIMARY KEY,
+                current_streak INTEGER NOT NULL DEFAULT 0,
+                longest_streak INTEGER NOT NULL DEFAULT 0,
+                last_period_index INTEGER,
+                user_id TEXT NOT NULL DEFAULT '{DEFAULT_USER}',
+                UNIQUE (user_id, habit_name)
+           )
+        """)
+        cur.execute("""
+            INSERT INTO habits_new(habit_name, habit_description, periodicity, creation_date, times_completed,
+                                   habit_id, current_streak, longest_streak, last_period_index)
+            SELECT habit_name, habit_description, periodicity, creation_date, times_completed,
+                   habit_id, current_streak, longest_streak, last_period_index
+            FROM habits
+        """)
+        cur.execute("DROP TABLE habits")
+        cur.execute("ALTER TABLE habits_new RENAME TO habits")
+    if "user_id" not in _columns(db, "completions"):
+        cur.execute(f"ALTER TABLE completions ADD COLUMN user_id TEXT NOT NULL DEFAULT '{DEFAULT_USER}'")
+    cur.execute("DROP INDEX IF EXISTS idx_completions_habit_date") # recreated by create_table with user_id
+    _rebuild_habit_periods(db)
+    _recompute_streaks(db)
+
+
+def _add_change_log(db):
+    """
+    Migration 6: adds the habit_changes log, created by create_table, with one entry
+    for every existing habit so that the changes since version 0 are all the habits.
+    """
+    db.execute("""
+        INSERT OR IGNORE INTO habit_changes(user_id, habit_name)
+        SELECT user_id, habit_name FROM habits ORDER BY habit_id
+    """)
+
+
+def _add_settings(db):
+    """
+    Migration 7: adds the settings table. It is created by create_table, which also stores
+    the calendar of the process as the one the existing data was computed with.
+    """
+
+
+# Migration steps, MIGRATIONS[i] upgrades a database from version i to i + 1
+MIGRATIONS = [
+    _add_habit_id,
+    _add_streak_cache,
+    _add_completion_day,
+    _add_habit_periods,
+    _add_user_id,
+    _add_change_log,
+    _add_settings,
+]
+
+
+def migrate(db):
+    """
+    Applies the pending schema migrations, based on PRAGMA user_version.
+    Each migration checks the current schema first, so it is safe to run on
+    tables that create_table has just created with the latest schema.
+    :param db: connection object to interact with the SQLite database.
+    :returns: (int) the schema version of the database after migrating
+    """
+    version = db.execute("PRAGMA user_version").fetchone()[0]
+    for step in MIGRATIONS[version:]:
+        step(db)
+        version += 1
+        db.execute(f"PRAGMA user_version = {version}")
     db.commit()
+    return version
 
 
-def add_habit(db,habit_name,habit_description,periodicity,creation_date):
+def add_habit(db,habit_name,habit_description,periodicity,creation_date,user=DEFAULT_USER):
     """
     Adds a new habit to the habits table.
     :param db: connection object to interact with the SQLite database.
     :param habit_name(str): the name of the habit
     :param habit_description(str): the description of the habit
-    :param periodicity(str): the periodicity of the habit ('daily' or 'weekly').
+    :param periodicity(str): the periodicity of the habit, see periods.parse_periodicity
     :param creation_date(datetime): the creation date of the habit
-    :returns:None
+    :param user(str): the user owning the habit
+    :returns:(int) the habit_id of the new habit
     """
+    periodicity = parse_periodicity(periodicity).spec # stored in its canonical form
 
     times_completed = 0 # default value for each new habit
 
     cur = db.cursor()
     cur.execute("""
-        INSERT INTO habits(habit_name, habit_description, periodicity, creation_date, times_completed)
-        VALUES (?,?,?,?,?)
-    """, (habit_name,habit_description,periodicity,creation_date.isoformat(),0))
+        INSERT INTO habits(habit_name, habit_description, periodicity, creation_date, times_completed, user_id)
+        VALUES (?,?,?,?,?,?)
+    """, (habit_name,habit_description,periodicity,creation_date.isoformat(),0,user))
 
     db.commit()
+    return cur.lastrowid
 
-def add_completion_date(db,habit_name,completion_date=None):
+def add_completion_date(db,habit_name,completion_date=None,user=DEFAULT_USER):
     """
     Adds a new Completion date for Habit to the Completions table.
     :param db: connection object to interact with the SQLite database.
     :param habit_name(str): the name of the habit for the completion
     :param completion_date(datetime): the date when the habit was completed.
+    :param user(str): the user owning the habit
     :returns:None
     """
+    _check_calendar(db)
     if completion_date is None:
         completion_date = datetime.now().isoformat()
+    day = day_number(completion_date)
 
     cur = db.cursor()
     cur.execute("""
-        INSERT INTO completions(habit_name, completion_date)
-        VALUES (?,?)
-    """, (habit_name,completion_date))
+        INSERT INTO completions(habit_name, completion_date, completion_day, user_id)
+        VALUES (?,?,?,?)
+    """, (habit_name,completion_date,day,user))
 
-    # Update times completed for the habit
+    # Count the completion in its period and extend the cached streaks with it
     cur.execute("""
-        UPDATE habits 
-        SET times_completed = times_completed + 1
-        WHERE habit_name = ?
-    """,(habit_name,))
+        SELECT habit_id, periodicity, current_streak, longest_streak, last_period_index
+        FROM habits WHERE user_id = ? AND habit_name = ?
+    """, (user, habit_name))
+    row = cur.fetchone()
+    streak_cache = None
+    if row is not None:
+        habit_id, periodicity, *streak_cache = row
+        period = period_index(day, periodicity)
+        _add_period_counts(db, [(habit_id, period, 1)])
+        streak_cache = extend_streak(*streak_cache, period)
+
+    # Update times completed for the habit
+    if streak_cache is None:
+        if row is not None:
+            cur.execute("""
+                UPDATE habits 
+                SET times_completed = times_completed + 1
+                WHERE habit_id = ?
+            """,(habit_id,))
+            _recompute_streaks(db, habit_id) # completion older than the last one
+    else:
+        cur.execute("""
+            UPDATE habits 
+            SET times_completed = times_completed + 1,
+                current_streak = ?, longest_streak = ?, last_period_index = ?
+            WHERE habit_id = ?
+        """,(*streak_cache, habit_id))
 
     db.commit()
 
-def get_habit_data(db,habit_name):
+def add_habits_bulk(db, rows, user=DEFAULT_USER):
+    """
+    Adds many habits to the habits table in a single transaction.
+    :param db: connection object to interact with the SQLite database.
+    :param rows: iterable of (habit_name, habit_description, periodicity, creation_date) tuples,
+                 it can be a generator, rows are inserted while it is consumed.
+    :param user(str): the user owning the habits
+    :returns:(int) number of habits added
+    """
+    def habit_rows():
+        for habit_name, habit_description, periodicity, creation_date in rows:
+            if isinstance(creation_date, datetime):
+                creation_date = creation_date.isoformat()
+            yield habit_name, habit_description, parse_periodicity(periodicity).spec, creation_date, 0, user
+
+    cur = db.cursor()
+    try:
+        cur.executemany("""
+            INSERT INTO habits(habit_name, habit_description, periodicity, creation_date, times_completed, user_id)
+            VALUES (?,?,?,?,?,?)
+        """, habit_rows())
+        db.commit()
+    except BaseException:
+        db.rollback()
+        raise
+    return cur.rowcount
+
+def add_completions_bulk(db, rows, user=DEFAULT_USER):
+    """
+    Adds many completion dates to the Completions table in a single transaction.
+    The times_completed increments and the cached streaks are aggregated per habit
+    and applied with one UPDATE per habit instead of one per row.
+    :param db: connection object to interact with the SQLite database.
+    :param rows: iterable of (habit_name, completion_date) tuples, completion_date being an
+                 ISO string or a datetime. It can be a generator, rows are inserted while it is consumed.
+    :param user(str): the user owning the habits
+    :returns:(int) number of completions added
+    """
+    _check_calendar(db)
+    counts = Counter()
+    period_counts = Counter() # (habit_id, period_index) -> completions added in the period
+    streak_caches = {} # habit_name -> [habit_id, period index function, streak cache], None for unknown habits
+    out_of_order = set()
+    lookup = db.cursor()
+
+    def completion_rows():
+        for habit_name, completion_date in rows:
+            if isinstance(completion_date, datetime):
+                completion_date = completion_date.isoformat()
+            day = day_number(completion_date)
+            counts[habit_name] += 1
+
+            # count the period and extend the habit's cached streaks, loaded the first time the habit is seen
+            if habit_name not in streak_caches:
+                lookup.execute("""
+                    SELECT habit_id, periodicity, current_streak, longest_streak, last_period_index
+                    FROM habits WHERE user_id = ? AND habit_name = ?
+                """, (user, habit_name))
+                row = lookup.fetchone()
+                streak_caches[habit_name] = row and [row[0], parse_periodicity(row[1]).index, row[2:]]
+            state = streak_caches[habit_name]
+            if state is not None:
+                period = state[1](day)
+                period_counts[state[0], period] += 1
+                if habit_name not in out_of_order:
+                    state[2] = extend_streak(*state[2], period)
+                    if state[2] is None:
+                        out_of_order.add(habit_name)
+
+            yield habit_name, completion_date, day, user
+
+    cur = db.cursor()
+    try:
+        cur.executemany("""
+            INSERT INTO completions(habit_name, completion_date, completion_day, user_id)
+            VALUES (?,?,?,?)
+        """, completion_rows())
+
+        # Update the period counts, times completed and the streaks once per habit
+        _add_period_counts(db, ((habit_id, period, count) for (habit_id, period), count in period_counts.items()))
+        extended = {habit_name: state for habit_name, state in streak_caches.items()
+                    if state is not None and habit_name not in out_of_order}
+        cur.executemany("""
+            UPDATE habits
+            SET times_completed = times_completed + ?, current_streak = ?, longest_streak = ?, last_period_index = ?
+            WHERE habit_id = ?
+        """, ((counts[habit_name], *state[2], state[0]) for habit_name, state in extended.items()))
+        # the habits completed out of order only get their count, their streaks are recomputed below
+        cur.executemany("""
+            UPDATE habits
+            SET times_completed = times_completed + ?
+            WHERE user_id = ? AND habit_name = ?
+        """, ((count, user, habit_name) for habit_name, count in counts.items() if habit_name not in extended))
+        for habit_name in out_of_order:
+            _recompute_streaks(db, streak_caches[habit_name][0])
+        db.commit()
+    except BaseException:
+        db.rollback()
+        raise
+    return sum(counts.values())
+
+def get_habit_data(db,habit_name,user=DEFAULT_USER):
     """
     Retrieves data for a specific habit in the habits table
     :param db: Connection object to interact with the SQLite database.
     :param habit_name: name of the habit to retrieve
+    :param user(str): the user owning the habit
     :returns:(Tuple) the habit's information
     """
     cur = db.cursor()
-    cur.execute("SELECT * FROM habits WHERE habit_name = ?", (habit_name,))
+    cur.execute("SELECT * FROM habits WHERE user_id = ? AND habit_name = ?", (user, habit_name))
     return cur.fetchone()
 
-def get_completion_data(db, habit_name):
+def get_habit_info(db, habit_name, user=DEFAULT_USER):
+    """
+    Retrieves a habit and its cached streaks by column name, as shown by the CLI and the HTTP API
+    :param db: Connection object to interact with the SQLite database.
+    :param habit_name: name of the habit to retrieve
+    :param user(str): the user owning the habit
+    :returns:(dict) name, description, periodicity, creation_date, times_completed, current_streak
+              and longest_streak of the habit, None if the habit doesn't exist
+    """
+    cur = db.cursor()
+    cur.execute("""
+        SELECT habit_name AS name, habit_description AS description, periodicity, creation_date,
+               times_completed, current_streak, longest_streak
+        FROM habits WHERE user_id = ? AND habit_name = ?
+    """, (user, habit_name))
+    row = cur.fetchone()
+    return None if row is None else dict(zip([column[0] for column in cur.description], row))
+
+def get_completion_data(db, habit_name, user=DEFAULT_USER):
     """
     Retrieves data for a specific habit in the Completions table
     :param db: connection object to interact with the SQLite database.
     :param habit_name(str):name of the habit to retrieve
+    :param user(str): the user owning the habit
     :param:(list) List of completion dates (str) for the habit.
     """
     cur = db.cursor()
-    cur.execute("SELECT completion_date FROM completions WHERE habit_name = ?", (habit_name,))
+    # the lookup is served by idx_completions_habit_date, rows keep their insertion order
+    cur.execute("""
+        SELECT completion_date FROM completions WHERE user_id = ? AND habit_name = ? ORDER BY rowid
+    """, (user, habit_name))
+    return cur.fetchall()
+
+def _completion_filter(habit_name, since, until, user):
+    """
+    Builds the WHERE conditions selecting a habit's completions in a date range.
+    :returns: (list of conditions, list of parameters)
+    """
+    conditions = ["user_id = ?", "habit_name = ?"]
+    params = [user, habit_name]
+    if since is not None:
+        conditions.append("completion_date >= ?")
+        params.append(since.isoformat() if isinstance(since, datetime) else since)
+    if until is not None:
+        conditions.append("completion_date < ?")
+        params.append(until.isoformat() if isinstance(until, datetime) else until)
+    return conditions, params
+
+def get_completion_page(db, habit_name, since=None, until=None, batch=500, reverse=False, after=None,
+                        user=DEFAULT_USER):
+    """
+    Retrieves one page of a habit's completion dates with keyset pagination: the page
+    starts right after the key of the previous page, following idx_completions_habit_date.
+    :param db: connection object to interact with the SQLite database.
+    :param habit_name(str): name of the habit
+    :param since: only completions at or after this date (ISO string or datetime)
+    :param until: only completions before this date (ISO string or datetime)
+    :param batch(int): maximum number of completion dates in the page
+    :param reverse(bool): latest completions first
+    :param after: key returned with the previous page, None for the first page
+    :param user(str): the user owning the habit
+    :returns: (list of completion dates (str), key of the last row, None when there is no next page)
+    """
+    if batch < 1:
+        raise ValueError(f"the page size must be at least 1, not {batch}")
+    conditions, params = _completion_filter(habit_name, since, until, user)
+    if after is not None:
+        conditions.append(f"(completion_date, completion_day, rowid) {'<' if reverse else '>'} (?, ?, ?)")
+        params.extend(after)
+    order = "DESC" if reverse else "ASC"
+
+    cur = db.cursor()
+    cur.execute(f"""
+        SELECT completion_date, completion_day, rowid FROM completions
+        WHERE {" AND ".join(conditions)}
+        ORDER BY completion_date {order}, completion_day {order}, rowid {order}
+        LIMIT ?
+    """, (*params, batch))
+    rows = cur.fetchmany(batch)
+    return [row[0] for row in rows], (tuple(rows[-1]) if len(rows) == batch else None)
+
+def iter_completions(db, habit_name, since=None, until=None, batch=500, reverse=False, user=DEFAULT_USER):
+    """
+    Iterates over the completion dates of a habit one batch at a time.
+    Each batch is a separate query that resumes after the last row of the previous one
+    (keyset pagination on completion_date), so no cursor stays open between batches and
+    the whole history is never loaded at once.
+    :param db: connection object to interact with the SQLite database.
+    :param habit_name(str): name of the habit
+    :param since: only completions at or after this date (ISO string or datetime)
+    :param until: only completions before this date (ISO string or datetime)
+    :param batch(int): number of rows fetched per query
+    :param reverse(bool): latest completions first
+    :param user(str): the user owning the habit
+    :returns: generator of completion dates (str)
+    """
+    after = None
+    while True:
+        dates, after = get_completion_page(db, habit_name, since, until, batch, reverse, after, user)
+        yield from dates
+        if after is None:
+            return
+
+def count_completions(db, habit_name, since=None, until=None, user=DEFAULT_USER):
+    """
+    Counts the completions of a habit, optionally in a date range.
+    :param db: connection object to interact with the SQLite database.
+    :param habit_name(str): name of the habit
+    :param since: only completions at or after this date (ISO string or datetime)
+    :param until: only completions before this date (ISO string or datetime)
+    :param user(str): the user owning the habit
+    :returns:(int) number of completions
+    """
+    conditions, params = _completion_filter(habit_name, since, until, user)
+    cur = db.cursor()
+    cur.execute(f"SELECT COUNT(*) FROM completions WHERE {' AND '.join(conditions)}", params)
+    return cur.fetchone()[0]
+
+def get_completion_days(db, habit_name, user=DEFAULT_USER):
+    """
+    Retrieves the day numbers (days since 1970-01-01) of a habit's completions
+    :param db: connection object to interact with the SQLite database.
+    :param habit_name(str):name of the habit to retrieve
+    :param user(str): the user owning the habit
+    :returns:(list) day numbers (int) in ascending order
+    """
+    cur = db.cursor()
+    # not the order of completion_date: with a timezone, a date written with another UTC offset can fall on another day
+    cur.execute("""
+        SELECT completion_day FROM completions WHERE user_id = ? AND habit_name = ?
+        ORDER BY completion_day, completion_date, rowid
+    """, (user, habit_name))
+    return [row[0] for row in cur]
+
+def get_habit_id(db, habit_name, user=DEFAULT_USER):
+    """
+    Retrieves the integer id of a habit
+    :param db: connection object to interact with the SQLite database.
+    :param habit_name(str): name of the habit
+    :param user(str): the user owning the habit
+    :returns: (int) the habit_id, or None if the habit doesn't exist
+    """
+    cur = db.cursor()
+    cur.execute("SELECT habit_id FROM habits WHERE user_id = ? AND habit_name = ?", (user, habit_name))
+    row = cur.fetchone()
+    return row[0] if row else None
+
+def get_habit_periods(db, habit_name, user=DEFAULT_USER):
+    """
+    Retrieves the periods (days or weeks) in which a habit was completed, from the
+    habit_periods rollup: one row per period instead of one per completion.
+    :param db: connection object to interact with the SQLite database.
+    :param habit_name(str): name of the habit
+    :param user(str): the user owning the habit
+    :returns:(list) (period_index, number of completions) tuples in ascending period order
+    """
+    cur = db.cursor()
+    cur.execute("""
+        SELECT p.period_index, p.count
+        FROM habits h JOIN habit_periods p ON p.habit_id = h.habit_id
+        WHERE h.user_id = ? AND h.habit_name = ?
+        ORDER BY p.period_index
+    """, (user, habit_name))
     return cur.fetchall()
 
-def delete_habit(db,habit_name):
+def get_data_version(db):
+    """
+    Retrieves the version of the latest change to the habits, it grows with every write.
+    :param db: connection object to interact with the SQLite database.
+    :returns:(int) the version, 0 if nothing was written yet
+    """
+    return db.execute("SELECT coalesce(max(version), 0) FROM habit_changes").fetchone()[0]
+
+def get_changed_habits(db, since=0, user=DEFAULT_USER):
+    """
+    Retrieves the habits of a user added, changed, completed or deleted after a version.
+    :param db: connection object to interact with the SQLite database.
+    :param since(int): version returned by get_data_version or a previous call
+    :param user(str): the user owning the habits
+    :returns: (version, list of habit names), pass the version to the next call
+    """
+    cur = db.cursor()
+    version = get_data_version(db)
+    # the upper bound leaves the writes committed during the call to the next call
+    cur.execute("""
+        SELECT habit_name FROM habit_changes
+        WHERE version > ? AND version <= ? AND user_id = ?
+        ORDER BY version
+    """, (since, version, user))
+    return version, [row[0] for row in cur.fetchall()]
+
+def get_calendar(db):
+    """
+    Returns the calendar the day numbers, periods and streaks of the database were computed with
+    :param db: connection object to interact with the SQLite database.
+    :returns: (week_start(int), timezone name(str)) like periods.calendar()
+    """
+    settings = dict(db.execute("SELECT key, value FROM settings WHERE key IN ('week_start', 'timezone')"))
+    return int(settings["week_start"]), settings["timezone"]
+
+def use_calendar(db):
+    """
+    Configures the process with the calendar stored in a database, see periods.configure.
+    Opening a database never changes the calendar: the programs working on one database
+    (the GUI, the CLI, the HTTP server and the maintenance command) call this when they start.
+    :param db: connection object to interact with the SQLite database.
+    :returns: None
+    """
+    periods.configure(*get_calendar(db))
+
+def _check_calendar(db):
+    """
+    Raises ValueError if the process doesn't use the calendar of the database, so a write
+    never mixes the days or periods of two calendars.
+    :param db: connection object to interact with the SQLite database.
+    :returns: None
+    """
+    stored = get_calendar(db)
+    if stored != periods.calendar():
+        raise ValueError(f"the database uses the calendar (week start, timezone) {stored} and this process "
+                         f"{periods.calendar()}, use its calendar with use_calendar or convert it with "
+                         f"rebuild_streak_cache(db, convert=True)")
+
+def _add_period_counts(db, rows):
+    """
+    Adds completions to the counts of the habit_periods rollup, without committing.
+    :param db: connection object to interact with the SQLite database.
+    :param rows: iterable of (habit_id, period_index, number of completions added) tuples
+    :returns: None
+    """
+    db.executemany("""
+        INSERT INTO habit_periods(habit_id, period_index, count) VALUES (?,?,?)
+        ON CONFLICT(habit_id, period_index) DO UPDATE SET count = count + excluded.count
+    """, rows)
+
+def _rebuild_habit_periods(db, habit_id=None):
+    """
+    Rebuilds the habit_periods rollup from the completions, without committing.
+    :param db: connection object to interact with the SQLite database.
+    :param habit_id(int): only rebuild this habit, all habits when None
+    :returns: None
+    """
+    cur = db.cursor()
+    if habit_id is None:
+        cur.execute("DELETE FROM habit_periods")
+        where, params = "", ()
+    else:
+        cur.execute("DELETE FROM habit_periods WHERE habit_id = ?", (habit_id,))
+        where, params = "WHERE h.habit_id = ?", (habit_id,)
+
+    cur.execute(f"""
+        SELECT h.habit_id, h.periodicity, c.completion_day
+        FROM habits h JOIN completions c ON c.user_id = h.user_id AND c.habit_name = h.habit_name
+        {where}
+        ORDER BY h.habit_id
+    """, params)
+
+    def period_counts():
+        # one habit at a time, so only the periods of one habit are held in memory,
+        # and in primary key order so the rows are appended to the rollup
+        for (habit_id, periodicity), rows in groupby(cur, key=lambda row: row[:2]):
+            index = parse_periodicity(periodicity).index # parsed once per habit
+            counts = Counter(index(row[2]) for row in rows if row[2] is not None)
+            for period, count in sorted(counts.items()):
+                yield habit_id, period, count
+
+    _add_period_counts(db, period_counts())
+
+def delete_habit(db,habit_name,user=DEFAULT_USER):
     """
     Deletes a habit and its associated completion record from the database
     :param db: connection object to interact with the SQLite database.
     :param habit_name(str): name of the habit to delete
+    :param user(str): the user owning the habit
     :returns: None
     """
     cur = db.cursor()
 
+    # delete the habit's periods from the rollup, while its habit_id can still be looked up
+    cur.execute("""
+        DELETE FROM habit_periods
+        WHERE habit_id = (SELECT habit_id FROM habits WHERE user_id = ? AND habit_name = ?)
+    """, (user, habit_name))
+
     # delete the habit from the Habits table
-    cur.execute("DELETE FROM habits WHERE habit_name = ?", (habit_name,))
+    cur.execute("DELETE FROM habits WHERE user_id = ? AND habit_name = ?", (user, habit_name))
 
     # delete the associated completion record from the completion table
-    cur.execute("DELETE FROM completions WHERE habit_name = ?", (habit_name,))
+    cur.execute("DELETE FROM completions WHERE user_id = ? AND habit_name = ?", (user, habit_name))
+
+    db.commit()
+
+def update_habit(db, habit_name, habit_description, periodicity, user=DEFAULT_USER):
+    """
+    Updates the description and periodicity of a habit.
+    The habit's periods and cached streaks are recomputed when the periodicity changes.
+    :param db: connection object to interact with the SQLite database.
+    :param habit_name(str): name of the habit to update
+    :param habit_description(str): the new description
+    :param periodicity(str): the new periodicity, see periods.parse_periodicity
+    :param user(str): the user owning the habit
+    :returns: None
+    """
+    periodicity = parse_periodicity(periodicity).spec
+    _check_calendar(db)
+    cur = db.cursor()
+    cur.execute("SELECT habit_id, periodicity FROM habits WHERE user_id = ? AND habit_name = ?", (user, habit_name))
+    row = cur.fetchone()
+    cur.execute(
+        "UPDATE habits SET habit_description = ?, periodicity = ? WHERE user_id = ? AND habit_name = ?",
+        (habit_description, periodicity, user, habit_name)
+    )
+    if row is not None and row[1] != periodicity:
+        _rebuild_habit_periods(db, row[0])
+        _recompute_streaks(db, row[0])
+
+    db.commit()
+
+def delete_completion_date(db, habit_name, completion_date, user=DEFAULT_USER):
+    """
+    Deletes one completion of a habit and updates its period count. The cached streaks
+    are only recomputed when the last completion of a period is deleted.
+    :param db: connection object to interact with the SQLite database.
+    :param habit_name(str): name of the habit
+    :param completion_date(str): the completion date to delete
+    :param user(str): the user owning the habit
+    :returns:(bool) True if a completion was deleted
+    """
+    _check_calendar(db)
+    cur = db.cursor()
+    cur.execute("""
+        SELECT rowid, completion_day FROM completions
+        WHERE user_id = ? AND habit_name = ? AND completion_date = ? LIMIT 1
+    """, (user, habit_name, completion_date))
+    row = cur.fetchone()
+    if row is None:
+        return False
+    rowid, day = row
+
+    cur.execute("DELETE FROM completions WHERE rowid = ?", (rowid,))
+    cur.execute("""
+        UPDATE habits 
+        SET times_completed = times_completed - 1
+        WHERE user_id = ? AND habit_name = ?
+    """, (user, habit_name))
+    cur.execute("SELECT habit_id, periodicity FROM habits WHERE user_id = ? AND habit_name = ?", (user, habit_name))
+    habit = cur.fetchone()
+    if habit is not None:
+        habit_id, periodicity = habit
+        period = period_index(day, periodicity)
+        cur.execute("""
+            UPDATE habit_periods SET count = count - 1 WHERE habit_id = ? AND period_index = ?
+        """, (habit_id, period))
+        cur.execute("""
+            DELETE FROM habit_periods WHERE habit_id = ? AND period_index = ? AND count <= 0
+        """, (habit_id, period))
+        if cur.rowcount > 0:
+            _recompute_streaks(db, habit_id) # the period has no completion left
+
+    db.commit()
+    return True
+
+def _recompute_streaks(db, habit_id=None):
+    """
+    Recomputes the cached streaks from the habit_periods rollup, without committing.
+    All the habits are read in one scan, one row per completed period.
+    :param db: connection object to interact with the SQLite database.
+    :param habit_id(int): only recompute this habit, all habits when None
+    :returns:(list) names of the habits whose cached streaks were out of date
+    """
+    cur = db.cursor()
+    where = "WHERE h.habit_id = ?" if habit_id is not None else ""
+    cur.execute(f"""
+        SELECT h.habit_id, h.habit_name, h.current_streak, h.longest_streak, h.last_period_index, p.period_index
+        FROM habits h LEFT JOIN habit_periods p ON p.habit_id = h.habit_id
+        {where}
+        ORDER BY h.habit_id, p.period_index
+    """, () if habit_id is None else (habit_id,))
+
+    updates = []
+    names = []
+    for (habit_id, name, *cached), rows in groupby(cur, key=lambda row: row[:5]):
+        summary = streak_summary(row[5] for row in rows if row[5] is not None)
+        if summary != tuple(cached):
+            updates.append((*summary, habit_id))
+            names.append(name)
+
+    cur.executemany("""
+        UPDATE habits
+        SET current_streak = ?, longest_streak = ?, last_period_index = ?
+        WHERE habit_id = ?
+    """, updates)
+    return names
+
+def _recompute_completion_days(db):
+    """
+    Recomputes the day number of every completion with the timezone of the process, without committing.
+    :param db: connection object to interact with the SQLite database.
+    :returns: None
+    """
+    cur = db.cursor()
+    cur.execute("SELECT rowid, completion_date, completion_day FROM completions")
+    updates = []
+    for rowid, completion_date, stored_day in cur:
+        day = day_number(completion_date)
+        if day != stored_day:
+            updates.append((day, rowid))
+    cur.executemany("UPDATE completions SET completion_day = ? WHERE rowid = ?", updates)
+
+def rebuild_streak_cache(db, convert=False):
+    """
+    Rebuilds the habit_periods rollup from the completions, then verifies the cached
+    streaks of every habit, of every user, against it and repairs them.
+    :param db: connection object to interact with the SQLite database.
+    :param convert(bool): convert the database to the calendar of the process (see periods.configure):
+                          the day numbers of the completions are recomputed first if the timezone
+                          changed, and the new calendar is stored. Without it, a database using
+                          another calendar raises ValueError.
+    :returns:(list) names of the habits whose cached streaks had to be repaired
+    """
+    if not convert:
+        _check_calendar(db)
+    try:
+        week_start, timezone = periods.calendar()
+        if get_calendar(db)[1] != timezone:
+            _recompute_completion_days(db)
+        db.executemany("UPDATE settings SET value = ? WHERE key = ?",
+                       ((str(week_start), "week_start"), (timezone, "timezone")))
+        _rebuild_habit_periods(db)
+        repaired = _recompute_streaks(db)
+        db.commit()
+    except BaseException:
+        db.rollback()
+        raise
+    return repaired
+
 
-    db.commit()
\ No newline at end of file
+if __name__ == "__main__":
+    # maintenance command: python database.py [database file]
+    import sys
+    db = get_db(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_DB)
+    use_calendar(db)
+    repaired = rebuild_streak_cache(db)
+    db.close()
+    print(f"Repaired the streak cache of {len(repaired)} habit(s)" + (": " + ", ".join(repaired) if repaired else ""))
@@ -1,6 +1,9 @@
 import sqlite3
-from datetime import datetime , timedelta
+from contextlib import nullcontext
+from datetime import datetime
 import database
+from periods import day_number, parse_periodicity
+from streaks import streak_summary
 
 
 class Habit:
@@ -10,13 +13,23 @@ class Habit:
     Attributes:
         name(string): The name of the habit.
         description(string):Provide additional details about the habit.
-        periodicity(string): Indicates if the habit has to be completed daily or weekly.
+        periodicity(string): How often the habit has to be completed: daily, weekly, monthly,
+            weekdays, every N days or every N weeks (see periods.parse_periodicity).
         creation_date(date): Records when the habit was created.
         times_completed (integer): Keep tracking the total number of times the habit has been completed.
-        completion_dates(list): a list to track all completion dates of the habit.
+        completion_dates(list): a list to track all completion dates of the habit,
+            habits created by Habit.load only fetch it when it is first used.
+        user(string): the user owning the habit.
     """
 
-    def __init__(self,name,description,periodicity):
+    # fixed set of attributes, no per-instance __dict__ for bulk analysis of many habits
+    __slots__ = ("name", "description", "periodicity", "creation_date", "times_completed",
+                 "user", "_completion_dates", "_db")
+
+    # database file used by the habit methods
+    db_name = database.DEFAULT_DB
+
+    def __init__(self,name,description,periodicity,user=database.DEFAULT_USER):
         """ Initializes the Habit instance with a name,description and periodicity,
             Initializes times_completed to 0, and completion_dates to a empty list """
         self.name = name
@@ -24,22 +37,80 @@ class Habit:
         self.periodicity = periodicity # Daily or weekly
         self.creation_date = datetime.now()  # Automatically sets the creation date
         self.times_completed = 0 # Track the total number of times the habit has been completed
+        self.user = user
         self.completion_dates = [] # List for track all completion dates
+        self._db = None # connection given to Habit.load, None to use the pool of db_name
 
         # save the habit to the database and initialize completion dates
         self.save_to_db()
         self.get_completion_dates()
 
 
+    @classmethod
+    def load(cls, db, name, user=database.DEFAULT_USER):
+        """
+        Creates a Habit from its row in the database, without writing anything and
+        without fetching the completion dates until they are used.
+        :param db: connection object to interact with the SQLite database, it has to stay open
+                   until completion_dates is first used.
+        :param name: name of the habit
+        :param user: the user owning the habit
+        :returns: the Habit, or None if there is no habit with this name
+        """
+        habit_data = database.get_habit_data(db, name, user)
+        return cls._from_row(db, habit_data) if habit_data else None
+
+    @classmethod
+    def load_all(cls, db, user=database.DEFAULT_USER):
+        """
+        Creates a Habit for every habit of a user with a single query,
+        without fetching their completion dates.
+        :param db: connection object to interact with the SQLite database.
+        :param user: the user owning the habits
+        :returns: list of Habit objects
+        """
+        cur = db.cursor()
+        cur.execute("SELECT * FROM habits WHERE user_id = ? ORDER BY habit_name", (user,))
+        return [cls._from_row(db, habit_data) for habit_data in cur]
+
+    @classmethod
+    def _from_row(cls, db, habit_data):
+        """ builds a Habit from a row of the habits table, bypassing __init__ """
+        habit = cls.__new__(cls)
+        habit.name, habit.description, habit.periodicity = habit_data[:3]
+        habit.creation_date = datetime.fromisoformat(habit_data[3])
+        habit.times_completed = habit_data[4]
+        habit.user = habit_data[9]
+        habit._completion_dates = None # fetched on first access
+        habit._db = db
+        return habit
+
+    @property
+    def completion_dates(self):
+        """ completion dates of the habit, fetched from the database the first time they are used """
+        if self._completion_dates is None:
+            self.get_completion_dates()
+        return self._completion_dates
+
+    @completion_dates.setter
+    def completion_dates(self, completion_dates):
+        self._completion_dates = completion_dates
+
     """ Methods """
 
+    def _database(self):
+        """ connection to use: the one given to Habit.load, else a pooled connection to db_name """
+        if self._db is not None:
+            return nullcontext(self._db)
+        return database.connection(self.db_name)
+
     def save_to_db(self):
         """
         saves the habit data into the database
         """
         try:
-            with database.get_db() as db:
-                database.add_habit(db, self.name, self.description, self.periodicity, self.creation_date)
+            with self._database() as db:
+                database.add_habit(db, self.name, self.description, self.periodicity, self.creation_date, self.user)
         except sqlite3.IntegrityError:
             print(f"Habit {self.name} already exists in the database")
 
@@ -53,69 +124,52 @@ class Habit:
         # Gets the current date and time when the habit is completed
         completion_date = datetime.now().isoformat()
 
-        # Append the completion date and time to the list
-        self.completion_dates.append(completion_date)
+        # Append the completion date and time to the list, unless it wasn't fetched yet:
+        # it will be read from the database with the others
+        if self._completion_dates is not None:
+            self._completion_dates.append(completion_date)
 
         # increments the total counter of the times the habit has been completed
         self.times_completed += 1
 
         # save the completion date to the database
-        db = database.get_db()
-        try:
-            database.add_completion_date(db, self.name, completion_date)
-            db.commit() # commit the changes
-        finally:
-            db.close() # close the database connection
+        with self._database() as db:
+            database.add_completion_date(db, self.name, completion_date, self.user)
 
 
     def check_streak(self):
 
         """
         Calculate the current streak based on the habit periodicity
-        Streak = is the number of consecutive periods (days or weeks) where the habit has been completed
+        Streak = is the number of consecutive periods (days, weeks, ...) where the habit has been completed
         For daily habits, it counts how many consecutive days the habit has been completed
-        For weekly habits, it counts how many consecutive weeks the habit has been completed
+        For weekly habits, it counts how many consecutive weeks the habit has been completed,
+        weeks start on periods.WEEK_START
 
         :returns: (int)  The current streak of consecutive completions.
         """
 
+        if self._completion_dates is None and self._db is not None:
+            # loaded habit without its history: read the compact per-period rollup instead
+            periods = [period for period, _ in database.get_habit_periods(self._db, self.name, self.user)]
+            return streak_summary(periods)[0]
+
         if not self.completion_dates:
             return 0 # no completions, no streak
 
-        # Sort the completion dates to ensure they are in order
-        self.completion_dates.sort()
-
-        # convert completion dates to just the date part (ignore the time)
-        completion_dates_only = [datetime.fromisoformat(date).date() for date in self.completion_dates]
-
-        streak = 1 # minimun streak if there's at least one completion
-        last_date = completion_dates_only [-1]
-
-        if self.periodicity == 'daily':
-            for i in range(len(completion_dates_only)-2,-1,-1):
-                expected_date = last_date - timedelta(days=1)
-                if completion_dates_only[i] == expected_date:
-                    streak += 1
-                    last_date = completion_dates_only[i]
-                else:
-                    break # break the loop if there is a gap in consecutive days
-
-        elif self.periodicity == 'weekly':
-            for i in range(len(completion_dates_only)-2,-1,-1):
-                expected_date = last_date - timedelta(weeks=1)
-                if completion_dates_only[i] <= expected_date <= completion_dates_only[i] + timedelta (days=6):
-                    streak += 1
-                    last_date = completion_dates_only[i]
-                else:
-                    break #break the loop if there is a gap in consecutive weeks
+        # convert completion dates to period indexes (day, week, month... numbers), the time is ignored,
+        # sorted as numbers: with a timezone, the text order of dates with different UTC offsets isn't the day order
+        index = parse_periodicity(self.periodicity).index
+        periods = sorted(index(day_number(date)) for date in self.completion_dates)
 
-        return streak
+        # the current streak is the run of consecutive periods that ends with the last completion
+        current_streak, longest_streak, last_period = streak_summary(periods)
+        return current_streak
 
     def get_completion_dates(self):
         """ get the completion dates for this habit from the database"""
-        db = database.get_db()
-        completion_data = database.get_completion_data(db,self.name)
-        db.close()
+        with self._database() as db:
+            completion_data = database.get_completion_data(db,self.name,self.user)
         self.completion_dates = [date[0] for date in completion_data]
         return self.completion_dates
 
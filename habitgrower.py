@@ -0,0 +1,253 @@
+"""
+Command line interface of the Habit Grower App, for scripts, cron jobs and servers.
+It works without a display: it only uses database.py and analyze.py, never tkinter,
+and imports them only once the command line has been parsed.
+
+Examples:
+    python habitgrower.py add Exercise --description "Daily workout" --periodicity daily
+    python habitgrower.py complete Exercise
+    python habitgrower.py --json streaks
+    python habitgrower.py export --habits habits.csv --completions completions.jsonl
+"""
+import argparse
+import json
+import sys
+
+# Week starts of rebuild-cache --week-start, in the order of periods.MONDAY to periods.SUNDAY
+WEEKDAYS = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+
+
+def add_command(db, args):
+    """ adds a new habit """
+    from datetime import datetime
+    from database import add_habit
+
+    creation_date = datetime.now()
+    habit_id = add_habit(db, args.name, args.description, args.periodicity, creation_date, args.user)
+    return {"habit_id": habit_id, "name": args.name, "description": args.description,
+            "periodicity": args.periodicity, "creation_date": creation_date.isoformat()}
+
+def complete_command(db, args):
+    """ marks a habit as completed, now or at the given date """
+    from datetime import datetime
+    from database import add_completion_date, get_habit_data
+
+    if not get_habit_data(db, args.name, args.user):
+        raise LookupError(f"No habit found with the name '{args.name}'")
+    completion_date = args.date or datetime.now().isoformat()
+    datetime.fromisoformat(completion_date) # reject invalid dates before writing
+    add_completion_date(db, args.name, completion_date, args.user)
+    return {"name": args.name, "completion_date": completion_date}
+
+def info_command(db, args):
+    """ shows a habit with its streaks and latest completion dates """
+    from database import get_completion_page, get_habit_info
+
+    info = get_habit_info(db, args.name, args.user)
+    if info is None:
+        raise LookupError(f"No habit found with the name '{args.name}'")
+    info["latest_completions"], _ = get_completion_page(db, args.name, batch=args.limit, reverse=True,
+                                                        user=args.user)
+    return info
+
+def streaks_command(db, args):
+    """ shows the longest streak of every habit, or the streak details of one habit """
+    if args.name:
+        from analyze import streak_details
+
+        details = streak_details(db, args.name, user=args.user)
+        if details is None:
+            raise LookupError(f"No habit found with the name '{args.name}'")
+        return details
+
+    from analyze import longest_streaks
+    return longest_streaks(db, args.user)
+
+def list_command(db, args):
+    """ lists the tracked habits, optionally only one periodicity """
+    from analyze import list_habit_by_periodicity, list_tracked_habits
+
+    if args.periodicity:
+        return list_habit_by_periodicity(db, args.periodicity, args.user)
+    return list_tracked_habits(db, args.user)
+
+def _transfer_result(habits, completions):
+    """ result of an import or export: rows of each file and the overall rate """
+    rows = habits["rows"] + completions["rows"]
+    seconds = habits["seconds"] + completions["seconds"]
+    return {"habits": habits["rows"], "completions": completions["rows"], "seconds": round(seconds, 3),
+            "rows_per_second": round(rows / seconds) if seconds else 0}
+
+def export_command(db, args):
+    """ writes the habits and completions of the user to CSV or JSON Lines files """
+    from transfer import export_completions, export_habits
+
+    return _transfer_result(export_habits(db, args.habits, user=args.user),
+                            export_completions(db, args.completions, user=args.user))
+
+def import_command(db, args):
+    """ adds the habits and completions of CSV or JSON Lines files to the user """
+    from transfer import import_completions, import_habits
+
+    def progress(report):
+        print(f"{report['rows']} completions, {report['rows_per_second']:.0f} rows/s", file=sys.stderr)
+
+    habits = import_habits(db, args.habits, chunk_size=args.chunk, user=args.user)
+    completions = import_completions(db, args.completions, chunk_size=args.chunk,
+                                     progress=None if args.json else progress, user=args.user)
+    return _transfer_result(habits, completions)
+
+def report_command(db, args):
+    """ recomputes the streaks of every habit from its history, in parallel processes """
+    from reports import streak_report
+
+    return streak_report(args.db_name, args.workers, user=args.user)
+
+def snapshot_command(db, args):
+    """ writes a binary snapshot of the habits and completions of the user """
+    from snapshot import write_snapshot
+
+    return write_snapshot(db, args.path, args.user)
+
+def rebuild_cache_command(db, args):
+    """ verifies and repairs the cached streaks of every user, converting the database to another calendar if asked """
+    import periods
+    from database import rebuild_streak_cache
+
+    convert = args.week_start is not None or args.timezone is not None
+    if convert:
+        # the options not given keep the calendar of the database, used since main() opened it
+        week_start = periods.WEEK_START if args.week_start is None else WEEKDAYS.index(args.week_start)
+        timezone = periods.TIMEZONE if args.timezone is None else args.timezone
+        periods.configure(week_start, None if timezone == "none" else timezone)
+    return {"repaired": rebuild_streak_cache(db, convert)}
+
+
+def format_text(result):
+    """
+    Formats a command result for people: one line per item or per key.
+    :param result: dict, list or scalar returned by a command
+    :returns:(str) the text to print
+    """
+    if isinstance(result, dict):
+        return "\n".join(f"{key}: {format_value(value)}" for key, value in result.items())
+    if isinstance(result, list):
+        return "\n".join(format_value(value) for value in result)
+    return format_value(result)
+
+def format_value(value):
+    """ formats one value of a command result """
+    if isinstance(value, list):
+        return ", ".join(format_value(item) for item in value) if value else "none"
+    return str(value)
+
+
+def periodicity(spec):
+    """ argparse type of the periodicities, returns their canonical spec """
+    from periods import parse_periodicity
+
+    try:
+        return parse_periodicity(spec).spec
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e)) from None
+
+
+def build_parser():
+    """
+    Creates the argument parser with one subcommand per operation.
+    :returns: argparse.ArgumentParser
+    """
+    parser = argparse.ArgumentParser(prog="habitgrower", description="Track and analyze habits from the command line.")
+    parser.add_argument("--db", help="database file (default: db/main.db)")
+    parser.add_argument("--user", help="user owning the habits (default: default)")
+    parser.add_argument("--json", action="store_true", help="print machine-readable JSON")
+    parser.add_argument("--stats", action="store_true", help="print the statistics of the SQL statements run to stderr")
+    parser.add_argument("--slow-ms", type=float, help="log the SQL statements slower than this many milliseconds")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    add = commands.add_parser("add", help="create a habit")
+    add.add_argument("name")
+    add.add_argument("--description", required=True)
+    add.add_argument("--periodicity", required=True, type=periodicity,
+                     help="daily, weekly, monthly, weekdays, 'every N days' or 'every N weeks'")
+    add.set_defaults(handler=add_command)
+
+    complete = commands.add_parser("complete", help="mark a habit as completed")
+    complete.add_argument("name")
+    complete.add_argument("--date", help="ISO date of the completion (default: now)")
+    complete.set_defaults(handler=complete_command)
+
+    info = commands.add_parser("info", help="show a habit")
+    info.add_argument("name")
+    info.add_argument("--limit", type=int, default=20, help="number of latest completion dates to show")
+    info.set_defaults(handler=info_command)
+
+    streaks = commands.add_parser("streaks", help="longest streak of every habit, or details of one habit")
+    streaks.add_argument("name", nargs="?")
+    streaks.set_defaults(handler=streaks_command)
+
+    habits = commands.add_parser("list", help="list the tracked habits")
+    habits.add_argument("--periodicity", type=periodicity)
+    habits.set_defaults(handler=list_command)
+
+    for name, handler, help in (("export", export_command, "write the habits and completions to files"),
+                                ("import", import_command, "add the habits and completions of files")):
+        transfer = commands.add_parser(name, help=help + " (.csv or .jsonl)")
+        transfer.add_argument("--habits", required=True, help="file of the habits")
+        transfer.add_argument("--completions", required=True, help="file of the completions")
+        if name == "import":
+            transfer.add_argument("--chunk", type=int, default=50_000, help="rows imported per transaction")
+        transfer.set_defaults(handler=handler)
+
+    report = commands.add_parser("report", help="recompute the streaks of every habit in parallel processes")
+    report.add_argument("--workers", type=int, help="number of worker processes (default: one per CPU)")
+    report.set_defaults(handler=report_command)
+
+    snapshot = commands.add_parser("snapshot", help="write a binary snapshot for batch analyses")
+    snapshot.add_argument("path")
+    snapshot.set_defaults(handler=snapshot_command)
+
+    rebuild = commands.add_parser("rebuild-cache", help="verify and repair the cached streaks")
+    rebuild.add_argument("--week-start", choices=WEEKDAYS, help="convert the database to weeks starting on this day")
+    rebuild.add_argument("--timezone", help="convert the database to this IANA timezone, 'none' to take the dates as written")
+    rebuild.set_defaults(handler=rebuild_cache_command)
+    return parser
+
+
+def main(argv=None):
+    """
+    Runs one command.
+    :param argv: command line arguments, defaults to sys.argv[1:]
+    :returns:(int) exit status, 0 on success and 1 on error
+    """
+    args = build_parser().parse_args(argv)
+
+    import sqlite3
+    import database
+    import querystats
+
+    if args.stats or args.slow_ms is not None:
+        querystats.enable(None if args.slow_ms is None else args.slow_ms / 1000)
+    args.user = args.user or database.DEFAULT_USER
+    args.db_name = args.db or database.DEFAULT_DB
+    db = database.get_db(args.db_name)
+    try:
+        database.use_calendar(db)
+        result = args.handler(db, args)
+    except (LookupError, ValueError, OSError, sqlite3.Error) as e:
+        if args.json:
+            print(json.dumps({"error": str(e)}), file=sys.stderr)
+        else:
+            print(f"Error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        db.close()
+        if args.stats:
+            print(querystats.format_stats(querystats.stats()), file=sys.stderr)
+
+    print(json.dumps(result) if args.json else format_text(result))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,18 +5,20 @@ from select import select
 
 from habit import Habit
 from analyze import (
-    list_tracked_habits,
     list_habit_by_periodicity,
-    longest_historical_streak_for_habit,
-    longest_historical_streak
+    longest_historical_streak,
+    longest_streaks
 )
-from database import get_db, delete_habit, add_habit, add_completion_date, get_habit_data, get_completion_data
+import database
+from database import get_completion_page
+from periods import PERIODICITY_HELP, parse_periodicity
 from datetime import datetime
+from worker import DatabaseWorker
+
+# Database used by the app
+DB_NAME = "db/main.db" ## Run main_preload_data.py for use the preload_data
+                       ## Or also change to "db/preload_test_data.db" to run the app with preload data
 
-# initialize the main application window
-root = tk.Tk()
-root.title("HABIT GROWER")
-root.geometry("600x700")
 # Custom colors and styles
 bg_color = "#282c34" # gives a dark background color
 title_color = "#61dafb" # Light blue color for tittle
@@ -24,35 +26,44 @@ button_color = "#007acc" # Button color
 button_hover = "#005f99" # Hover color for buttons
 text_color = "#ffffff" # white text color
 
-# Set background color for the main window
-root.configure(bg=bg_color)
-# Function to connect to the main database
-def get_database():
-    """Function to get a connection to the main database."""
-    return get_db("db/main.db") ## Run main_preload_data.py for use the preload_data
-                                ## Or also change to "db/preload_test_data.db" to run the app with preload data
+# number of completion dates shown at once in the habit info
+HISTORY_PAGE_SIZE = 20
+# how often the GUI picks up the results of the database jobs, in milliseconds
+POLL_INTERVAL = 50
+
+# main window, busy indicator and background database worker, created by main()
+root = None
+busy_label = None
+worker = None
+
+def ask_periodicity(prompt):
+    """Asks the user for a periodicity, returns its canonical form, or None after showing an error"""
+    periodicity = simpledialog.askstring("Periodicity", f"{prompt}: {PERIODICITY_HELP}")
+    try:
+        return parse_periodicity(periodicity).spec
+    except ValueError:
+        messagebox.showerror("Error", f"Invalid periodicity. Choose {PERIODICITY_HELP}")
+        return None
 
 # Functionalities of the app
+# The database work runs in the background worker, each handler asks the user for input
+# and hands a callback to the worker that shows the result once the job is done.
+# The habit metadata goes through the worker's cache, whose writes drop the entries they change.
 def create_habit_app():
     """Ask te user for habit details and adds it to the database"""
     name = simpledialog.askstring("Name", "Enter habit name")
     description = simpledialog.askstring("Description", "Enter habit description")
-    periodicity = simpledialog.askstring("Periodicity", "Enter periodicity: 'daily' or 'weekly'")
-
     # check if periodicity is correct
-    if periodicity not in ["daily", "weekly"]:
-        messagebox.showerror("Error", "Invalid periodicity. Choose 'daily' or 'weekly'")
+    periodicity = ask_periodicity("Enter periodicity")
+    if periodicity is None:
         return
 
     # Add habit to the database
     if name and description and periodicity:
-        try:
-            with get_database() as db:# connects to the database, ensuring it close automatically
-                creation_date = datetime.now()
-                add_habit(db, name, description, periodicity,creation_date)
-                messagebox.showinfo("Success", f"Habit '{name}' added successfully")
-        except Exception as e:
-            messagebox.showerror("Error", f"failed to create habit: {e}")
+        creation_date = datetime.now()
+        worker.submit(worker.cache.add_habit, name, description, periodicity, creation_date, write=True,
+                      on_done=lambda _: messagebox.showinfo("Success", f"Habit '{name}' added successfully"),
+                      on_error=lambda e: messagebox.showerror("Error", f"failed to create habit: {e}"))
 
 def edit_habit_app():
     """Allows the user to update and existing habit's description or periodicity"""
@@ -61,173 +72,169 @@ def edit_habit_app():
         messagebox.showerror("Error", "Please provide a habit name")
         return
 
-    #Retrieve current habit details
-    try:
-        with get_database() as db:
-            habit_data = get_habit_data(db,name)
-            if not habit_data:
-                messagebox.showerror("Error", f"No habit found with the name '{name}'.")
-                return
-
-            # Ask user for the new details
-            new_description = simpledialog.askstring("Description", "Enter new habit description: ")
-            new_periodicity = simpledialog.askstring("Periodicity","Enter new periodicity: 'daily' or 'weekly'")
-
-            if new_periodicity not in ["daily", "weekly"]:
-                messagebox.showerror("Error", "Invalid periodicity. Choose 'daily', 'weekly'")
-                return
-
-            #Update the habit in the database
-            if new_description and new_periodicity:
-                cur = db.cursor()
-                cur.execute(
-                    "UPDATE habits SET habit_description = ?, periodicity = ? WHERE habit_name = ?",
-                    (new_description,new_periodicity,name)
-
-                )
-                db.commit()
-                messagebox.showinfo("Success", f"Habit '{name}' updated successfully")
-
-                # If the user need to change the name it ask to better delete the habit
-                renaming = (
-                    f"To change the name of '{name}', please delete and recreate the habit."
-                    "Type 'ok' to acknowledge."
-                )
-                if simpledialog.askstring("Change Name", renaming) != 'ok':
-                    messagebox.showinfo("Reminder","Habits names cannot be edited directly.")
-
-    except Exception as e:
+    def edit(habit_data):
+        if not habit_data:
+            messagebox.showerror("Error", f"No habit found with the name '{name}'.")
+            return
+
+        # Ask user for the new details
+        new_description = simpledialog.askstring("Description", "Enter new habit description: ")
+        new_periodicity = ask_periodicity("Enter new periodicity")
+        if new_periodicity is None:
+            return
+
+        #Update the habit in the database
+        if new_description and new_periodicity:
+            worker.submit(worker.cache.update_habit, name, new_description, new_periodicity, write=True,
+                          on_done=updated, on_error=failed)
+
+    def updated(_):
+        messagebox.showinfo("Success", f"Habit '{name}' updated successfully")
+
+        # If the user need to change the name it ask to better delete the habit
+        renaming = (
+            f"To change the name of '{name}', please delete and recreate the habit."
+            "Type 'ok' to acknowledge."
+        )
+        if simpledialog.askstring("Change Name", renaming) != 'ok':
+            messagebox.showinfo("Reminder","Habits names cannot be edited directly.")
+
+    def failed(e):
         messagebox.showerror("Error", f"failed to update habit: {e}")
 
+    #Retrieve current habit details
+    worker.submit(worker.cache.get_habit_data, name, key="edit_habit", on_done=edit, on_error=failed)
+
 def delete_habit_app():
     """Ask the user for a habit name and deletes it from the database.
     Show error if the habit don't exist"""
     name = simpledialog.askstring("Name", "Enter the name of the habit to delete: ")
     if name:
-        try:
-            with get_database() as db:
-                delete_habit(db, name)
-                messagebox.showinfo("Success", f"Habit '{name}' deleted successfully")
-        except Exception as e:
-            messagebox.showerror("Error", f"failed to delete habit: {e}")
+        worker.submit(worker.cache.delete_habit, name, write=True,
+                      on_done=lambda _: messagebox.showinfo("Success", f"Habit '{name}' deleted successfully"),
+                      on_error=lambda e: messagebox.showerror("Error", f"failed to delete habit: {e}"))
+
+def load_habit_info_page(db, habit_name, after=None):
+    """Job loading a habit's data and one page of its completion dates, latest first"""
+    completion_dates, next_page = get_completion_page(db, habit_name, batch=HISTORY_PAGE_SIZE,
+                                                      reverse=True, after=after)
+    return worker.cache.get_habit_data(db, habit_name), completion_dates, next_page
 
 def show_habit_info():
     """List all tracked habits, ask the user to select one, and display habit info.
     show error if the habit is not found"""
-    try:
-        with get_database() as db:
-            # Get list of all tracked habits
-            tracked_habits = list_tracked_habits(db)
-            if not tracked_habits:
-                messagebox.showinfo("Error", "No habits are being tracked.")
-                return
-
-            # Ask user to select the habit that what to know the info
-            selected_habit = simpledialog.askstring("Habits",f"Tracked Habits:\n" + "\n".join(tracked_habits))
-            if selected_habit:
-                # Get habit data from database
-                habit_data = get_habit_data(db,selected_habit)
-                if habit_data:
-                    # Format the creation date to only show the date part
-                    creation_date = datetime.fromisoformat(habit_data[3]).strftime("%Y-%m-%d")
-                    # Retrieve completion dates
-                    completion_dates = [
-                        datetime.fromisoformat(date[0]).strftime("%Y-%m-%d %H:%M") for date in
-                        get_completion_data(db, selected_habit)
-                    ]
-
-                    # show the user data in clean format
-                show_info = (
-                    f"Name: {habit_data[0]}\n"
-                    f"Description: {habit_data[1]}\n"
-                    f"Periodicity: {habit_data[2]}\n"
-                    f"Creation date: {creation_date}\n"
-                    f"Times Completed: {habit_data[4]}\n"
-                    f"Completion Dates: {', '.join(completion_dates) if completion_dates else 'none'}"
-
-                )
-                messagebox.showinfo("Habit Info", show_info)
-
-    except Exception as e:
+    selected_habit = None
+    shown = 0 # number of completion dates already shown
+
+    def failed(e):
         messagebox.showerror("Error", f"failed to show info of the habit: {e}")
 
+    def select_habit(tracked_habits):
+        nonlocal selected_habit
+        if not tracked_habits:
+            messagebox.showinfo("Error", "No habits are being tracked.")
+            return
+
+        # Ask user to select the habit that what to know the info
+        selected_habit = simpledialog.askstring("Habits",f"Tracked Habits:\n" + "\n".join(tracked_habits))
+        if selected_habit:
+            worker.submit(load_habit_info_page, selected_habit, key="habit_info",
+                          on_done=show_page, on_error=failed)
+
+    def show_page(page):
+        nonlocal shown
+        habit_data, completion_dates, next_page = page
+        if not habit_data:
+            messagebox.showerror("Error", f"No habit found with the name '{selected_habit}'.")
+            return
+
+        # Format the creation date to only show the date part
+        creation_date = datetime.fromisoformat(habit_data[3]).strftime("%Y-%m-%d")
+        completion_dates = [datetime.fromisoformat(date).strftime("%Y-%m-%d %H:%M") for date in completion_dates]
+        first = shown + 1
+        shown += len(completion_dates)
+        dates = (f" ({first}-{shown}, latest first): {', '.join(completion_dates)}"
+                 if completion_dates else ": none")
+
+        # show the user data in clean format
+        show_info = (
+            f"Name: {habit_data[0]}\n"
+            f"Description: {habit_data[1]}\n"
+            f"Periodicity: {habit_data[2]}\n"
+            f"Creation date: {creation_date}\n"
+            f"Times Completed: {habit_data[4]}\n"
+            f"Completion Dates{dates}"
+        )
+        if next_page is None or shown >= habit_data[4]:
+            messagebox.showinfo("Habit Info", show_info)
+        # ask before loading the next page of older completions
+        elif messagebox.askyesno("Habit Info", show_info + "\n\nShow older completions?"):
+            worker.submit(load_habit_info_page, selected_habit, next_page, key="habit_info",
+                          on_done=show_page, on_error=failed)
+
+    # Get list of all tracked habits
+    worker.submit(worker.cache.list_tracked_habits, key="habit_info", on_done=select_habit, on_error=failed)
+
 def mark_habit_completed():
     """Marks a habit as completed for the current day"""
     name = simpledialog.askstring("Complete Habit",
                                   "Enter the name of the habit to mark as completed for today")
     if name:
-        try:
-            with get_database() as db:
-                add_completion_date(db,name,datetime.now().isoformat())
-                messagebox.showinfo("Success", f"Habit '{name}' marked as completed for today")
-        except Exception as e:
-            messagebox.showerror("Error", f"failed to mark habit as completed for today: {e}")
+        worker.submit(worker.cache.add_completion_date, name, datetime.now().isoformat(), write=True,
+                      on_done=lambda _: messagebox.showinfo("Success", f"Habit '{name}' marked as completed for today"),
+                      on_error=lambda e: messagebox.showerror("Error", f"failed to mark habit as completed for today: {e}"))
 
 # ANALYTICAL FUNCTIONS OF THE APP:
 def show_tracked_habits():
     """Show the user all tracked habits"""
-    try:
-        with get_database() as db:
-            habit = list_tracked_habits(db)
-            messagebox.showinfo("Tracked Habits", "\n".join(habit) if habit else "No habits are being tracked")
-
-    except Exception as e:
-        messagebox.showerror("Error", f"failed to show tracked habits: {e}")
+    worker.submit(worker.cache.list_tracked_habits, key="tracked_habits",
+                  on_done=lambda habit: messagebox.showinfo(
+                      "Tracked Habits", "\n".join(habit) if habit else "No habits are being tracked"),
+                  on_error=lambda e: messagebox.showerror("Error", f"failed to show tracked habits: {e}"))
 
 def show_habit_by_periodicity():
-    """Show the user habits filtered by daily or weekly periodicity"""
-    periodicity = simpledialog.askstring("Periodicity","Enter periodicity: 'daily' or 'weekly'")
-    if periodicity not in ["daily", "weekly"]:
-        messagebox.showerror("Error", "Invalid periodicity. Choose 'daily', 'weekly'")
+    """Show the user habits filtered by periodicity"""
+    periodicity = ask_periodicity("Enter periodicity")
+    if periodicity is None:
         return
 
-    try:
-        with get_database() as db:
-            habits = list_habit_by_periodicity(db,periodicity)
-            messagebox.showinfo(f"{periodicity.capitalize()} Habits",
-                                "\n".join(habits) if habits else f"No {periodicity} habits being tracked")
-    except Exception as e:
-        messagebox.showerror("Error", f"failed to show habits by periodicity: {e}")
+    worker.submit(list_habit_by_periodicity, periodicity, key="habits_by_periodicity",
+                  on_done=lambda habits: messagebox.showinfo(
+                      f"Habits: {periodicity}",
+                      "\n".join(habits) if habits else f"No habits with the periodicity '{periodicity}' are being tracked"),
+                  on_error=lambda e: messagebox.showerror("Error", f"failed to show habits by periodicity: {e}"))
 
 def show_longest_streak():
     """Show the user the longest streak among all habits"""
-    try:
-        with get_database() as db:
-            longest_streak, habit_name = longest_historical_streak(db)
-            if habit_name:
-                messagebox.showinfo("Longest Streak",
-                                    f"The longest streak is {longest_streak} days/weeks for the habit '{habit_name}'.")
+    def show(result):
+        longest_streak, habit_name = result
+        if habit_name:
+            messagebox.showinfo("Longest Streak",
+                                f"The longest streak is {longest_streak} periods for the habit '{habit_name}'.")
 
-
-    except Exception as e:
-        messagebox.showerror("Error", f"failed to show longest streak: {e}")
+    worker.submit(longest_historical_streak, key="longest_streak", on_done=show,
+                  on_error=lambda e: messagebox.showerror("Error", f"failed to show longest streak: {e}"))
 
 def show_longest_streak_by_habit():
     """Show the user the longest streak for each habit"""
-    try:
-        with get_database() as db:
-            tracked_habits = list_tracked_habits(db)
-            streak_info = [f"{habit}: {longest_historical_streak_for_habit(db,habit)} days/weeks" for habit in tracked_habits]
-            messagebox.showinfo("Longest streak by habit", "\n".join(streak_info) if streak_info else "No habits are being tracked")
-    except Exception as e:
-        messagebox.showerror("Error", f"failed to show longest streak by habit: {e}")
-
+    def show(streaks):
+        # a period is a day, a week, a month... depending on the periodicity of each habit
+        streak_info = [f"{habit}: {streak} periods" for habit, streak in streaks.items()]
+        messagebox.showinfo("Longest streak by habit", "\n".join(streak_info) if streak_info else "No habits are being tracked")
 
-# GUI Layout
-# Title Frame
-title_frame = tk.Frame(root, bg=title_color, pady=10)
-title_frame.pack(fill="x")
+    # one query for all the habits
+    worker.submit(longest_streaks, key="longest_streak_by_habit", on_done=show,
+                  on_error=lambda e: messagebox.showerror("Error", f"failed to show longest streak by habit: {e}"))
 
-title_label = tk.Label(title_frame, text="Habit Grower", font=("Arial",24,"bold"), fg=bg_color, bg=title_color)
-title_label.pack()
-
-quote_label = tk.Label(title_frame, text="“Excellence, then, is not an act, but a habit.” – Aristotle",
-                       font=("Arial", 10, "italic"), fg=bg_color, bg=title_color)
-quote_label.pack()
-
-# Button frame
-button_frame = tk.Frame(root, bg=bg_color, pady=20)
-button_frame.pack(fill="x",padx=10)
+def poll_worker():
+    """Delivers the finished database jobs to their callbacks and updates the busy indicator"""
+    try:
+        worker.process_results()
+        busy_label.config(text="Working..." if worker.busy else "")
+        root.config(cursor="watch" if worker.busy else "")
+    finally:
+        # keep polling even if this round failed, or the later results would never be delivered
+        root.after(POLL_INTERVAL, poll_worker)
 
 def add_button(frame, text, command):
     button = tk.Button(frame, text=text, command=command,
@@ -235,21 +242,65 @@ def add_button(frame, text, command):
                        activebackground=button_hover, activeforeground=text_color)
     button.pack(pady=5,padx=10, fill="x")
 
-add_button(button_frame, "Create Habit", create_habit_app)
-add_button(button_frame, "Edit Habit", edit_habit_app)
-add_button(button_frame, "Delete Habit", delete_habit_app)
-add_button(button_frame, "Show Habit Info", show_habit_info)
-add_button(button_frame, "Mark Habit Completed", mark_habit_completed)
-
-#Analysis Frame
-analyze_frame = tk.LabelFrame(root, text="Analytical Functions",font=("Arial",14),
-                              fg=text_color, bg=button_color, padx=10, pady=10)
-analyze_frame.pack(fill="x",padx=10,pady=10)
-
-add_button(analyze_frame,"Show all tracked Habits",show_tracked_habits)
-add_button(analyze_frame,"Show Habits by periodicity",show_habit_by_periodicity)
-add_button(analyze_frame, "Longest Streak Across All Habits",show_longest_streak)
-add_button(analyze_frame,"Longest Streak For Each Habit",show_longest_streak_by_habit)
+def main(db_name=DB_NAME):
+    """Creates the main window of the app for a database file and runs it"""
+    global root, busy_label, worker
+
+    # initialize the main application window
+    root = tk.Tk()
+    root.title("HABIT GROWER")
+    root.geometry("600x700")
+    # Set background color for the main window
+    root.configure(bg=bg_color)
+    # the periods of the streaks are computed with the calendar stored in the database
+    db = database.get_db(db_name)
+    database.use_calendar(db)
+    db.close()
+    # background worker running the database jobs
+    worker = DatabaseWorker(db_name)
+
+    # GUI Layout
+    # Title Frame
+    title_frame = tk.Frame(root, bg=title_color, pady=10)
+    title_frame.pack(fill="x")
+
+    title_label = tk.Label(title_frame, text="Habit Grower", font=("Arial",24,"bold"), fg=bg_color, bg=title_color)
+    title_label.pack()
+
+    quote_label = tk.Label(title_frame, text="“Excellence, then, is not an act, but a habit.” – Aristotle",
+                           font=("Arial", 10, "italic"), fg=bg_color, bg=title_color)
+    quote_label.pack()
+
+    # Button frame
+    button_frame = tk.Frame(root, bg=bg_color, pady=20)
+    button_frame.pack(fill="x",padx=10)
+
+    add_button(button_frame, "Create Habit", create_habit_app)
+    add_button(button_frame, "Edit Habit", edit_habit_app)
+    add_button(button_frame, "Delete Habit", delete_habit_app)
+    add_button(button_frame, "Show Habit Info", show_habit_info)
+    add_button(button_frame, "Mark Habit Completed", mark_habit_completed)
+
+    #Analysis Frame
+    analyze_frame = tk.LabelFrame(root, text="Analytical Functions",font=("Arial",14),
+                                  fg=text_color, bg=button_color, padx=10, pady=10)
+    analyze_frame.pack(fill="x",padx=10,pady=10)
+
+    add_button(analyze_frame,"Show all tracked Habits",show_tracked_habits)
+    add_button(analyze_frame,"Show Habits by periodicity",show_habit_by_periodicity)
+    add_button(analyze_frame, "Longest Streak Across All Habits",show_longest_streak)
+    add_button(analyze_frame,"Longest Streak For Each Habit",show_longest_streak_by_habit)
+
+    # Busy indicator, shown while database jobs are running
+    busy_label = tk.Label(root, text="", font=("Arial", 10, "italic"), fg=text_color, bg=bg_color)
+    busy_label.pack()
+
+    #Run the main loop for the app
+    root.after(POLL_INTERVAL, poll_worker)
+    try:
+        root.mainloop()
+    finally:
+        worker.shutdown()
 
-#Run the main loop for the app
-root.mainloop()
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""
+Calendar bucketing of the completions: every completion date is mapped to an integer day
+number, and every day number to the index of its period, so the streak code only compares
+integers. Two completions are in consecutive periods when their period indexes differ by one.
+
+The periodicity of a habit is a short spec stored in the habits table, see parse_periodicity:
+"daily", "weekly", "monthly", "weekdays" (Monday to Friday), "every N days" or "every N weeks".
+Each spec is parsed once into a function mapping a day number to its period index with a few
+integer operations, which also works element-wise on NumPy arrays.
+
+The week start and the timezone are configurable for the whole app:
+
+    periods.configure(week_start=periods.SUNDAY, timezone="America/New_York")
+
+The day numbers, the habit_periods rollup and the cached streaks stored in a database
+depend on them, so every database stores the calendar its data was computed with. Opening a
+database never changes the calendar of the process: the programs call database.use_calendar
+to configure themselves with it, and the writes of a process using another calendar are
+rejected until rebuild_streak_cache converts the database to it.
+"""
+import re
+from datetime import date, datetime, timedelta, timezone as fixed_timezone
+from functools import lru_cache
+
+MONDAY, TUESDAY, WEDNESDAY, THURSDAY, FRIDAY, SATURDAY, SUNDAY = range(7)
+
+# date.toordinal() of 1970-01-01, day numbers count days since that date
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+# First day of the weekly periods, ISO weeks start on Monday
+WEEK_START = MONDAY
+
+# Timezone of the days of the completions dated with a UTC offset, None to take the date
+# as written. Completions without an offset are always in local time.
+TIMEZONE = None
+
+# 1970-01-01 (day 0) is a Thursday: shifting the day numbers by this much makes
+# the weeks start on WEEK_START
+_week_shift = THURSDAY - WEEK_START
+
+_FIXED_OFFSET = re.compile(r"UTC([+-])(\d\d):(\d\d)")
+
+
+def configure(week_start=MONDAY, timezone=None):
+    """
+    Sets the week start and timezone used by the whole app.
+    :param week_start(int): MONDAY to SUNDAY
+    :param timezone: IANA timezone name, ZoneInfo or datetime.timezone, None to take the dates as written
+    :returns: None
+    """
+    global WEEK_START, TIMEZONE, _week_shift
+    if week_start not in range(7):
+        raise ValueError(f"week_start must be between MONDAY (0) and SUNDAY (6), not {week_start!r}")
+    if isinstance(timezone, str):
+        timezone = _parse_timezone(timezone)
+    _timezone_name(timezone) # only timezones that can be stored with the data
+    WEEK_START = week_start
+    TIMEZONE = timezone
+    _week_shift = THURSDAY - week_start
+
+
+def calendar():
+    """
+    Calendar used by the process, in the form stored in the databases.
+    :returns: (week_start(int), timezone name (str), "" to take the dates as written)
+    """
+    return WEEK_START, _timezone_name(TIMEZONE)
+
+
+def _timezone_name(timezone):
+    """ name of a timezone that _parse_timezone reads back """
+    if timezone is None:
+        return ""
+    if isinstance(timezone, fixed_timezone):
+        return "UTC" if timezone.utcoffset(None) == timedelta(0) else timezone.tzname(None)
+    key = getattr(timezone, "key", None) # ZoneInfo
+    if key is None:
+        raise ValueError(f"timezone must be an IANA name, a ZoneInfo or a datetime.timezone, not {timezone!r}")
+    return key
+
+
+def _parse_timezone(name):
+    """ timezone of a name returned by _timezone_name, or of an IANA name """
+    if not name:
+        return None
+    if name == "UTC":
+        return fixed_timezone.utc
+    match = _FIXED_OFFSET.fullmatch(name)
+    if match:
+        offset = timedelta(hours=int(match.group(2)), minutes=int(match.group(3)))
+        return fixed_timezone(-offset if match.group(1) == "-" else offset)
+    from zoneinfo import ZoneInfo # only imported when a named timezone is used
+    return ZoneInfo(name)
+
+
+def day_number(completion_date):
+    """
+    Converts a completion date to its day number (days since 1970-01-01), the integer
+    stored next to the ISO string so the streak functions don't have to parse dates.
+    :param completion_date: ISO string, date or datetime of the completion
+    :returns: (int) the day number
+    """
+    if isinstance(completion_date, str):
+        if TIMEZONE is None or len(completion_date) <= 19:
+            # no UTC offset to apply, only the date part matters: this avoids parsing the time
+            return date.fromisoformat(completion_date[:10]).toordinal() - EPOCH_ORDINAL
+        completion_date = datetime.fromisoformat(completion_date)
+    if isinstance(completion_date, datetime):
+        if TIMEZONE is not None and completion_date.tzinfo is not None:
+            completion_date = completion_date.astimezone(TIMEZONE)
+        completion_date = completion_date.date()
+    return completion_date.toordinal() - EPOCH_ORDINAL
+
+
+def week_index(day):
+    """
+    Maps a day number to the index of its week, weeks starting on WEEK_START.
+    :param day: (int) day number, or a NumPy array of day numbers
+    :returns: (int) the week index
+    """
+    return (day + _week_shift) // 7
+
+
+def month_index(day):
+    """
+    Maps a day number to the index of its month (year * 12 + month - 1), with integer
+    operations only (the civil_from_days algorithm of Howard Hinnant).
+    :param day: (int) day number, or a NumPy array of day numbers
+    :returns: (int) the month index
+    """
+    shifted = day + 719468 # days since 0000-03-01, years start in March
+    era = shifted // 146097
+    day_of_era = shifted - era * 146097
+    year_of_era = (day_of_era - day_of_era // 1460 + day_of_era // 36524 - day_of_era // 146096) // 365
+    day_of_year = day_of_era - (365 * year_of_era + year_of_era // 4 - year_of_era // 100)
+    month_from_march = (5 * day_of_year + 2) // 153
+    # March of year Y is month index Y * 12 + 2, January of the next year Y * 12 + 12
+    return (era * 400 + year_of_era) * 12 + month_from_march + 2
+
+
+def _weekday_index(day):
+    """ index of a day among the weekdays, Saturdays and Sundays count for the Friday before """
+    week, weekday = divmod(day + THURSDAY, 7)
+    return week * 5 + weekday - (weekday > FRIDAY) * (weekday - FRIDAY)
+
+
+class Periodicity:
+    """
+    Schedule of a habit, parsed from its spec by parse_periodicity.
+
+    Attributes:
+        spec(str): canonical spec, the value stored in the habits table.
+        unit(str): "day", "week", "weekday" or "month".
+        length(int): number of units per period.
+        index: function mapping a day number (or a NumPy array of them) to its period index.
+    """
+
+    __slots__ = ("spec", "unit", "length", "index")
+
+    def __init__(self, spec, unit, length, index):
+        self.spec = spec
+        self.unit = unit
+        self.length = length
+        self.index = index
+
+    def __repr__(self):
+        return f"Periodicity({self.spec!r})"
+
+
+# Periodicities accepted by parse_periodicity, for help and error messages
+PERIODICITY_HELP = "'daily', 'weekly', 'monthly', 'weekdays' (Monday to Friday), 'every N days' or 'every N weeks'"
+
+_EVERY = re.compile(r"every (\d+) (day|week)s?")
+
+
+@lru_cache(maxsize=None)
+def parse_periodicity(spec):
+    """
+    Parses the periodicity of a habit. The periods of "every N days" are counted from
+    1970-01-01, the weeks start on WEEK_START, and a weekdays habit completed on a
+    weekend counts for the Friday before.
+    :param spec(str): one of PERIODICITY_HELP, case and spaces don't matter
+    :returns: Periodicity
+    """
+    words = " ".join(str(spec).lower().split())
+    if words in ("daily", "every day"):
+        return Periodicity("daily", "day", 1, lambda day: day)
+    if words in ("weekly", "every week"):
+        return Periodicity("weekly", "week", 1, week_index)
+    if words in ("monthly", "every month"):
+        return Periodicity("monthly", "month", 1, month_index)
+    if words in ("weekdays", "mon-fri"):
+        return Periodicity("weekdays", "weekday", 1, _weekday_index)
+
+    match = _EVERY.fullmatch(words)
+    length = int(match.group(1)) if match else 0
+    if length < 1:
+        raise ValueError(f"Invalid periodicity {spec!r}. Choose {PERIODICITY_HELP}")
+    if length == 1:
+        return parse_periodicity("daily" if match.group(2) == "day" else "weekly")
+    if match.group(2) == "day":
+        return Periodicity(f"every {length} days", "day", length, lambda day: day // length)
+    return Periodicity(f"every {length} weeks", "week", length, lambda day: (day + _week_shift) // (7 * length))
+
+
+def period_index(day, periodicity):
+    """
+    Maps a day number to the index of the period it belongs to in a periodicity:
+    consecutive periods get consecutive indexes.
+    :param day: (int) day number, see day_number(), or a NumPy array of day numbers
+    :param periodicity: periodicity spec of the habit, see parse_periodicity
+    :returns: (int) the period index
+    """
+    if periodicity == "daily":
+        return day
+    return parse_periodicity(periodicity).index(day)
+
+
+def weekday(day):
+    """
+    Day of the week of a day number.
+    :returns: (int) MONDAY to SUNDAY
+    """
+    return (day + THURSDAY) % 7
@@ -1,6 +1,6 @@
 import sqlite3
 from datetime import datetime, timedelta
-from database import add_habit, add_completion_date, create_table
+from database import add_habits_bulk, add_completions_bulk, create_table
 
 
 def preload_data(db_path="db/preload_test_data.db"):
@@ -16,6 +16,7 @@ def preload_data(db_path="db/preload_test_data.db"):
     cur = db.cursor()
     cur.execute("DELETE FROM habits")
     cur.execute("DELETE FROM completions")
+    cur.execute("DELETE FROM habit_periods")
     db.commit()
 
     # set creation date to four weeks ago
@@ -30,9 +31,8 @@ def preload_data(db_path="db/preload_test_data.db"):
         ("Code", "Daily coding practice", "daily", creation_date)
     ]
 
-    # add each habit to the database
-    for name,description,periodicity,date in habits:
-        add_habit(db,name,description,periodicity,date)
+    # add the habits to the database in one transaction
+    add_habits_bulk(db, habits)
 
     # Define completions
     today = datetime.now()
@@ -63,10 +63,10 @@ def preload_data(db_path="db/preload_test_data.db"):
 
     }
 
-    # add completions dates for each habit based on the defined patterns
-    for habit_name, dates in completion_patterns.items():
-        for date in dates:
-            add_completion_date(db,habit_name,date)
+    # add completions dates for each habit based on the defined patterns, in one transaction
+    add_completions_bulk(db, (
+        (habit_name, date) for habit_name, dates in completion_patterns.items() for date in dates
+    ))
 
     # Commit and close connection after create the data
     db.commit()
@@ -0,0 +1,219 @@
+"""
+Opt-in instrumentation of the SQL statements run by database.py and analyze.py.
+
+Once enable() is called, the connections opened by database.py record, for every
+statement, how many times it ran, its total and p95 latency and the rows it returned,
+and log the executions slower than a threshold:
+
+    querystats.enable(slow_threshold=0.05)
+    ...
+    print(querystats.format_stats(querystats.stats()))
+
+The latency of an execution includes the fetches of its rows, until the cursor runs
+another statement.
+"""
+import sqlite3
+import threading
+import time
+from collections import deque
+
+# Number of latencies kept per statement for the p95
+SAMPLES = 1000
+
+# Logger of the statements slower than the threshold, logging is only imported when one is logged
+LOGGER_NAME = "habitgrower.slow_queries"
+
+_enabled = False
+_slow_threshold = None
+_statements = {} # normalized SQL -> _StatementStats
+_lock = threading.Lock()
+_connection_classes = {} # base connection class -> instrumented subclass
+
+
+class _StatementStats:
+    """ counters of one statement """
+    __slots__ = ("count", "total", "rows", "samples")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.rows = 0
+        self.samples = deque(maxlen=SAMPLES) # latest executions
+
+
+class _Execution:
+    """ one execution of a statement, updated while its rows are fetched """
+    __slots__ = ("sql", "stats", "elapsed", "logged")
+
+    def __init__(self, sql, stats):
+        self.sql = sql
+        self.stats = stats
+        self.elapsed = 0.0
+        self.logged = False
+
+    def add(self, elapsed, rows):
+        """ adds the time and rows of one call on the cursor """
+        self.elapsed += elapsed
+        with _lock:
+            self.stats.total += elapsed
+            self.stats.rows += rows
+        if _slow_threshold is not None and not self.logged and self.elapsed >= _slow_threshold:
+            self.logged = True
+            import logging
+            logging.getLogger(LOGGER_NAME).warning("slow query (%.1f ms): %s", self.elapsed * 1000, self.sql)
+
+
+def _normalize(sql):
+    """ statement text with its whitespace collapsed, used as the key of the statistics """
+    return " ".join(sql.split())
+
+def _start(sql):
+    """ counts a new execution of a statement """
+    sql = _normalize(sql)
+    with _lock:
+        stats = _statements.get(sql)
+        if stats is None:
+            stats = _statements[sql] = _StatementStats()
+        stats.count += 1
+        execution = _Execution(sql, stats)
+        stats.samples.append(execution) # its latency keeps growing while its rows are fetched
+    return execution
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """ cursor recording the latency and rows of the statements it runs """
+
+    _execution = None
+
+    def execute(self, sql, parameters=()):
+        self._execution = _start(sql)
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._execution.add(time.perf_counter() - start, 0)
+
+    def executemany(self, sql, seq_of_parameters):
+        self._execution = _start(sql)
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._execution.add(time.perf_counter() - start, 0)
+
+    def _timed_fetch(self, fetch, *args):
+        start = time.perf_counter()
+        rows = fetch(*args)
+        if self._execution is not None:
+            count = len(rows) if isinstance(rows, list) else int(rows is not None)
+            self._execution.add(time.perf_counter() - start, count)
+        return rows
+
+    def fetchone(self):
+        return self._timed_fetch(super().fetchone)
+
+    def fetchmany(self, size=None):
+        return self._timed_fetch(super().fetchmany, self.arraysize if size is None else size)
+
+    def fetchall(self):
+        return self._timed_fetch(super().fetchall)
+
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            if self._execution is not None:
+                self._execution.add(time.perf_counter() - start, 0)
+            raise
+        if self._execution is not None:
+            self._execution.add(time.perf_counter() - start, 1)
+        return row
+
+
+class _InstrumentedConnection:
+    """ mixin making a connection class hand out InstrumentedCursor objects """
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def connection_factory(base=sqlite3.Connection):
+    """
+    Connection class for sqlite3.connect(factory=...): base itself, or an instrumented
+    subclass of it while the instrumentation is enabled.
+    :param base: sqlite3.Connection or a subclass of it
+    """
+    if not _enabled:
+        return base
+    cls = _connection_classes.get(base)
+    if cls is None:
+        cls = _connection_classes[base] = type(f"Instrumented{base.__name__}", (_InstrumentedConnection, base), {})
+    return cls
+
+
+def enable(slow_threshold=None):
+    """
+    Instruments the connections opened from now on.
+    :param slow_threshold(float): log the executions taking at least this many seconds, None to log nothing
+    :returns: None
+    """
+    global _enabled, _slow_threshold
+    _enabled = True
+    _slow_threshold = slow_threshold
+
+def disable():
+    """ stops instrumenting new connections, the ones already open keep recording """
+    global _enabled
+    _enabled = False
+
+def is_enabled():
+    """ True when new connections are instrumented """
+    return _enabled
+
+def reset():
+    """ forgets the recorded statistics """
+    with _lock:
+        _statements.clear()
+
+def stats():
+    """
+    Statistics of every statement recorded so far, the most expensive first.
+    :returns: list of dicts with the statement, count, total_ms, mean_ms, p95_ms (over the
+              last SAMPLES executions) and rows
+    """
+    with _lock:
+        recorded = [(sql, s.count, s.total, s.rows, sorted(e.elapsed for e in s.samples))
+                    for sql, s in _statements.items()]
+
+    result = []
+    for sql, count, total, rows, samples in recorded:
+        result.append({
+            "statement": sql,
+            "count": count,
+            "total_ms": total * 1000,
+            "mean_ms": total / count * 1000,
+            "p95_ms": samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000 if samples else 0.0,
+            "rows": rows,
+        })
+    result.sort(key=lambda statement: statement["total_ms"], reverse=True)
+    return result
+
+def format_stats(statements, width=100):
+    """
+    Formats statistics returned by stats() as a table.
+    :param width(int): maximum length of the statement column
+    :returns:(str) the table
+    """
+    lines = [f"{'count':>8} {'total ms':>10} {'mean ms':>9} {'p95 ms':>9} {'rows':>9}  statement"]
+    for s in statements:
+        statement = s["statement"] if len(s["statement"]) <= width else s["statement"][:width - 3] + "..."
+        lines.append(f"{s['count']:>8} {s['total_ms']:>10.2f} {s['mean_ms']:>9.3f} "
+                     f"{s['p95_ms']:>9.3f} {s['rows']:>9}  {statement}")
+    return "\n".join(lines)
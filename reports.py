@@ -0,0 +1,111 @@
+"""
+Streak reports recomputed from the whole history of every habit, in parallel processes.
+
+The habits are split into partitions of consecutive habit_ids, and each partition is
+analyzed by a worker process with its own read-only connection to the database file:
+
+    report = streak_report("db/main.db", workers=8)
+
+The streaks are computed from the habit_periods rollup, not read from the streak cache,
+so a report also verifies the cache (see database.rebuild_streak_cache to repair it).
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import groupby
+
+from database import DEFAULT_DB, DEFAULT_USER, get_readonly_db
+from streaks import streak_summary
+
+# Habits analyzed per task, the partitions are handed to the workers as they become free
+PARTITION_SIZE = 10_000
+
+
+def _partition_report(db_name, user, first_id, last_id, backend=None):
+    """
+    Streaks of the habits of a user whose habit_id is between first_id and last_id,
+    run in a worker process.
+    :returns: dict mapping each habit name to (current_streak, longest_streak, completed periods)
+    """
+    db = get_readonly_db(db_name)
+    try:
+        names = dict(db.execute("""
+            SELECT habit_id, habit_name FROM habits
+            WHERE user_id = ? AND habit_id BETWEEN ? AND ?
+        """, (user, first_id, last_id)))
+        report = {habit_name: (0, 0, 0) for habit_name in names.values()}
+        rows = db.execute("""
+            SELECT p.habit_id, p.period_index FROM habits h
+            JOIN habit_periods p ON p.habit_id = h.habit_id
+            WHERE h.user_id = ? AND h.habit_id BETWEEN ? AND ?
+            ORDER BY p.habit_id, p.period_index
+        """, (user, first_id, last_id))
+        for habit_id, periods in groupby(rows, key=lambda row: row[0]):
+            periods = [period for _, period in periods]
+            current_streak, longest_streak, _ = streak_summary(periods, backend)
+            report[names[habit_id]] = (current_streak, longest_streak, len(periods))
+        return report
+    finally:
+        db.close()
+
+
+def partitions(db_name, partition_size=PARTITION_SIZE, user=DEFAULT_USER):
+    """
+    Splits the habits of a user into ranges of consecutive habit_ids.
+    :param db_name(str): path of the database file
+    :param partition_size(int): habits per range
+    :param user(str): the user owning the habits
+    :returns: list of (first_id, last_id) ranges
+    """
+    db = get_readonly_db(db_name)
+    try:
+        habit_ids = [row[0] for row in db.execute(
+            "SELECT habit_id FROM habits WHERE user_id = ? ORDER BY habit_id", (user,))]
+    finally:
+        db.close()
+    return [(chunk[0], chunk[-1]) for chunk in
+            (habit_ids[i:i + partition_size] for i in range(0, len(habit_ids), partition_size))]
+
+
+def streak_report(db_name=DEFAULT_DB, workers=None, partition_size=PARTITION_SIZE, backend=None,
+                  user=DEFAULT_USER):
+    """
+    Recomputes the streaks of every habit of a user from its completed periods.
+    :param db_name(str): path of the database file, the workers open it read-only
+    :param workers(int): number of worker processes, defaults to the number of CPUs,
+                         1 runs the report in the calling process
+    :param partition_size(int): habits analyzed per task
+    :param backend: "numpy" or "python", defaults to streaks.BACKEND for long histories
+    :param user(str): the user owning the habits
+    :returns: dict mapping each habit name to a dict with its current_streak,
+              longest_streak and completed_periods, sorted by habit name
+    """
+    workers = workers or os.cpu_count() or 1
+    ranges = partitions(db_name, partition_size, user)
+
+    report = {}
+    if workers == 1 or len(ranges) <= 1:
+        for first_id, last_id in ranges:
+            report.update(_partition_report(db_name, user, first_id, last_id, backend))
+    else:
+        with ProcessPoolExecutor(min(workers, len(ranges))) as executor:
+            futures = [executor.submit(_partition_report, db_name, user, first_id, last_id, backend)
+                       for first_id, last_id in ranges]
+            for future in futures:
+                report.update(future.result())
+
+    return {habit_name: {"current_streak": current_streak, "longest_streak": longest_streak,
+                         "completed_periods": completed_periods}
+            for habit_name, (current_streak, longest_streak, completed_periods) in sorted(report.items())}
+
+
+def longest_historical_streak(db_name=DEFAULT_DB, workers=None, user=DEFAULT_USER):
+    """
+    Longest historical streak across all the habits of a user, recomputed in parallel,
+    like analyze.longest_historical_streak.
+    :returns: (longest streak, habit name), (0, None) without habits
+    """
+    longest_streak, longest_streak_habit = 0, None
+    for habit_name, streaks in streak_report(db_name, workers, user=user).items():
+        if streaks["longest_streak"] > longest_streak:
+            longest_streak, longest_streak_habit = streaks["longest_streak"], habit_name
+    return longest_streak, longest_streak_habit
@@ -0,0 +1,302 @@
+"""
+Local HTTP/JSON API of the Habit Grower App.
+
+Routes:
+    GET    /habits[?periodicity=daily|weekly|...]  list the tracked habits
+    POST   /habits                                 create a habit {"name", "description", "periodicity"}
+    GET    /habits/<name>                          show a habit
+    PUT    /habits/<name>                          update a habit {"description", "periodicity"}
+    DELETE /habits/<name>                          delete a habit
+    GET    /habits/<name>/completions[?since=&until=&limit=]   latest completion dates
+    POST   /habits/<name>/completions              mark a habit completed {"date"} (default: now)
+    GET    /habits/<name>/streak                   streak details of a habit
+    GET    /streaks                                longest streak of every habit
+    GET    /streaks/longest                        habit with the longest streak
+    GET    /stats                                  statistics of the SQL statements (with --stats)
+
+Every request works on the habits of the user named by its X-User header,
+the default user when there is none.
+
+The connections are handled by asyncio. The database work runs on a worker.DatabaseWorker,
+like the GUI's: reads on a pool of reader threads, each with its own pooled connection, and
+writes one at a time on a single writer thread, so SQLite never sees two writers. With
+--group-commit, the writes arriving within a few milliseconds are committed together in one transaction.
+
+With --stats, every SQL statement is timed (see querystats.py) and --slow-ms logs
+the slow ones.
+
+Run it with: python server.py --db db/main.db --port 8000
+"""
+import argparse
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import analyze
+import database
+import querystats
+from periods import parse_periodicity
+from worker import DatabaseWorker
+
+# Number of reader threads of the server's DatabaseWorker, more than the GUI as requests arrive concurrently
+READER_THREADS = 4
+
+STATUS_TEXT = {200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found",
+               405: "Method Not Allowed", 409: "Conflict", 500: "Internal Server Error"}
+
+
+class HttpError(Exception):
+    """ error answered to the client with an HTTP status and a JSON message """
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class HabitServer:
+    """
+    asyncio HTTP server exposing the database and analyze functions as a JSON API.
+
+    Attributes:
+        db_name(string): path of the database file.
+        host(string): address to listen on.
+        port(integer): port to listen on, 0 picks a free port (updated by start).
+    """
+
+    def __init__(self, db_name=database.DEFAULT_DB, host="127.0.0.1", port=8000, readers=READER_THREADS,
+                 group_commit=False):
+        self.db_name = db_name
+        self.host = host
+        self.port = port
+        # one pooled connection per reader thread plus one for the writer
+        database.get_pool(db_name, size=readers + 1)
+        self._worker = DatabaseWorker(db_name, readers)
+        self._committer = database.GroupCommitter(db_name) if group_commit else None
+        self._server = None
+
+    async def start(self):
+        """ starts listening, returns the port in use """
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self.port
+
+    async def serve_forever(self):
+        """ starts the server if needed and serves until cancelled """
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        """ stops accepting connections and waits for the database threads """
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        self._worker.shutdown(cancel=False)
+        if self._committer is not None:
+            self._committer.close()
+
+    async def _run(self, function, *args, write=False, user=database.DEFAULT_USER):
+        """ runs function(db, *args, user=user) on a reader thread, or on the writer thread """
+        if write and self._committer is not None:
+            return await asyncio.wrap_future(self._committer.submit(function, *args, user=user))
+        return await asyncio.wrap_future(self._worker.run(function, *args, write=write, user=user))
+
+    async def _handle_connection(self, reader, writer):
+        """ serves the requests of one connection, keeping it open between requests """
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, version = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    key, _, value = line.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                user = headers.get("x-user") or database.DEFAULT_USER
+                status, payload = await self._dispatch(method, target, body, user)
+                data = json.dumps(payload).encode()
+                keep_alive = (headers.get("connection", "").lower() != "close"
+                              and version == "HTTP/1.1")
+                writer.write(
+                    f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+                    f"Content-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + data
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, ValueError, asyncio.IncompleteReadError):
+            pass # client went away or sent something that isn't HTTP
+        finally:
+            writer.close()
+
+    async def _dispatch(self, method, target, body, user=database.DEFAULT_USER):
+        """ routes one request of a user, returns (status, JSON payload) """
+        url = urlsplit(target)
+        path = [unquote(part) for part in url.path.strip("/").split("/") if part]
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        try:
+            data = json.loads(body) if body else {}
+            if not isinstance(data, dict):
+                raise HttpError(400, "the request body must be a JSON object")
+            return await self._route(method, path, query, data, user)
+        except HttpError as e:
+            return e.status, {"error": str(e)}
+        except json.JSONDecodeError:
+            return 400, {"error": "invalid JSON body"}
+        except sqlite3.IntegrityError as e:
+            return 409, {"error": str(e)}
+        except ValueError as e:
+            return 400, {"error": str(e)}
+        except Exception as e:
+            return 500, {"error": str(e)}
+
+    async def _route(self, method, path, query, data, user):
+        """ calls the database or analyze function of a route """
+        if path == ["habits"]:
+            if method == "GET":
+                if "periodicity" in query:
+                    return 200, await self._run(analyze.list_habit_by_periodicity, query["periodicity"], user=user)
+                return 200, await self._run(analyze.list_tracked_habits, user=user)
+            if method == "POST":
+                name, description, periodicity = _fields(data, "name", "description", "periodicity")
+                habit_id = await self._run(database.add_habit, name, description, periodicity,
+                                           datetime.now(), write=True, user=user)
+                return 201, {"habit_id": habit_id, "name": name}
+            raise HttpError(405, f"{method} is not allowed on /habits")
+
+        if len(path) >= 2 and path[0] == "habits":
+            name = path[1]
+            if len(path) == 2:
+                if method == "GET":
+                    info = await self._run(database.get_habit_info, name, user=user)
+                    if info is None:
+                        raise HttpError(404, f"No habit found with the name '{name}'")
+                    return 200, info
+                if method == "PUT":
+                    description, periodicity = _fields(data, "description", "periodicity")
+                    await self._require_habit(name, user)
+                    await self._run(database.update_habit, name, description, periodicity, write=True, user=user)
+                    return 200, {"name": name}
+                if method == "DELETE":
+                    await self._require_habit(name, user)
+                    await self._run(database.delete_habit, name, write=True, user=user)
+                    return 200, {"name": name}
+            elif path[2:] == ["completions"]:
+                await self._require_habit(name, user)
+                if method == "GET":
+                    dates, _ = await self._run(database.get_completion_page, name, query.get("since"),
+                                               query.get("until"), int(query.get("limit", 100)), True, user=user)
+                    return 200, dates
+                if method == "POST":
+                    completion_date = data.get("date") or datetime.now().isoformat()
+                    datetime.fromisoformat(completion_date) # reject invalid dates before writing
+                    await self._run(database.add_completion_date, name, completion_date, write=True, user=user)
+                    return 201, {"name": name, "completion_date": completion_date}
+            elif path[2:] == ["streak"] and method == "GET":
+                details = await self._run(analyze.streak_details, name, user=user)
+                if details is None:
+                    raise HttpError(404, f"No habit found with the name '{name}'")
+                return 200, details
+            else:
+                raise HttpError(404, "unknown route")
+            raise HttpError(405, f"{method} is not allowed here")
+
+        if path == ["streaks"] and method == "GET":
+            return 200, await self._run(analyze.longest_streaks, user=user)
+        if path == ["streaks", "longest"] and method == "GET":
+            streak, name = await self._run(analyze.longest_historical_streak, user=user)
+            return 200, {"name": name, "longest_streak": streak}
+        if path == ["stats"] and method == "GET":
+            if not querystats.is_enabled():
+                raise HttpError(404, "the query statistics are not enabled, start the server with --stats")
+            return 200, querystats.stats()
+        raise HttpError(404, "unknown route")
+
+    async def _require_habit(self, name, user):
+        """ raises a 404 error if the user has no habit with this name """
+        if await self._run(database.get_habit_id, name, user=user) is None:
+            raise HttpError(404, f"No habit found with the name '{name}'")
+
+
+def _fields(data, *names):
+    """ required fields of a JSON body, raises a 400 error if one is missing """
+    missing = [name for name in names if not data.get(name)]
+    if missing:
+        raise HttpError(400, f"missing field(s): {', '.join(missing)}")
+    if "periodicity" in names:
+        try:
+            parse_periodicity(data["periodicity"])
+        except ValueError as e:
+            raise HttpError(400, str(e)) from None
+    return [data[name] for name in names]
+
+
+@contextmanager
+def serve_in_thread(db_name=database.DEFAULT_DB, host="127.0.0.1", port=0, readers=READER_THREADS,
+                    group_commit=False):
+    """
+    Runs a HabitServer in a background thread, for tests and benchmarks.
+    :returns: context manager yielding the base URL of the server
+    """
+    loop = asyncio.new_event_loop()
+    server = HabitServer(db_name, host, port, readers, group_commit)
+    port = loop.run_until_complete(server.start())
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://{host}:{port}"
+    finally:
+        asyncio.run_coroutine_threadsafe(server.close(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+
+def main(argv=None):
+    """ runs the server until interrupted """
+    parser = argparse.ArgumentParser(description="Habit Grower HTTP/JSON API")
+    parser.add_argument("--db", default=database.DEFAULT_DB, help="database file (default: db/main.db)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--readers", type=int, default=READER_THREADS, help="number of reader threads")
+    parser.add_argument("--group-commit", action="store_true", help="commit the writes of a burst together")
+    parser.add_argument("--stats", action="store_true", help="time the SQL statements, served on GET /stats")
+    parser.add_argument("--slow-ms", type=float, help="log the SQL statements slower than this many milliseconds")
+    args = parser.parse_args(argv)
+
+    if args.stats or args.slow_ms is not None:
+        logging.basicConfig(format="%(asctime)s %(name)s %(message)s")
+        querystats.enable(None if args.slow_ms is None else args.slow_ms / 1000)
+
+    db = database.get_db(args.db)
+    database.use_calendar(db)
+    db.close()
+    server = HabitServer(args.db, args.host, args.port, args.readers, args.group_commit)
+
+    async def serve():
+        port = await server.start() # the port picked by the system with --port 0
+        print(f"Serving {args.db} on http://{args.host}:{port}")
+        await server.serve_forever()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
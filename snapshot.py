@@ -0,0 +1,213 @@
+"""
+Compact binary snapshot of the habits of a user, for batch analyses of the whole history.
+
+A snapshot holds the habits and the day numbers of their completions as packed 32-bit
+integers, one block per habit. It is read through mmap: opening it only parses the
+habits, and the days of a habit are a zero-copy slice of the file.
+
+    write_snapshot(db, "habits.snap")
+    with Snapshot("habits.snap") as snapshot:
+        print(snapshot.longest_historical_streak())
+
+Layout, every block aligned on 8 bytes:
+    header      magic, format version, number of habits and the offsets of the blocks
+    days        completion day numbers, int32, habit after habit in date order
+    index       (first day, number of days) of each habit, int64 pairs
+    habits      JSON list of the habits, in the order of the index
+"""
+import json
+import mmap
+import struct
+import sys
+from array import array
+from itertools import groupby
+
+import periods
+from database import DEFAULT_USER, get_calendar
+from streaks import completion_periods, streak_summary
+
+MAGIC = b"HGSNAP\0\0"
+FORMAT_VERSION = 1
+
+# magic, format version, habits, offset of the days, index and habits blocks, length of the habits block
+HEADER = struct.Struct("<8sIIQQQQ")
+
+# Day numbers buffered before being written
+WRITE_BUFFER = 1 << 16
+
+HABIT_FIELDS = ("habit_name", "habit_description", "periodicity", "creation_date", "times_completed")
+
+
+def _align(f):
+    """ pads a file being written to a multiple of 8 bytes, returns the new offset """
+    padding = -f.tell() % 8
+    f.write(bytes(padding))
+    return f.tell()
+
+
+def write_snapshot(db, path, user=DEFAULT_USER):
+    """
+    Writes a snapshot of the habits and completions of a user, streaming the completions
+    in the order of the completions index.
+    :param db: connection object to interact with the SQLite database.
+    :param path(str): the file written
+    :param user(str): the user owning the habits
+    :returns:(dict) the number of habits and completions written
+    """
+    cur = db.cursor()
+    cur.execute("""
+        SELECT habit_name, habit_description, periodicity, creation_date, times_completed
+        FROM habits WHERE user_id = ? ORDER BY habit_name
+    """, (user,))
+    habits = cur.fetchall()
+    positions = {habit[0]: position for position, habit in enumerate(habits)}
+    index = array("q", bytes(16 * len(habits))) # first day and number of days of each habit
+
+    with open(path, "wb") as f:
+        f.write(bytes(HEADER.size))
+        days_offset = _align(f)
+
+        written = 0
+        buffer = array("i")
+        cur.execute("""
+            SELECT habit_name, completion_day FROM completions
+            WHERE user_id = ? ORDER BY habit_name, completion_day, completion_date, rowid
+        """, (user,))
+        for habit_name, rows in groupby(cur, key=lambda row: row[0]):
+            position = positions.get(habit_name)
+            if position is None:
+                continue # completions of a deleted habit
+            first = written + len(buffer)
+            buffer.extend(day for _, day in rows)
+            index[2 * position] = first
+            index[2 * position + 1] = written + len(buffer) - first
+            if len(buffer) >= WRITE_BUFFER:
+                buffer.tofile(f)
+                written += len(buffer)
+                buffer = array("i")
+        buffer.tofile(f)
+        written += len(buffer)
+
+        index_offset = _align(f)
+        index.tofile(f)
+        habits_offset = f.tell()
+        metadata = json.dumps({"byteorder": sys.byteorder, "calendar": get_calendar(db), "habits": habits}).encode()
+        f.write(metadata)
+
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(habits), days_offset, index_offset,
+                            habits_offset, len(metadata)))
+
+    return {"habits": len(habits), "completions": written}
+
+
+class Snapshot:
+    """
+    Read-only view of a snapshot file written by write_snapshot, mapped in memory.
+
+    Attributes:
+        path(str): the snapshot file.
+        habit_names(list): names of the habits, in alphabetical order.
+        calendar(tuple): (week_start, timezone) of the database, see periods.calendar.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._load()
+        except BaseException:
+            self._mmap.close()
+            raise
+
+    def _load(self):
+        """ parses the header and the habits, the days stay in the mapped file """
+        if len(self._mmap) < HEADER.size:
+            raise ValueError(f"'{self.path}' is not a habit snapshot")
+        magic, version, habits, days_offset, index_offset, habits_offset, habits_length = \
+            HEADER.unpack_from(self._mmap)
+        if magic != MAGIC:
+            raise ValueError(f"'{self.path}' is not a habit snapshot")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"'{self.path}' has snapshot format {version}, this version reads {FORMAT_VERSION}")
+
+        metadata = json.loads(self._mmap[habits_offset:habits_offset + habits_length])
+        if metadata["byteorder"] != sys.byteorder:
+            raise ValueError(f"'{self.path}' was written on a {metadata['byteorder']} endian machine")
+        self.calendar = tuple(metadata.get("calendar", (periods.MONDAY, "")))
+
+        view = memoryview(self._mmap)
+        self._days = view[days_offset:index_offset].cast("i")
+        self._index = view[index_offset:index_offset + 16 * habits].cast("q")
+        self._habits = {habit[0]: (position, dict(zip(HABIT_FIELDS, habit)))
+                        for position, habit in enumerate(metadata["habits"])}
+        self.habit_names = list(self._habits)
+
+    def close(self):
+        """ releases the mapped file, the views returned by days() must not be used afterwards """
+        self._days.release()
+        self._index.release()
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return len(self._habits)
+
+    def habit(self, habit_name):
+        """
+        Data of a habit.
+        :returns: dict with the habit_name, habit_description, periodicity, creation_date and
+                  times_completed of the habit, None if the habit is not in the snapshot
+        """
+        entry = self._habits.get(habit_name)
+        return None if entry is None else dict(entry[1])
+
+    def days(self, habit_name):
+        """
+        Day numbers of the completions of a habit in ascending order, without copying them.
+        :returns: memoryview of int32, empty if the habit is not in the snapshot
+        """
+        entry = self._habits.get(habit_name)
+        if entry is None:
+            return self._days[0:0]
+        first, count = self._index[2 * entry[0]], self._index[2 * entry[0] + 1]
+        return self._days[first:first + count]
+
+    def streaks(self, habit_name, backend=None):
+        """
+        Streaks of a habit computed from its completions.
+        :param backend: "numpy" or "python", defaults to streaks.BACKEND for histories of
+                        streaks.NUMPY_MIN_PERIODS completions or more and to "python" for shorter ones
+        :returns: (current_streak, longest_streak, last_period), (0, 0, None) without completions
+        """
+        habit = self._habits.get(habit_name)
+        if habit is None:
+            return 0, 0, None
+        if self.calendar != periods.calendar():
+            raise ValueError(f"'{self.path}' uses the calendar {self.calendar} and this process {periods.calendar()}, "
+                             f"configure it with periods.configure(*snapshot.calendar)")
+        return streak_summary(completion_periods(self.days(habit_name), habit[1]["periodicity"], backend), backend)
+
+    def longest_streaks(self, backend=None):
+        """
+        Longest historical streak of every habit.
+        :returns: dict mapping each habit name to its longest streak
+        """
+        return {habit_name: self.streaks(habit_name, backend)[1] for habit_name in self.habit_names}
+
+    def longest_historical_streak(self, backend=None):
+        """
+        Longest historical streak across all the habits, like analyze.longest_historical_streak.
+        :returns: (longest streak, habit name), (0, None) without habits
+        """
+        longest_streak, longest_streak_habit = 0, None
+        for habit_name, streak in self.longest_streaks(backend).items():
+            if streak > longest_streak:
+                longest_streak, longest_streak_habit = streak, habit_name
+        return longest_streak, longest_streak_habit
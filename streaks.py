@@ -0,0 +1,147 @@
+from importlib.util import find_spec
+
+from periods import parse_periodicity
+
+# NumPy is optional, the pure Python backend is used without it. It is only imported
+# the first time the numpy backend is used, importing it takes longer than the whole app.
+HAS_NUMPY = find_spec("numpy") is not None
+np = None
+
+# Backend used for long histories when none is given: "numpy" when NumPy is installed, else "python"
+BACKEND = "numpy" if HAS_NUMPY else "python"
+
+# Shorter histories, and iterables without a length, use the python backend when none is
+# given: below this size converting them to an array costs more than NumPy saves
+NUMPY_MIN_PERIODS = 256
+
+
+def completion_periods(days, periodicity, backend=None):
+    """
+    Maps the day numbers of a habit's completions to period indexes.
+    :param days: sequence of day numbers
+    :param periodicity: periodicity spec of the habit, see periods.parse_periodicity
+    :param backend: "numpy" for an int64 array, "python" for a list, see _backend for the default
+    :returns: the period indexes, in the same order as days
+    """
+    index = parse_periodicity(periodicity).index
+    if _backend(backend, days) == "numpy":
+        return index(np.asarray(days, dtype=np.int64)) # works element-wise
+    return [index(day) for day in days]
+
+
+def extend_streak(current_streak, longest_streak, last_period, period):
+    """
+    Updates the streak values of a habit with a new completion in O(1).
+    :param current_streak: streak ending at last_period
+    :param longest_streak: longest streak so far
+    :param last_period: period index of the latest completion, None if there is none
+    :param period: period index of the new completion
+    :returns: (current_streak, longest_streak, last_period) after the completion,
+              or None if the completion is older than last_period and a full recompute is needed
+    """
+    if last_period is None:
+        current_streak = 1
+    elif period == last_period:
+        return current_streak, longest_streak, last_period # same period, nothing changes
+    elif period == last_period + 1:
+        current_streak += 1
+    elif period > last_period:
+        current_streak = 1 # gap, a new streak starts
+    else:
+        return None # out of order
+
+    return current_streak, max(longest_streak, current_streak), period
+
+
+def _backend(backend, data=None):
+    """
+    resolve the backend name, failing early if NumPy was asked for but is missing.
+    Without a backend, BACKEND is used for data of NUMPY_MIN_PERIODS items or more and "python" otherwise.
+    """
+    global np
+    if backend is None:
+        backend = BACKEND if hasattr(data, "__len__") and len(data) >= NUMPY_MIN_PERIODS else "python"
+    if backend not in ("numpy", "python"):
+        raise ValueError(f"unknown backend {backend!r}, use 'numpy' or 'python'")
+    if backend == "numpy" and np is None:
+        if not HAS_NUMPY:
+            raise ImportError("the numpy backend needs NumPy to be installed")
+        import numpy as np
+    return backend
+
+
+def streak_summary(periods, backend=None):
+    """
+    Computes the streak values from the sorted period indexes of a habit's completions.
+    Several completions in the same period count once.
+    :param periods: iterable of period indexes in ascending order
+    :param backend: "numpy" or "python", see _backend for the default
+    :returns: (current_streak, longest_streak, last_period), (0, 0, None) without completions
+    """
+    if _backend(backend, periods) == "numpy":
+        starts, lengths = _runs_numpy(periods)
+        if not lengths.size:
+            return 0, 0, None
+        return int(lengths[-1]), int(lengths.max()), int(starts[-1] + lengths[-1] - 1)
+
+    summary = (0, 0, None)
+    for period in periods:
+        summary = extend_streak(*summary, period)
+    return summary
+
+
+def period_runs(periods, backend=None):
+    """
+    Run-length encoding of the sorted period indexes of a habit's completions:
+    every run of consecutive periods is returned as its first period and its length.
+    :param periods: iterable of period indexes in ascending order
+    :param backend: "numpy" or "python", see _backend for the default
+    :returns: list of (first_period, length) tuples, in ascending order
+    """
+    if _backend(backend, periods) == "numpy":
+        starts, lengths = _runs_numpy(periods)
+        return list(zip(starts.tolist(), lengths.tolist()))
+
+    runs = []
+    last_period = None
+    for period in periods:
+        if last_period is not None and period == last_period + 1:
+            runs[-1][1] += 1
+        elif last_period is None or period > last_period:
+            runs.append([period, 1]) # first completion or gap, a new run starts
+        last_period = period
+    return [tuple(run) for run in runs]
+
+
+def gap_lengths(periods, backend=None):
+    """
+    Lengths of the gaps (number of missed periods) between the runs of a habit's completions.
+    :param periods: iterable of period indexes in ascending order
+    :param backend: "numpy" or "python", see _backend for the default
+    :returns: list of gap lengths, one less than the number of runs
+    """
+    if _backend(backend, periods) == "numpy":
+        starts, lengths = _runs_numpy(periods)
+        return (starts[1:] - (starts[:-1] + lengths[:-1])).tolist()
+
+    runs = period_runs(periods, "python")
+    return [start - (previous_start + previous_length)
+            for (previous_start, previous_length), (start, _) in zip(runs, runs[1:])]
+
+
+def _runs_numpy(periods):
+    """
+    Vectorized run-length encoding with NumPy.
+    :returns: (starts, lengths) int64 arrays
+    """
+    periods = periods if isinstance(periods, np.ndarray) else np.fromiter(periods, dtype=np.int64)
+    if not periods.size:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty
+
+    # drop repeated periods, then split where the next period is not the following one
+    periods = periods[np.concatenate(([True], np.diff(periods) != 0))]
+    breaks = np.flatnonzero(np.diff(periods) != 1) + 1
+    starts = np.concatenate(([0], breaks))
+    ends = np.concatenate((breaks, [periods.size]))
+    return periods[starts], ends - starts
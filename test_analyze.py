@@ -1,7 +1,12 @@
 import sqlite3
 import pytest
+import database
+from datetime import datetime
 from analyze import (list_tracked_habits,list_habit_by_periodicity,
-                     longest_historical_streak_for_habit,longest_historical_streak)
+                     longest_historical_streak_for_habit,longest_historical_streak,
+                     longest_streaks, streak_details, completion_histogram,
+                     completion_rates, weekday_heatmap, rolling_counts, completion_trends,
+                     habit_summaries, refresh_summaries)
 from preload_data import preload_data
 
 # Set up the database path
@@ -56,4 +61,76 @@ def test_longest_historical_streak(db):
     with the historical longest streak among all tracked habits."""
     result_streak, result_habit = longest_historical_streak(db)
     assert result_streak == 20
-    assert result_habit == "Exercise"
\ No newline at end of file
+    assert result_habit == "Exercise"
+
+def test_longest_streaks(db):
+    """Test that longest_streaks returns the same streak as
+    longest_historical_streak_for_habit for every habit in one pass."""
+    result = longest_streaks(db)
+    assert set(result) == set(list_tracked_habits(db))
+    for habit_name, streak in result.items():
+        assert streak == longest_historical_streak_for_habit(db, habit_name)
+    assert result["Code"] == 10
+    assert result["Guitar Practice"] == 1
+
+def test_streak_details_for_code(db):
+    """Test streak_details for the "Code" habit: 5 days, 5 days missed, then 10 days until today"""
+    result = streak_details(db, "Code")
+    assert result["current_streak"] == 10
+    assert result["longest_streak"] == 10
+    assert [length for _, length in result["runs"]] == [5, 10]
+    assert result["gaps"] == [5]
+    assert streak_details(db, "Unknown") is None
+
+def test_completion_histogram(db):
+    """Test completion_histogram: Exercise is completed once on each of its 20 days"""
+    assert completion_histogram(db, "Exercise") == {1: 20}
+    assert completion_histogram(db, "Unknown") == {}
+
+def test_completion_rates(db):
+    """Test completion_rates: share of the last periods with a completion, for every habit at once"""
+    rates = completion_rates(db, periods=7)
+    assert rates["Exercise"] == 1.0 # completed each of the last 7 days
+    assert rates["Meditate"] == 2 / 7 # completed 1 and 3 days ago
+    assert completion_rates(db, periods=4)["Guitar Practice"] == 0.5 # 2 of the last 4 weeks
+
+def test_weekday_heatmap(db):
+    """Test weekday_heatmap: completions per day of the week"""
+    heatmap = weekday_heatmap(db)
+    assert set(heatmap) == {"Exercise", "Read", "Meditate", "Guitar Practice", "Code"}
+    assert sum(heatmap["Exercise"]) == 20
+    assert min(heatmap["Exercise"]) == 2 # 20 consecutive days cover every weekday
+    assert sum(1 for count in heatmap["Read"] if count) == 1 # always the same weekday
+
+def test_rolling_counts(db):
+    """Test rolling_counts: completions over the last 7 and 30 days"""
+    counts = rolling_counts(db, windows=(7, 30))
+    assert counts["Code"] == {7: 7, 30: 15}
+    assert counts["Meditate"] == {7: 2, 30: 4}
+
+def test_completion_trends(db):
+    """Test completion_trends: Code was completed 10 times in the last 10 days and 5 times before"""
+    trends = completion_trends(db, periods=10)
+    assert trends["Code"] == {"recent": 10, "previous": 5, "trend": 5}
+    assert trends["Exercise"]["trend"] == 0
+
+def test_refresh_summaries(db, tmp_path):
+    """ test that refresh_summaries reads only the habits changed since the version of the summaries """
+    version, summaries = habit_summaries(db)
+    assert set(summaries) == {"Exercise", "Read", "Meditate", "Guitar Practice", "Code"}
+    assert summaries["Exercise"]["longest_streak"] == longest_historical_streak_for_habit(db, "Exercise")
+    assert habit_summaries(db, version) == (version, {})
+
+    copy = sqlite3.connect(str(tmp_path / "copy.db"))
+    db.backup(copy) # keep the shared test data unchanged
+    database.add_completion_date(copy, "Read", "2030-01-01T08:00:00")
+    database.delete_habit(copy, "Code")
+    database.add_habit(copy, "Walk", "Walk the dog", "daily", datetime(2030, 1, 1))
+
+    assert set(habit_summaries(copy, version)[1]) == {"Read", "Code", "Walk"}
+    version = refresh_summaries(copy, summaries, version)
+    assert version == database.get_data_version(copy)
+    assert summaries == habit_summaries(copy)[1]
+    assert summaries["Read"]["times_completed"] == database.get_habit_data(copy, "Read")[4]
+    assert "Code" not in summaries
+    copy.close()
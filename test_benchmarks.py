@@ -0,0 +1,67 @@
+import inspect
+import sqlite3
+import subprocess
+import sys
+import analyze
+import database
+from benchmarks.generator import completion_rows, habit_rows, populate
+from benchmarks.suite import run, scenarios
+from periods import period_index
+
+
+def test_generator_is_deterministic():
+    """ the same seed generates the same data """
+    habits = [(name, periodicity) for name, _, periodicity, _ in habit_rows(20, seed=3)]
+    assert habits == [(name, periodicity) for name, _, periodicity, _ in habit_rows(20, seed=3)]
+    assert list(completion_rows(habits, 500, seed=3)) == list(completion_rows(habits, 500, seed=3))
+    assert list(completion_rows(habits, 500, seed=3)) != list(completion_rows(habits, 500, seed=4))
+
+def test_generator_counts_and_order():
+    """ the completions are spread over the habits, in ascending order for each habit """
+    habits = [("a", "daily"), ("b", "weekly"), ("c", "daily")]
+    rows = list(completion_rows(habits, 100, gap_probability=0.5))
+    assert len(rows) == 100
+    for name, _ in habits:
+        dates = [date for habit_name, date in rows if habit_name == name]
+        assert len(dates) in (33, 34)
+        assert dates == sorted(dates)
+
+def test_populate():
+    """ populate fills the tables and the streak cache """
+    db = sqlite3.connect(":memory:")
+    database.create_table(db)
+    habits = populate(db, habits=10, completions=1000, gap_probability=0, repeat_probability=0)
+    assert len(habits) == 10
+    assert db.execute("SELECT COUNT(*) FROM completions").fetchone()[0] == 1000
+    name, periodicity = habits[0]
+    days = database.get_completion_days(db, name)
+    periods = sorted({period_index(day, periodicity) for day in days})
+    assert database.get_habit_data(db, name)[7] == len(periods) == 100 # no gaps: one long streak
+    db.close()
+
+def test_suite_runs():
+    """ a small run of the suite times every scenario """
+    report = run(habits=5, completions=100, only="database.get_habit_")
+    assert report["meta"]["habits"] == 5
+    assert set(report["results"]) == {"database.get_habit_data", "database.get_habit_id", "database.get_habit_info",
+                                      "database.get_habit_periods"}
+    for result in report["results"].values():
+        assert 0 <= result["min_ms"] <= result["mean_ms"]
+
+def test_suite_covers_the_public_functions():
+    """ every public function of analyze.py and database.py has a scenario, apart from the connection helpers """
+    untimed = {"database.get_db", "database.get_readonly_db", "database.configure", "database.get_pool",
+               "database.connection", "database.close_pools", "database.migrate", "database.use_calendar"}
+    timed = {name.split(" ")[0] for name, _, _ in scenarios([("Exercise", "daily")], seed=0)}
+    for module in (analyze, database):
+        for name, function in inspect.getmembers(module, inspect.isfunction):
+            qualified = f"{module.__name__}.{name}"
+            if not name.startswith("_") and function.__module__ == module.__name__ and qualified not in untimed:
+                assert qualified in timed
+
+def test_import_database_stays_light():
+    """ importing database.py doesn't load the modules that made the app start slowly """
+    heavy = ("numpy", "urllib.request", "http.client", "concurrent.futures", "logging", "tkinter")
+    code = f"import sys, database; print([name for name in {heavy!r} if name in sys.modules])"
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    assert output.strip() == "[]"
@@ -0,0 +1,90 @@
+import threading
+import pytest
+import database
+from cache import HabitCache
+from datetime import datetime
+
+
+@pytest.fixture
+def db(tmp_path):
+    """ connection to a new database file with one habit """
+    db = database.get_db(str(tmp_path / "cache.db"))
+    database.add_habit(db, "Exercise", "Daily workout", "daily", datetime(2024, 1, 1))
+    yield db
+    db.close()
+
+def test_reads_are_memoized(db):
+    """ Test that repeated reads are answered from the cache and counted """
+    cache = HabitCache()
+    for _ in range(3):
+        assert cache.get_habit_data(db, "Exercise")[0] == "Exercise"
+        assert cache.list_tracked_habits(db) == ["Exercise"]
+        assert cache.longest_historical_streak_for_habit(db, "Exercise") == 0
+    assert cache.stats() == {"hits": 6, "misses": 3, "hit_rate": 6 / 9, "entries": 2}
+
+def test_writes_invalidate_their_habit(db):
+    """ Test that each write drops exactly the cached values it changes """
+    cache = HabitCache()
+    database.add_habit(db, "Reading", "Read a book", "weekly", datetime(2024, 1, 1))
+    cache.get_habit_data(db, "Reading")
+    cache.get_habit_data(db, "Exercise")
+    cache.list_tracked_habits(db)
+
+    cache.add_completion_date(db, "Exercise", "2024-01-01T08:00:00")
+    cache.add_completion_date(db, "Exercise", "2024-01-02T08:00:00")
+    misses = cache.misses
+    assert cache.get_habit_data(db, "Exercise")[4] == 2
+    assert cache.longest_historical_streak_for_habit(db, "Exercise") == 2
+    cache.get_habit_data(db, "Reading")
+    cache.list_tracked_habits(db)
+    assert cache.misses == misses + 2 # the other habit and the list were kept
+
+    cache.update_habit(db, "Exercise", "Morning workout", "weekly")
+    assert cache.get_habit_data(db, "Exercise")[1:3] == ("Morning workout", "weekly")
+    assert cache.longest_historical_streak_for_habit(db, "Exercise") == 1
+
+    assert cache.get_habit_data(db, "Walking") is None
+    cache.add_habit(db, "Walking", "Walk the dog", "daily", datetime(2024, 1, 1))
+    assert cache.get_habit_data(db, "Walking")[0] == "Walking"
+    assert cache.list_tracked_habits(db) == ["Exercise", "Reading", "Walking"]
+
+    cache.delete_habit(db, "Reading")
+    assert cache.get_habit_data(db, "Reading") is None
+    assert cache.list_tracked_habits(db) == ["Exercise", "Walking"]
+
+def test_users_and_size_limit(db):
+    """ Test that the entries are per user and that the least recently used ones are evicted """
+    cache = HabitCache(size=2)
+    database.add_habit(db, "Exercise", "Her workout", "weekly", datetime(2024, 1, 1), user="alice")
+    assert cache.get_habit_data(db, "Exercise")[1] == "Daily workout"
+    assert cache.get_habit_data(db, "Exercise", user="alice")[1] == "Her workout"
+
+    cache.get_habit_data(db, "Exercise") # most recently used
+    cache.list_tracked_habits(db) # evicts alice's habit
+    misses = cache.misses
+    cache.get_habit_data(db, "Exercise")
+    assert cache.misses == misses
+    cache.get_habit_data(db, "Exercise", user="alice")
+    assert cache.misses == misses + 1
+    assert cache.stats()["entries"] == 2
+
+def test_stale_reads_are_not_cached(db):
+    """ Test that a value loaded while a write invalidated the cache is not kept """
+    cache = HabitCache()
+    loading = threading.Event()
+    resume = threading.Event()
+
+    def slow_load(db, habit_name, user):
+        loading.set()
+        resume.wait(5)
+        return "stale"
+
+    reader = threading.Thread(target=cache._get, args=(("default", "Exercise"), "data", slow_load, None,
+                                                        "Exercise", "default"))
+    reader.start()
+    assert loading.wait(5)
+    cache.invalidate("Exercise")
+    resume.set()
+    reader.join()
+    assert cache.stats()["entries"] == 0
+    assert cache.get_habit_data(db, "Exercise")[0] == "Exercise"
@@ -1,6 +1,7 @@
 import sqlite3
 import pytest
 import database
+from periods import day_number
 from datetime import datetime, timedelta
 
 # File path for the test database
@@ -19,6 +20,8 @@ def db():
     cur = db.cursor()
     cur.execute("DROP TABLE IF EXISTS Habits")
     cur.execute("DROP TABLE IF EXISTS Completions")
+    cur.execute("DROP TABLE IF EXISTS habit_periods")
+    cur.execute("DROP TABLE IF EXISTS habit_changes")
     database.create_table(db) # create the tables
 
     yield db
@@ -126,4 +129,341 @@ def test_delete_habit(db):
     habit_data = database.get_habit_data(db, habit_name)
     completions= database.get_completion_data(db, habit_name)
     assert habit_data is None
-    assert completions == []
\ No newline at end of file
+    assert completions == []
+
+def test_completions_index(db):
+    """
+    Test that create_table adds the (user_id, habit_name, completion_date) index used by the per-habit lookups
+    """
+    cur = db.cursor()
+    cur.execute("SELECT name FROM sqlite_master WHERE type='index' AND tbl_name='completions'")
+    assert ("idx_completions_habit_date",) in cur.fetchall()
+
+    # the lookup of one habit's completions should use the index instead of a full scan
+    cur.execute("EXPLAIN QUERY PLAN SELECT completion_date FROM completions WHERE user_id = ? AND habit_name = ?",
+                (database.DEFAULT_USER, "Exercise"))
+    plan = " ".join(row[-1] for row in cur.fetchall())
+    assert "idx_completions_habit_date" in plan
+
+def test_get_habit_id(db):
+    """
+    Test that every habit gets its own integer id
+    """
+    first_id = database.add_habit(db, "Exercise", "Daily workout", "daily", datetime.now())
+    second_id = database.add_habit(db, "Read", "Read a book", "weekly", datetime.now())
+
+    assert database.get_habit_id(db, "Exercise") == first_id
+    assert database.get_habit_id(db, "Read") == second_id
+    assert first_id != second_id
+    assert database.get_habit_id(db, "Unknown") is None
+
+def test_get_habit_info(db):
+    """
+    Test that the habit info is returned by column name, with the cached streaks
+    """
+    database.add_habit(db, "Exercise", "Daily workout", "daily", datetime(2024, 1, 1))
+    database.add_completions_bulk(db, [("Exercise", "2024-01-01T08:00:00"), ("Exercise", "2024-01-02T08:00:00")])
+
+    assert database.get_habit_info(db, "Exercise") == {
+        "name": "Exercise", "description": "Daily workout", "periodicity": "daily",
+        "creation_date": "2024-01-01T00:00:00", "times_completed": 2, "current_streak": 2, "longest_streak": 2}
+    assert database.get_habit_info(db, "Unknown") is None
+
+def test_migrate_old_schema():
+    """
+    Test that a database created by the first version of the app is upgraded without losing data
+    """
+    db = sqlite3.connect(":memory:")
+    cur = db.cursor()
+    cur.execute("""CREATE TABLE habits(habit_name TEXT PRIMARY KEY, habit_description TEXT NOT NULL,
+                   periodicity TEXT NOT NULL, creation_date TEXT NOT NULL, times_completed INTEGER DEFAULT 0)""")
+    cur.execute("CREATE TABLE completions(habit_name TEXT, completion_date TEXT NOT NULL)")
+    creation_date = datetime.now().isoformat()
+    cur.execute("INSERT INTO habits VALUES ('Exercise', 'Daily workout', 'daily', ?, 1)", (creation_date,))
+    cur.execute("INSERT INTO completions VALUES ('Exercise', ?)", (creation_date,))
+    db.commit()
+
+    database.create_table(db)
+
+    assert db.execute("PRAGMA user_version").fetchone()[0] == database.SCHEMA_VERSION
+    assert database.get_habit_data(db, "Exercise")[:5] == ("Exercise", "Daily workout", "daily", creation_date, 1)
+    assert database.get_habit_id(db, "Exercise") is not None
+    assert database.get_completion_data(db, "Exercise") == [(creation_date,)]
+    assert database.get_habit_data(db, "Exercise")[6:8] == (1, 1) # streak cache is filled
+    assert database.get_completion_days(db, "Exercise") == [day_number(creation_date)] # day numbers are backfilled
+    assert database.get_changed_habits(db, 0) == (1, ["Exercise"]) # the existing habits are in the change log
+    assert database.get_habit_periods(db, "Exercise") == [(day_number(creation_date), 1)] # rollup is filled
+    db.close()
+
+def test_durability_modes(tmp_path):
+    """
+    Test that the pools apply the journal and synchronous settings of their durability mode
+    """
+    for durability, journal_mode, synchronous in (("full", "delete", 2), ("wal", "wal", 2), ("normal", "wal", 1)):
+        pool = database.ConnectionPool(str(tmp_path / f"{durability}.db"), durability=durability)
+        with pool.connection() as db:
+            assert db.execute("PRAGMA journal_mode").fetchone()[0] == journal_mode
+            assert db.execute("PRAGMA synchronous").fetchone()[0] == synchronous
+        pool.close()
+    with pytest.raises(ValueError):
+        database.configure(sqlite3.connect(":memory:"), "unknown")
+
+def test_group_commit(tmp_path):
+    """
+    Test that the group committer writes from several threads, and that a failing write
+    is undone alone without losing the other writes of its group
+    """
+    path = str(tmp_path / "group.db")
+    committer = database.GroupCommitter(path, window=0.01)
+    committer.write(database.add_habit, "Exercise", "Daily workout", "daily", datetime(2024, 1, 1))
+
+    futures = [committer.submit(database.add_completion_date, "Exercise", f"2024-01-{day:02d}T08:00:00")
+               for day in range(1, 11)]
+    duplicate = committer.submit(database.add_habit, "Exercise", "Again", "daily", datetime(2024, 1, 1))
+    bulk = committer.submit(database.add_completions_bulk, [("Exercise", "2024-01-11"), ("Exercise", "not a date")])
+    futures.append(committer.submit(database.add_completion_date, "Exercise", "2024-01-11T08:00:00"))
+    assert [future.result() for future in futures] == [None] * 11
+    assert isinstance(duplicate.exception(), sqlite3.IntegrityError)
+    assert isinstance(bulk.exception(), ValueError)
+    committer.close()
+
+    db = sqlite3.connect(path)
+    habit_data = database.get_habit_data(db, "Exercise")
+    assert habit_data[4] == 11 # the failed bulk insert left nothing behind
+    assert habit_data[6:8] == (11, 11)
+    assert len(database.get_completion_data(db, "Exercise")) == 11
+    db.close()
+
+def test_users_are_isolated(db):
+    """
+    Test that habits with the same name belong to different users without mixing their completions
+    """
+    database.add_habit(db, "Exercise", "Daily workout", "daily", datetime.now(), user="alice")
+    database.add_habit(db, "Exercise", "Morning run", "daily", datetime.now(), user="bob")
+    with pytest.raises(sqlite3.IntegrityError):
+        database.add_habit(db, "Exercise", "Again", "daily", datetime.now(), user="alice")
+
+    database.add_completion_date(db, "Exercise", "2024-03-01T08:00:00", user="alice")
+    database.add_completions_bulk(db, [("Exercise", datetime(2024, 3, day)) for day in (1, 2, 3)], user="bob")
+    assert database.get_habit_data(db, "Exercise", user="alice")[4] == 1
+    assert database.get_habit_data(db, "Exercise", user="bob")[6:8] == (3, 3)
+    assert database.get_habit_data(db, "Exercise") is None # nothing for the default user
+
+    database.delete_habit(db, "Exercise", user="bob")
+    assert database.get_completion_data(db, "Exercise", user="bob") == []
+    assert database.get_completion_data(db, "Exercise", user="alice") == [("2024-03-01T08:00:00",)]
+
+def test_shard_router(tmp_path):
+    """
+    Test that the router always sends a user to the same shard and spreads users over the shards
+    """
+    router = database.ShardRouter([str(tmp_path / f"shard{i}.db") for i in range(4)])
+    users = [f"user{i}" for i in range(40)]
+    assert [router.db_name(user) for user in users] == [router.db_name(user) for user in users]
+    assert len({router.db_name(user) for user in users}) == 4
+
+    with router.connection("alice") as db:
+        database.add_habit(db, "Exercise", "Daily workout", "daily", datetime.now(), user="alice")
+    with database.connection(router.db_name("alice")) as db:
+        assert database.get_habit_id(db, "Exercise", user="alice") is not None
+    database.close_pools()
+
+def test_connection_pool_reuses_connections(tmp_path):
+    """
+    Test that the pool creates the tables on first use and hands back the same connection
+    """
+    pool = database.ConnectionPool(str(tmp_path / "pool.db"), size=2)
+    with pool.connection() as first:
+        cur = first.cursor()
+        cur.execute("SELECT name FROM sqlite_master WHERE type='table'")
+        assert ("habits",) in cur.fetchall()
+        assert cur.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+        # nested use in the same thread gets the same connection
+        with pool.connection() as nested:
+            assert nested is first
+
+    with pool.connection() as second:
+        assert second is first # the idle connection is reused, not reopened
+    pool.close()
+
+def test_connection_pool_rollback(tmp_path):
+    """
+    Test that the changes of a failing block are rolled back
+    """
+    pool = database.ConnectionPool(str(tmp_path / "pool.db"))
+    with pytest.raises(RuntimeError):
+        with pool.connection() as db:
+            db.execute("INSERT INTO habits(habit_name, habit_description, periodicity, creation_date) "
+                       "VALUES ('Exercise', 'Daily workout', 'daily', '2024-01-01')")
+            raise RuntimeError("failure in the middle of the block")
+
+    with pool.connection() as db:
+        assert database.get_habit_data(db, "Exercise") is None
+    pool.close()
+
+def test_add_habits_bulk(db):
+    """
+    Test that many habits can be added at once from a generator
+    """
+    creation_date = datetime.now()
+    rows = ((f"Habit {i}", "Bulk habit", "daily", creation_date) for i in range(50))
+
+    assert database.add_habits_bulk(db, rows) == 50
+    habit_data = database.get_habit_data(db, "Habit 7")
+    assert habit_data[:5] == ("Habit 7", "Bulk habit", "daily", creation_date.isoformat(), 0)
+
+def test_add_completions_bulk(db):
+    """
+    Test that bulk completions are stored and times_completed is updated once per habit
+    """
+    database.add_habit(db, "Exercise", "Daily workout", "daily", datetime.now())
+    database.add_habit(db, "Read", "Read a book", "weekly", datetime.now())
+    dates = [datetime.now() - timedelta(days=i) for i in range(10)]
+    rows = [("Exercise", date) for date in dates] + [("Read", dates[0].isoformat())]
+
+    assert database.add_completions_bulk(db, iter(rows)) == 11
+    assert database.get_completion_data(db, "Exercise") == [(date.isoformat(),) for date in dates]
+    assert database.get_habit_data(db, "Exercise")[4] == 10
+    assert database.get_habit_data(db, "Read")[4] == 1
+
+def test_add_completions_bulk_rollback(db):
+    """
+    Test that a failing bulk insert leaves the database unchanged
+    """
+    database.add_habit(db, "Exercise", "Daily workout", "daily", datetime.now())
+    rows = [("Exercise", datetime.now().isoformat()), ("Exercise", "not a date")] # invalid date is rejected
+
+    with pytest.raises(ValueError):
+        database.add_completions_bulk(db, rows)
+    assert database.get_completion_data(db, "Exercise") == []
+    assert database.get_habit_data(db, "Exercise")[4] == 0
+
+def test_streak_cache(db):
+    """
+    Test that add_completion_date keeps the cached streaks up to date
+    """
+    database.add_habit(db, "Exercise", "Daily workout", "daily", datetime.now())
+    today = datetime(2024, 3, 10, 8, 0)
+    for days in (5, 4, 3, 1, 0, 0):
+        database.add_completion_date(db, "Exercise", (today - timedelta(days=days)).isoformat())
+
+    # columns 6 to 8 hold current_streak, longest_streak and last_period_index
+    assert database.get_habit_data(db, "Exercise")[6:8] == (2, 3)
+
+    # an older completion closes the gap and falls back to a full recompute
+    database.add_completion_date(db, "Exercise", (today - timedelta(days=2)).isoformat())
+    assert database.get_habit_data(db, "Exercise")[6:8] == (6, 6)
+
+    # deleting a completion recomputes the streaks
+    assert database.delete_completion_date(db, "Exercise", (today - timedelta(days=3)).isoformat())
+    habit_data = database.get_habit_data(db, "Exercise")
+    assert habit_data[4] == 6
+    assert habit_data[6:8] == (3, 3)
+
+def test_habit_periods_rollup(db):
+    """
+    Test that the habit_periods rollup follows the inserts and deletes of completions
+    """
+    habit_id = database.add_habit(db, "Exercise", "Daily workout", "daily", datetime.now())
+    database.add_completion_date(db, "Exercise", "2024-03-01T08:00:00")
+    database.add_completion_date(db, "Exercise", "2024-03-01T20:00:00")
+    database.add_completions_bulk(db, [("Exercise", datetime(2024, 3, 2, 8)), ("Exercise", datetime(2024, 3, 1, 9))])
+    first_day = day_number("2024-03-01")
+    assert database.get_habit_periods(db, "Exercise") == [(first_day, 3), (first_day + 1, 1)]
+
+    # the period stays while it has completions, the streaks only change when it disappears
+    assert database.delete_completion_date(db, "Exercise", "2024-03-01T20:00:00")
+    assert database.get_habit_periods(db, "Exercise") == [(first_day, 2), (first_day + 1, 1)]
+    assert database.delete_completion_date(db, "Exercise", "2024-03-02T08:00:00")
+    assert database.get_habit_periods(db, "Exercise") == [(first_day, 2)]
+    assert database.get_habit_data(db, "Exercise")[6:8] == (1, 1)
+    assert not database.delete_completion_date(db, "Exercise", "2024-03-02T08:00:00")
+
+    database.update_habit(db, "Exercise", "Weekly workout", "weekly")
+    assert database.get_habit_periods(db, "Exercise") == [((first_day + 3) // 7, 2)]
+
+    database.delete_habit(db, "Exercise")
+    assert db.execute("SELECT COUNT(*) FROM habit_periods WHERE habit_id = ?", (habit_id,)).fetchone()[0] == 0
+
+def test_update_habit_recomputes_streaks(db):
+    """
+    Test that changing the periodicity recomputes the cached streaks
+    """
+    database.add_habit(db, "Read", "Read a book", "daily", datetime.now())
+    monday = datetime(2024, 1, 1)
+    database.add_completions_bulk(db, [("Read", monday), ("Read", monday + timedelta(days=8))])
+    assert database.get_habit_data(db, "Read")[7] == 1
+
+    database.update_habit(db, "Read", "Read a book every week", "weekly")
+    habit_data = database.get_habit_data(db, "Read")
+    assert habit_data[1:3] == ("Read a book every week", "weekly")
+    assert habit_data[6:8] == (2, 2)
+
+def test_rebuild_streak_cache(db):
+    """
+    Test that rebuild_streak_cache repairs a corrupted cache
+    """
+    database.add_habit(db, "Exercise", "Daily workout", "daily", datetime.now())
+    database.add_completions_bulk(db, (("Exercise", datetime(2024, 1, day)) for day in range(1, 6)))
+    assert database.rebuild_streak_cache(db) == [] # bulk insert kept the cache correct
+
+    db.execute("UPDATE habits SET current_streak = 0, longest_streak = 99")
+    db.execute("DELETE FROM habit_periods")
+    assert database.rebuild_streak_cache(db) == ["Exercise"]
+    assert database.get_habit_data(db, "Exercise")[6:8] == (5, 5)
+
+def test_get_completion_days(db):
+    """
+    Test that the day number of each completion is stored next to the ISO date
+    """
+    database.add_habit(db, "Exercise", "Daily workout", "daily", datetime.now())
+    database.add_completion_date(db, "Exercise", "2024-01-02T21:30:00")
+    database.add_completions_bulk(db, [("Exercise", datetime(2024, 1, 1, 7, 0))])
+
+    # days are returned in date order, whatever the insertion order
+    assert database.get_completion_days(db, "Exercise") == [19723, 19724]
+
+def test_iter_completions(db):
+    """
+    Test that the paged iteration returns every completion, in order, across batches
+    """
+    database.add_habit(db, "Exercise", "Daily workout", "daily", datetime.now())
+    dates = [f"2024-01-{day:02d}T08:00:00" for day in (1, 2, 2, 3, 4, 5, 5, 6, 7)] # with duplicates
+    database.add_completions_bulk(db, [("Exercise", date) for date in reversed(dates)])
+
+    assert list(database.iter_completions(db, "Exercise", batch=2)) == dates
+    assert list(database.iter_completions(db, "Exercise", batch=4, reverse=True)) == dates[::-1]
+
+    # since is inclusive, until is exclusive
+    in_range = list(database.iter_completions(db, "Exercise", since="2024-01-02", until=datetime(2024, 1, 5), batch=3))
+    assert in_range == dates[1:5]
+    assert database.count_completions(db, "Exercise", since="2024-01-02", until=datetime(2024, 1, 5)) == 4
+    assert database.count_completions(db, "Exercise") == 9
+
+    for batch in (0, -1):
+        with pytest.raises(ValueError):
+            database.get_completion_page(db, "Exercise", batch=batch)
+
+def test_change_log(db):
+    """
+    Test that every write gives the habits it changes a new version of the change log
+    """
+    assert database.get_data_version(db) == 0
+    database.add_habit(db, "Exercise", "Daily workout", "daily", datetime(2024, 1, 1))
+    database.add_habit(db, "Read", "Read a book", "weekly", datetime(2024, 1, 1))
+    database.add_habit(db, "Read", "Her book", "weekly", datetime(2024, 1, 1), user="alice")
+    version, changed = database.get_changed_habits(db, 0)
+    assert changed == ["Exercise", "Read"]
+    assert version == database.get_data_version(db) == 3
+
+    database.add_completion_date(db, "Exercise", "2024-01-01T08:00:00")
+    database.add_completions_bulk(db, [("Exercise", "2024-01-02T08:00:00"), ("Exercise", "2024-01-03T08:00:00")])
+    assert database.get_changed_habits(db, version) == (database.get_data_version(db), ["Exercise"])
+    version = database.get_data_version(db)
+    assert database.get_changed_habits(db, version) == (version, []) # nothing changed since
+
+    database.update_habit(db, "Read", "Read two books", "weekly")
+    database.delete_habit(db, "Exercise")
+    assert database.get_changed_habits(db, version)[1] == ["Read", "Exercise"]
+    assert database.get_changed_habits(db, version, user="alice")[1] == []
@@ -92,3 +92,51 @@ def test_habit_info(daily_habit):
 
     # checks if the info returned by the habit_info method matches the expected dictionary
     assert info == expected_info
+
+
+def test_load(db):
+    """Test that Habit.load hydrates a habit without writing and fetches completions lazily"""
+    creation_date = datetime(2024, 1, 1, 9, 30)
+    database.add_habit(db, "Loaded habit", "A loaded habit", "weekly", creation_date)
+    database.add_completion_date(db, "Loaded habit", "2024-01-02T10:00:00")
+
+    habit = Habit.load(db, "Loaded habit")
+    assert habit.creation_date == creation_date
+    assert habit.times_completed == 1
+    assert habit._completion_dates is None # not fetched yet
+    assert habit.completion_dates == ["2024-01-02T10:00:00"]
+    assert Habit.load(db, "Unknown habit") is None
+
+    # check_off writes to the connection the habit was loaded from
+    habit.check_off()
+    assert len(database.get_completion_data(db, "Loaded habit")) == 2
+    assert not hasattr(habit, "__dict__") # compact representation
+
+def test_load_all(db):
+    """Test that Habit.load_all returns every habit from one query"""
+    database.add_habits_bulk(db, [("B habit", "second", "daily", datetime.now()),
+                                  ("A habit", "first", "weekly", datetime.now())])
+    habits = Habit.load_all(db)
+    assert [habit.name for habit in habits] == ["A habit", "B habit"]
+    assert all(habit._completion_dates is None for habit in habits)
+
+def test_loaded_check_streak_reads_rollup(db):
+    """Test that check_streak on a loaded habit uses the per-period rollup without fetching the dates"""
+    database.add_habit(db, "Loaded daily habit", "A loaded habit", "daily", datetime(2024, 1, 1))
+    database.add_completions_bulk(db, [("Loaded daily habit", datetime(2024, 1, day, hour))
+                                       for day in (1, 3, 4, 5) for hour in (8, 20)])
+
+    habit = Habit.load(db, "Loaded daily habit")
+    assert habit.check_streak() == 3
+    assert habit._completion_dates is None # the completion dates were not fetched
+
+def test_loaded_check_off_stays_lazy(db):
+    """Test that check_off on a loaded habit doesn't fetch the completion dates"""
+    database.add_habit(db, "Loaded daily habit", "A loaded habit", "daily", datetime(2024, 1, 1))
+    database.add_completion_date(db, "Loaded daily habit", "2024-01-02T10:00:00")
+
+    habit = Habit.load(db, "Loaded daily habit")
+    habit.check_off()
+    assert habit._completion_dates is None
+    assert habit.times_completed == 2
+    assert len(habit.completion_dates) == 2 # the new completion is fetched with the others
@@ -0,0 +1,76 @@
+import json
+import subprocess
+import sys
+import pytest
+import habitgrower
+
+
+@pytest.fixture
+def run(tmp_path, capsys):
+    """ runs a habitgrower command on a new database file, returns (exit status, parsed JSON output) """
+    db_path = str(tmp_path / "cli.db")
+
+    def run(*args):
+        status = habitgrower.main(["--db", db_path, "--json", *args])
+        out, err = capsys.readouterr()
+        return status, json.loads(out or err)
+    return run
+
+def test_add_complete_and_info(run):
+    """ a habit can be created, completed and shown """
+    status, habit = run("add", "Exercise", "--description", "Daily workout", "--periodicity", "daily")
+    assert status == 0 and habit["name"] == "Exercise"
+
+    for date in ("2024-01-01T08:00:00", "2024-01-02T08:00:00"):
+        assert run("complete", "Exercise", "--date", date)[0] == 0
+
+    status, info = run("info", "Exercise", "--limit", "1")
+    assert status == 0
+    assert info["times_completed"] == 2
+    assert info["longest_streak"] == 2
+    assert info["latest_completions"] == ["2024-01-02T08:00:00"]
+
+def test_list_and_streaks(run):
+    """ list and streaks report every habit """
+    run("add", "Exercise", "--description", "Daily workout", "--periodicity", "daily")
+    run("add", "Read", "--description", "Read a book", "--periodicity", "weekly")
+    run("complete", "Read", "--date", "2024-01-01T08:00:00")
+
+    assert run("list")[1] == ["Exercise", "Read"]
+    assert run("list", "--periodicity", "weekly")[1] == ["Read"]
+    assert run("streaks")[1] == {"Exercise": 0, "Read": 1}
+    assert run("streaks", "Read")[1]["runs"] == [[2818, 1]]
+
+def test_errors(run):
+    """ unknown habits and invalid dates exit with status 1 and a JSON error """
+    status, error = run("complete", "Unknown")
+    assert status == 1 and "Unknown" in error["error"]
+
+    run("add", "Exercise", "--description", "Daily workout", "--periodicity", "daily")
+    assert run("complete", "Exercise", "--date", "yesterday")[0] == 1
+    assert run("info", "Exercise", "--limit", "0")[0] == 1
+
+def test_export_and_import(run, tmp_path):
+    """ export writes the habits and completions to files that import reads back """
+    run("add", "Exercise", "--description", "Daily workout", "--periodicity", "daily")
+    run("complete", "Exercise", "--date", "2024-01-01T08:00:00")
+    files = ["--habits", str(tmp_path / "habits.csv"), "--completions", str(tmp_path / "completions.jsonl")]
+    status, result = run("export", *files)
+    assert status == 0 and (result["habits"], result["completions"]) == (1, 1)
+
+    status, result = run("--user", "alice", "import", *files)
+    assert status == 0 and (result["habits"], result["completions"]) == (1, 1)
+    assert run("--user", "alice", "info", "Exercise")[1]["times_completed"] == 1
+    assert run("import", "--habits", str(tmp_path / "missing.csv"), "--completions", "x.csv")[0] == 1
+
+    assert run("snapshot", str(tmp_path / "habits.snap"))[1] == {"habits": 1, "completions": 1}
+    assert run("report", "--workers", "1")[1] == {
+        "Exercise": {"current_streak": 1, "longest_streak": 1, "completed_periods": 1}}
+
+def test_does_not_import_tkinter(tmp_path):
+    """ the command line interface works without tkinter """
+    code = ("import sys, habitgrower; "
+            f"habitgrower.main(['--db', {str(tmp_path / 'cli.db')!r}, 'list']); "
+            "print('tkinter' in sys.modules)")
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    assert output.strip().splitlines()[-1] == "False"
@@ -0,0 +1,211 @@
+import subprocess
+import sys
+import pytest
+import analyze
+import database
+import habitgrower
+import periods
+import snapshot
+import streaks
+from datetime import date, datetime, timedelta, timezone
+from habit import Habit
+
+
+@pytest.fixture
+def calendar():
+    """ restores the default week start and timezone after the test """
+    yield periods
+    periods.configure()
+
+def test_weekday_and_iso_weeks():
+    """ the default weeks are ISO weeks, starting on Monday """
+    for day in range(-10, 800, 3):
+        d = date.fromordinal(periods.EPOCH_ORDINAL + day)
+        assert periods.weekday(day) == d.weekday()
+        monday = d - timedelta(days=d.weekday())
+        assert periods.week_index(day) == periods.week_index(periods.day_number(monday))
+        assert periods.week_index(day) - periods.week_index(periods.day_number(monday - timedelta(days=1))) == 1
+
+def test_week_start(calendar):
+    """ the weeks start on the configured day """
+    sunday = periods.day_number(date(2024, 1, 7))
+    assert periods.period_index(sunday, "weekly") == periods.period_index(sunday - 6, "weekly") # Monday
+    calendar.configure(week_start=periods.SUNDAY)
+    assert periods.period_index(sunday, "weekly") == periods.period_index(sunday + 6, "weekly") # Saturday
+    assert periods.period_index(sunday, "weekly") == periods.period_index(sunday - 1, "weekly") + 1
+    assert periods.period_index(sunday, "daily") == sunday
+    with pytest.raises(ValueError):
+        calendar.configure(week_start=7)
+
+def test_timezone(calendar):
+    """ completions dated with a UTC offset are counted on their day in the configured timezone """
+    late = "2024-01-01T23:30:00+00:00"
+    assert periods.day_number(late) == periods.day_number("2024-01-01")
+    calendar.configure(timezone="Europe/Berlin")
+    assert periods.day_number(late) == periods.day_number("2024-01-02")
+    assert periods.day_number(datetime(2024, 1, 1, 23, 30, tzinfo=timezone.utc)) == periods.day_number("2024-01-02")
+    assert periods.day_number("2024-01-01T23:30:00") == periods.day_number("2024-01-01") # local time as written
+    calendar.configure(timezone=timezone(timedelta(hours=-5)))
+    assert periods.day_number("2024-01-02T01:00:00Z") == periods.day_number("2024-01-01")
+
+def test_habit_and_cache_agree(calendar, tmp_path):
+    """ Habit.check_streak and the streak cache use the same weeks, whatever the week start """
+    db = database.get_db(str(tmp_path / "periods.db"))
+    habit = Habit._from_row(db, (("Read", "Read a book", "weekly", "2024-01-01T00:00:00", 0) + (None,) * 4
+                                 + (database.DEFAULT_USER,)))
+    database.add_habit(db, "Read", "Read a book", "weekly", datetime(2024, 1, 1))
+    # a Sunday then the next Monday: consecutive ISO weeks, the same week when weeks start on Sunday
+    for completion_date in ("2024-01-07T08:00:00", "2024-01-08T08:00:00"):
+        database.add_completion_date(db, "Read", completion_date)
+    habit.completion_dates = ["2024-01-07T08:00:00", "2024-01-08T08:00:00"]
+    assert habit.check_streak() == database.get_habit_data(db, "Read")[6] == 2
+
+    calendar.configure(week_start=periods.SUNDAY)
+    assert database.rebuild_streak_cache(db, convert=True) == ["Read"]
+    assert habit.check_streak() == database.get_habit_data(db, "Read")[6] == 1
+    db.close()
+
+def test_calendar_is_stored(calendar, tmp_path):
+    """ a database keeps its calendar: the programs use it, processes using another one can't write to it """
+    path = str(tmp_path / "sunday.db")
+    calendar.configure(week_start=periods.SUNDAY)
+    db = database.get_db(path)
+    database.add_habit(db, "Read", "Read a book", "weekly", datetime(2024, 1, 1))
+    for completion_date in ("2024-01-07T08:00:00", "2024-01-08T08:00:00"): # the same week from Sunday
+        database.add_completion_date(db, "Read", completion_date)
+    snapshot.write_snapshot(db, str(tmp_path / "sunday.snap"))
+    db.close()
+
+    # the repair command runs in a new process, which uses the calendar of the database
+    subprocess.run([sys.executable, database.__file__, path], capture_output=True, check=True)
+    calendar.configure() # Monday weeks
+    db = database.get_db(path)
+    assert periods.calendar() == (periods.MONDAY, "") # opening a database doesn't change the calendar
+    assert database.get_calendar(db) == (periods.SUNDAY, "")
+    assert database.get_habit_data(db, "Read")[6:8] == (1, 1)
+
+    with pytest.raises(ValueError):
+        database.add_completion_date(db, "Read", "2024-01-15T08:00:00")
+    with pytest.raises(ValueError):
+        database.rebuild_streak_cache(db)
+    sunday = snapshot.Snapshot(str(tmp_path / "sunday.snap"))
+    with pytest.raises(ValueError):
+        sunday.streaks("Read")
+    database.use_calendar(db)
+    assert periods.calendar() == sunday.calendar == (periods.SUNDAY, "")
+    assert sunday.streaks("Read")[:2] == (1, 1)
+
+    calendar.configure()
+    assert database.rebuild_streak_cache(db, convert=True) == ["Read"] # converted to Monday weeks
+    assert database.get_calendar(db) == (periods.MONDAY, "")
+    database.add_completion_date(db, "Read", "2024-01-15T08:00:00")
+    assert database.get_habit_data(db, "Read")[6:8] == (3, 3)
+    db.close()
+
+def test_convert_timezone(calendar, tmp_path, capsys):
+    """ rebuild-cache --timezone recomputes the day numbers of the completions, then the streaks """
+    path = str(tmp_path / "timezone.db")
+    calendar.configure()
+    db = database.get_db(path)
+    database.add_habit(db, "Read", "Read a book", "daily", datetime(2024, 1, 1))
+    for completion_date in ("2024-01-01T23:30:00+00:00", "2024-01-03T08:00:00+00:00"):
+        database.add_completion_date(db, "Read", completion_date)
+    assert database.get_habit_data(db, "Read")[6:8] == (1, 1)
+    db.close()
+
+    assert habitgrower.main(["--db", path, "rebuild-cache", "--timezone", "Europe/Berlin"]) == 0
+    db = database.get_db(path)
+    assert database.get_calendar(db) == (periods.MONDAY, "Europe/Berlin")
+    assert database.get_completion_days(db, "Read") == [periods.day_number(date(2024, 1, d)) for d in (2, 3)]
+    assert database.get_habit_data(db, "Read")[6:8] == (2, 2)
+    db.close()
+
+def test_days_out_of_text_order(calendar, tmp_path):
+    """ with a timezone, the streaks follow the day numbers, not the text order of the completion dates """
+    calendar.configure(timezone="UTC")
+    db = database.get_db(str(tmp_path / "order.db"))
+    database.add_habit(db, "Read", "Read a book", "daily", datetime(2024, 1, 1))
+    # the second date is 2024-01-06 in UTC, after the third one
+    completion_dates = ["2024-01-04T12:00:00+00:00", "2024-01-05T20:00:00-05:00", "2024-01-05T23:00:00+00:00"]
+    for completion_date in completion_dates:
+        database.add_completion_date(db, "Read", completion_date)
+    days = [periods.day_number(date(2024, 1, d)) for d in (4, 5, 6)]
+    assert database.get_completion_days(db, "Read") == days
+    assert database.get_habit_data(db, "Read")[6:8] == (3, 3)
+
+    habit = Habit("Read", "Read a book", "daily")
+    habit.completion_dates = completion_dates
+    assert habit.check_streak() == 3
+
+    snapshot.write_snapshot(db, str(tmp_path / "order.snap"))
+    with snapshot.Snapshot(str(tmp_path / "order.snap")) as snap:
+        assert list(snap.days("Read")) == days
+        for backend in ("python", "numpy"):
+            assert snap.streaks("Read", backend) == (3, 3, days[-1])
+    db.close()
+
+def test_parse_periodicity():
+    """ the periodicity specs are parsed to their canonical form, invalid ones are rejected """
+    for spec, canonical in (("Daily", "daily"), ("every 1 day", "daily"), ("every week", "weekly"),
+                            ("Mon-Fri", "weekdays"), ("every 3 days", "every 3 days"),
+                            ("every  2 week", "every 2 weeks"), ("monthly", "monthly")):
+        assert periods.parse_periodicity(spec).spec == canonical
+    for spec in ("yearly", "every 0 days", "every -2 days", "", None):
+        with pytest.raises(ValueError):
+            periods.parse_periodicity(spec)
+
+def test_period_indexes():
+    """ consecutive periods of every periodicity get consecutive indexes """
+    monday = periods.day_number(date(2024, 1, 1))
+    weekdays = [periods.period_index(monday + i, "weekdays") for i in range(10)]
+    assert weekdays == [weekdays[0] + i for i in (0, 1, 2, 3, 4, 4, 4, 5, 6, 7)] # the weekend counts for Friday
+
+    days = [periods.day_number(date(2024, 1, 1) + timedelta(days=i)) for i in range(9)]
+    assert [periods.period_index(day, "every 3 days") for day in days] == [
+        days[0] // 3 + (i + days[0] % 3) // 3 for i in range(9)]
+
+    assert periods.period_index(periods.day_number(date(2024, 1, 31)), "monthly") == 2024 * 12
+    assert periods.period_index(periods.day_number(date(2024, 2, 1)), "monthly") == 2024 * 12 + 1
+    for day in range(-800_000, 2_000_000, 997):
+        d = date.fromordinal(periods.EPOCH_ORDINAL + day) if day > -periods.EPOCH_ORDINAL else None
+        if d is not None:
+            assert periods.month_index(day) == d.year * 12 + d.month - 1
+
+@pytest.mark.skipif(not streaks.HAS_NUMPY, reason="NumPy is not installed")
+def test_period_indexes_numpy():
+    """ the period index functions work element-wise on NumPy arrays """
+    import numpy as np
+    days = np.arange(-3000, 3000)
+    for spec in ("daily", "weekly", "monthly", "weekdays", "every 3 days", "every 2 weeks"):
+        index = periods.parse_periodicity(spec).index
+        assert index(days).tolist() == [index(int(day)) for day in days]
+
+def test_habits_with_schedules(tmp_path):
+    """ the streak cache, Habit.check_streak and the analytics follow the periodicity of each habit """
+    db = database.get_db(str(tmp_path / "schedules.db"))
+    for name, periodicity in (("Gym", "every 3 days"), ("Work", "Mon-Fri"), ("Bills", "monthly")):
+        database.add_habit(db, name, name, periodicity, datetime(2023, 12, 1))
+    assert database.get_habit_data(db, "Work")[2] == "weekdays"
+    with pytest.raises(ValueError):
+        database.add_habit(db, "Sleep", "Sleep", "hourly", datetime(2023, 12, 1))
+
+    completions = {
+        "Gym": ["2024-01-01", "2024-01-04", "2024-01-07", "2024-01-13"], # one 3-day period missed
+        "Work": ["2024-01-04", "2024-01-05", "2024-01-08", "2024-01-09"], # Thursday to Tuesday
+        "Bills": ["2023-12-15", "2024-01-31", "2024-02-01", "2024-02-20"],
+    }
+    database.add_completions_bulk(db, ((name, f"{day}T08:00:00") for name, days in completions.items()
+                                       for day in days))
+    expected = {"Gym": (1, 3), "Work": (4, 4), "Bills": (3, 3)}
+    for name, streaks_ in expected.items():
+        assert database.get_habit_data(db, name)[6:8] == streaks_
+        habit = Habit._from_row(None, database.get_habit_data(db, name))
+        habit.completion_dates = [f"{day}T08:00:00" for day in completions[name]]
+        assert habit.check_streak() == streaks_[0]
+    assert database.rebuild_streak_cache(db) == []
+    assert analyze.list_habit_by_periodicity(db, "mon-fri") == ["Work"]
+
+    rates = analyze.completion_rates(db, 3, today=date(2024, 2, 20))
+    assert rates["Bills"] == 1.0 # December, January and February
+    assert analyze.completion_trends(db, 1, today=date(2024, 2, 20))["Bills"] == {"recent": 2, "previous": 1, "trend": 1}
+    db.close()
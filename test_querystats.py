@@ -0,0 +1,63 @@
+import logging
+import sqlite3
+import pytest
+import database
+import querystats
+from datetime import datetime
+
+
+@pytest.fixture
+def stats():
+    """ enables the instrumentation for one test, with an empty set of statistics """
+    querystats.reset()
+    querystats.enable()
+    yield querystats
+    querystats.disable()
+    querystats.reset()
+
+def statements(stats, prefix):
+    """ statistics of the recorded statements starting with prefix """
+    return [s for s in stats.stats() if s["statement"].startswith(prefix)]
+
+def test_disabled_connections_are_plain(tmp_path):
+    """ Test that the connections are not instrumented unless enabled """
+    assert not querystats.is_enabled()
+    db = database.get_db(str(tmp_path / "plain.db"))
+    assert type(db) is sqlite3.Connection
+    db.close()
+
+def test_counts_and_rows(tmp_path, stats):
+    """ Test that every execution and fetched row of a statement is counted """
+    db = database.get_db(str(tmp_path / "stats.db"))
+    database.add_habit(db, "Exercise", "Daily workout", "daily", datetime(2024, 1, 1))
+    database.add_completions_bulk(db, [("Exercise", f"2024-01-{day:02d}T08:00:00") for day in range(1, 11)])
+    for _ in range(3):
+        database.get_habit_data(db, "Exercise")
+    assert sum(1 for _ in database.iter_completions(db, "Exercise", batch=4)) == 10
+    db.close()
+
+    habit_data, = statements(stats, "SELECT * FROM habits WHERE user_id = ? AND habit_name = ?")
+    assert habit_data["count"] == 3
+    assert habit_data["rows"] == 3
+    assert habit_data["total_ms"] > 0
+    assert 0 < habit_data["p95_ms"] <= habit_data["total_ms"]
+
+    pages = statements(stats, "SELECT completion_date, completion_day, rowid FROM completions")
+    assert sum(s["count"] for s in pages) == 3 # pages of 4, 4 and 2 dates
+    assert sum(s["rows"] for s in pages) == 10
+
+    totals = [s["total_ms"] for s in stats.stats()]
+    assert totals == sorted(totals, reverse=True)
+    assert "SELECT * FROM habits" in stats.format_stats(stats.stats())
+
+def test_slow_query_log(tmp_path, stats, caplog):
+    """ Test that the executions over the threshold are logged once each, and that reset forgets them """
+    stats.enable(slow_threshold=0.0)
+    db = database.get_db(str(tmp_path / "slow.db"))
+    with caplog.at_level(logging.WARNING, logger="habitgrower.slow_queries"):
+        db.execute("SELECT 1").fetchall()
+    db.close()
+    assert [record.getMessage().endswith("SELECT 1") for record in caplog.records].count(True) == 1
+
+    stats.reset()
+    assert stats.stats() == []
@@ -0,0 +1,35 @@
+import sqlite3
+import pytest
+import analyze
+import database
+import reports
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_streak_report_matches_cache(habits_db, workers):
+    """ Test that the report of the worker processes matches the streak cache of every habit """
+    report = reports.streak_report(habits_db, workers, partition_size=7)
+    db = sqlite3.connect(habits_db)
+    assert list(report) == sorted(analyze.list_tracked_habits(db))
+    for habit_name, streaks in report.items():
+        habit_data = database.get_habit_data(db, habit_name)
+        assert (streaks["current_streak"], streaks["longest_streak"]) == habit_data[6:8]
+        assert streaks["completed_periods"] == len(database.get_habit_periods(db, habit_name))
+    assert report["Unused"] == {"current_streak": 0, "longest_streak": 0, "completed_periods": 0}
+    assert report["Commute"] == {"current_streak": 3, "longest_streak": 3, "completed_periods": 3}
+    assert reports.longest_historical_streak(habits_db, workers) == analyze.longest_historical_streak(db)
+    db.close()
+
+def test_partitions_and_users(habits_db):
+    """ Test that the partitions cover the habits of one user """
+    assert len(reports.partitions(habits_db, 12)) == 3
+    assert reports.streak_report(habits_db, 2, user="alice") == {
+        "Exercise": {"current_streak": 1, "longest_streak": 1, "completed_periods": 1}}
+    assert reports.streak_report(habits_db, 2, user="nobody") == {}
+
+def test_readonly_connection(habits_db):
+    """ Test that the workers' connections cannot write """
+    db = database.get_readonly_db(habits_db)
+    with pytest.raises(sqlite3.OperationalError):
+        db.execute("DELETE FROM habits")
+    db.close()
@@ -0,0 +1,74 @@
+import http.client
+import json
+import pytest
+import database
+from server import serve_in_thread
+
+
+@pytest.fixture
+def request_json(tmp_path):
+    """ sends requests to a server running on a new database file, returns (status, JSON body) """
+    with serve_in_thread(str(tmp_path / "server.db")) as url:
+        connection = http.client.HTTPConnection(url.split("//")[1])
+
+        def request_json(method, path, body=None, user=None):
+            headers = {"Content-Type": "application/json"}
+            if user is not None:
+                headers["X-User"] = user
+            connection.request(method, path, body=json.dumps(body) if body is not None else None,
+                               headers=headers)
+            response = connection.getresponse()
+            return response.status, json.loads(response.read())
+
+        yield request_json
+        connection.close()
+    database.close_pools()
+
+def test_habit_crud(request_json):
+    """ habits can be created, read, updated and deleted over HTTP """
+    status, body = request_json("POST", "/habits", {"name": "Morning run", "description": "Run 5k", "periodicity": "daily"})
+    assert status == 201 and body["name"] == "Morning run"
+    assert request_json("POST", "/habits", {"name": "Morning run", "description": "Again", "periodicity": "daily"})[0] == 409
+
+    status, habit = request_json("GET", "/habits/Morning%20run")
+    assert status == 200 and habit["description"] == "Run 5k" and habit["current_streak"] == 0
+
+    assert request_json("PUT", "/habits/Morning%20run", {"description": "Run 10k", "periodicity": "weekly"})[0] == 200
+    assert request_json("GET", "/habits?periodicity=weekly") == (200, ["Morning run"])
+
+    assert request_json("DELETE", "/habits/Morning%20run")[0] == 200
+    assert request_json("GET", "/habits/Morning%20run")[0] == 404
+    assert request_json("GET", "/habits") == (200, [])
+
+def test_completions_and_streaks(request_json):
+    """ completions posted over HTTP show up in the streak queries """
+    request_json("POST", "/habits", {"name": "Exercise", "description": "Daily workout", "periodicity": "daily"})
+    for day in (1, 2, 3):
+        assert request_json("POST", "/habits/Exercise/completions", {"date": f"2024-01-0{day}T08:00:00"})[0] == 201
+
+    assert request_json("GET", "/habits/Exercise/completions?limit=2") == (200, ["2024-01-03T08:00:00", "2024-01-02T08:00:00"])
+    assert request_json("GET", "/streaks") == (200, {"Exercise": 3})
+    assert request_json("GET", "/streaks/longest") == (200, {"name": "Exercise", "longest_streak": 3})
+    assert request_json("GET", "/habits/Exercise/streak")[1]["current_streak"] == 3
+
+def test_errors(request_json):
+    """ invalid requests get an error status and a JSON message """
+    assert request_json("POST", "/habits", {"name": "Exercise"})[0] == 400
+    assert request_json("POST", "/habits/Unknown/completions", {})[0] == 404
+    assert request_json("GET", "/unknown")[0] == 404
+    assert request_json("DELETE", "/habits")[0] == 405
+    request_json("POST", "/habits", {"name": "Exercise", "description": "Daily workout", "periodicity": "daily"})
+    status, body = request_json("POST", "/habits/Exercise/completions", {"date": "not a date"})
+    assert status == 400 and "error" in body
+    assert request_json("GET", "/habits/Exercise/completions?limit=0")[0] == 400
+
+def test_users(request_json):
+    """ each user named by the X-User header only sees their own habits """
+    habit = {"name": "Read", "description": "Read a book", "periodicity": "daily"}
+    assert request_json("POST", "/habits", habit, user="alice")[0] == 201
+    assert request_json("POST", "/habits", habit, user="bob")[0] == 201 # same name, other user
+    assert request_json("POST", "/habits/Read/completions", {"date": "2024-01-01T08:00:00"}, user="alice")[0] == 201
+
+    assert request_json("GET", "/habits/Read", user="alice")[1]["times_completed"] == 1
+    assert request_json("GET", "/habits/Read", user="bob")[1]["times_completed"] == 0
+    assert request_json("GET", "/habits") == (200, []) # the default user has no habits
@@ -0,0 +1,52 @@
+import pytest
+import database
+import snapshot
+import streaks
+
+
+def test_snapshot_matches_database(habits_db, tmp_path):
+    """ Test that a snapshot holds every habit with its completion days and streaks """
+    db = database.get_db(habits_db)
+    path = str(tmp_path / "habits.snap")
+    assert snapshot.write_snapshot(db, path) == {"habits": 34, "completions": 3012}
+
+    with snapshot.Snapshot(path) as snap:
+        assert len(snap) == 34
+        assert snap.habit_names == sorted(snap.habit_names)
+        for habit_name in snap.habit_names:
+            habit_data = database.get_habit_data(db, habit_name)
+            assert snap.habit(habit_name) == dict(zip(snapshot.HABIT_FIELDS, habit_data[:5]))
+            assert list(snap.days(habit_name)) == database.get_completion_days(db, habit_name)
+            assert snap.streaks(habit_name, "python") == tuple(habit_data[6:9])
+        assert list(snap.days("Unused")) == [] and snap.streaks("Unused") == (0, 0, None)
+        assert snap.streaks("Review")[:2] == (1, 3) # January to March, then May
+        assert snap.habit("Missing") is None and list(snap.days("Missing")) == []
+        assert snap.longest_historical_streak("python") == max(
+            (streak, name) for name, streak in snap.longest_streaks("python").items())
+        assert snap.longest_streaks("python") == {name: database.get_habit_data(db, name)[7]
+                                                  for name in snap.habit_names}
+    db.close()
+
+@pytest.mark.skipif(not streaks.HAS_NUMPY, reason="NumPy is not installed")
+def test_numpy_backend(habits_db, tmp_path):
+    """ Test that the NumPy backend reads the mapped days to the same streaks """
+    path = str(tmp_path / "habits.snap")
+    db = database.get_db(habits_db)
+    snapshot.write_snapshot(db, path)
+    db.close()
+    with snapshot.Snapshot(path) as snap:
+        assert snap.longest_streaks("numpy") == snap.longest_streaks("python")
+
+def test_users_and_bad_files(habits_db, tmp_path):
+    """ Test that a snapshot holds one user's habits, and that other files are rejected """
+    path = str(tmp_path / "alice.snap")
+    db = database.get_db(habits_db)
+    assert snapshot.write_snapshot(db, path, user="alice") == {"habits": 1, "completions": 1}
+    db.close()
+    with snapshot.Snapshot(path) as snap:
+        assert snap.habit_names == ["Exercise"]
+        assert snap.streaks("Exercise") == (1, 1, database.day_number("2024-01-01"))
+
+    (tmp_path / "other.snap").write_bytes(b"not a snapshot" * 10)
+    with pytest.raises(ValueError):
+        snapshot.Snapshot(str(tmp_path / "other.snap"))
@@ -0,0 +1,87 @@
+import random
+import pytest
+import streaks
+from datetime import date, datetime
+from periods import day_number, period_index
+from streaks import extend_streak, streak_summary, completion_periods, period_runs, gap_lengths
+
+
+def test_day_number():
+    """ day numbers count days since 1970-01-01, the time of the day is ignored """
+    assert day_number("1970-01-01T00:00:00") == 0
+    assert day_number("1970-01-02T23:59:59.999999") == 1
+    assert day_number(datetime(2024, 1, 1, 23, 59)) == day_number(date(2024, 1, 1)) == 19723
+    assert day_number("1969-12-31") == -1
+
+def test_period_index_daily():
+    """ a daily period is the day itself """
+    assert period_index(19723, "daily") == 19723
+
+def test_period_index_weekly():
+    """ weeks start on Monday """
+    monday = day_number(date(2024, 1, 1))
+    week = period_index(monday, "weekly")
+    assert period_index(monday + 6, "weekly") == week # Sunday
+    assert period_index(monday + 7, "weekly") == week + 1 # next Monday
+    assert period_index(monday - 1, "weekly") == week - 1
+
+def test_extend_streak():
+    """ test the O(1) update of the streak values """
+    assert extend_streak(0, 0, None, 10) == (1, 1, 10) # first completion
+    assert extend_streak(1, 1, 10, 10) == (1, 1, 10) # same period
+    assert extend_streak(1, 1, 10, 11) == (2, 2, 11) # next period
+    assert extend_streak(2, 2, 11, 13) == (1, 2, 13) # gap
+    assert extend_streak(2, 2, 11, 9) is None # out of order
+
+def test_streak_summary():
+    """ test the streak values computed from a full history """
+    assert streak_summary([]) == (0, 0, None)
+    assert streak_summary([1, 2, 2, 3, 7, 8]) == (2, 3, 8)
+    assert streak_summary([4]) == (1, 1, 4)
+
+def random_histories(count=200, seed=7):
+    """ seeded random sorted period histories, including empty ones and repeats """
+    rng = random.Random(seed)
+    for _ in range(count):
+        period = rng.randint(-1000, 1000)
+        history = []
+        for _ in range(rng.randint(0, 60)):
+            period += rng.choice((0, 1, 1, 1, 2, 3, 10))
+            history.append(period)
+        yield history
+
+def test_runs_match_streak_summary():
+    """ property: the runs, gaps and streak values always agree with each other """
+    for history in random_histories():
+        runs = period_runs(history, "python")
+        current, longest, last = streak_summary(history, "python")
+        assert sum(length for _, length in runs) == len(set(history))
+        assert current == (runs[-1][1] if runs else 0)
+        assert longest == max((length for _, length in runs), default=0)
+        assert last == (runs[-1][0] + runs[-1][1] - 1 if runs else None)
+        assert all(gap > 0 for gap in gap_lengths(history, "python"))
+        assert len(gap_lengths(history, "python")) == max(len(runs) - 1, 0)
+
+def test_numpy_backend_matches_python():
+    """ property: the NumPy backend returns the same results as the pure Python one """
+    np = pytest.importorskip("numpy")
+    for history in random_histories():
+        for function in (streak_summary, period_runs, gap_lengths):
+            assert function(np.asarray(history, dtype=np.int64), "numpy") == function(history, "python")
+        assert list(completion_periods(history, "weekly", "numpy")) == completion_periods(history, "weekly", "python")
+
+def test_default_backend_by_size(monkeypatch):
+    """ without a backend, only the histories of NUMPY_MIN_PERIODS periods or more use BACKEND """
+    monkeypatch.setattr(streaks, "BACKEND", "numpy")
+    monkeypatch.setattr(streaks, "HAS_NUMPY", False) # so choosing numpy fails loudly
+    monkeypatch.setattr(streaks, "np", None)
+    assert streak_summary([1, 2, 3]) == (3, 3, 3)
+    assert streak_summary(iter(range(1000))) == (1000, 1000, 999) # no length, python
+    assert completion_periods([7, 8], "daily") == [7, 8]
+    with pytest.raises(ImportError):
+        streak_summary(list(range(streaks.NUMPY_MIN_PERIODS)))
+
+def test_unknown_backend():
+    """ an unknown backend name is rejected """
+    with pytest.raises(ValueError):
+        streak_summary([1, 2], backend="fortran")
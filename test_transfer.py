@@ -0,0 +1,58 @@
+import pytest
+import database
+import transfer
+
+
+def table(db, sql):
+    return db.execute(sql).fetchall()
+
+def count(db, table_name):
+    return db.execute(f"SELECT COUNT(*) FROM {table_name} WHERE user_id = 'default'").fetchone()[0]
+
+@pytest.mark.parametrize("extension", ["csv", "jsonl"])
+def test_round_trip(habits_db, tmp_path, extension):
+    """ Test that exporting and importing a database gives back the same habits, completions and streaks """
+    source = database.get_db(habits_db)
+    habits, completions = str(tmp_path / f"habits.{extension}"), str(tmp_path / f"completions.{extension}")
+    habit_count, completion_count = count(source, "habits"), count(source, "completions")
+    assert transfer.export_habits(source, habits)["rows"] == habit_count == 34
+    assert transfer.export_completions(source, completions)["rows"] == completion_count == 3012
+
+    target = database.get_db(str(tmp_path / "target.db"))
+    reports = []
+    assert transfer.import_habits(target, habits)["rows"] == habit_count
+    report = transfer.import_completions(target, completions, chunk_size=300, progress=reports.append)
+    assert report["rows"] == completion_count and report["rows_per_second"] > 0
+    assert [r["rows"] for r in reports] == [300, 600, 900, 1200, 1500, 1800, 2100, 2400, 2700, 3000, 3012]
+
+    for sql in ("SELECT habit_name, habit_description, periodicity, creation_date, times_completed, "
+                "current_streak, longest_streak, last_period_index FROM habits WHERE user_id = 'default' "
+                "ORDER BY habit_name",
+                "SELECT habit_name, completion_date, completion_day FROM completions WHERE user_id = 'default' "
+                "ORDER BY habit_name, completion_date",
+                "SELECT h.habit_name, p.period_index, p.count FROM habits h JOIN habit_periods p "
+                "ON p.habit_id = h.habit_id WHERE h.user_id = 'default' ORDER BY 1, 2"):
+        assert table(target, sql) == table(source, sql)
+    assert database.rebuild_streak_cache(target) == [] # the streaks were extended in order
+    target.close()
+    source.close()
+
+def test_users_and_errors(habits_db, tmp_path):
+    """ Test that a transfer works on one user's habits, and that bad files are rejected """
+    source = database.get_db(habits_db)
+    habits = str(tmp_path / "alice.csv")
+    transfer.export_habits(source, habits, user="alice")
+    target = database.get_db(str(tmp_path / "target.db"))
+    transfer.import_habits(target, habits, user="bob")
+    assert database.get_habit_data(target, "Exercise", "bob")[1] == "Her workout, \"daily\""
+
+    with pytest.raises(ValueError):
+        transfer.export_habits(source, str(tmp_path / "habits.xml"))
+    (tmp_path / "bad.csv").write_text("name,date\nExercise,2024-01-01\n")
+    with pytest.raises(ValueError):
+        transfer.import_completions(target, str(tmp_path / "bad.csv"))
+    (tmp_path / "bad.jsonl").write_text('{"habit_name": "Exercise"}\n')
+    with pytest.raises(ValueError):
+        transfer.import_completions(target, str(tmp_path / "bad.jsonl"))
+    target.close()
+    source.close()
@@ -0,0 +1,85 @@
+import threading
+import time
+import pytest
+import database
+from datetime import datetime
+from worker import DatabaseWorker
+
+
+@pytest.fixture
+def worker(tmp_path):
+    """ worker on a new database file """
+    worker = DatabaseWorker(str(tmp_path / "worker.db"))
+    yield worker
+    worker.shutdown()
+    database.close_pools()
+
+def wait(worker, timeout=5):
+    """ processes the results like the GUI poll loop until every job is delivered """
+    deadline = time.monotonic() + timeout
+    while worker.busy and time.monotonic() < deadline:
+        worker.process_results()
+        time.sleep(0.01)
+    assert not worker.busy
+
+def test_submit_read_and_write(worker):
+    """ writes run on the writer thread and the callbacks get the results in the calling thread """
+    results = []
+    callback_threads = []
+
+    def on_done(result):
+        results.append(result)
+        callback_threads.append(threading.current_thread())
+
+    worker.submit(database.add_habit, "Exercise", "Daily workout", "daily", datetime.now(), write=True)
+    wait(worker)
+    worker.submit(database.get_habit_data, "Exercise", on_done=on_done)
+    wait(worker)
+
+    assert results[0][0] == "Exercise"
+    assert callback_threads == [threading.current_thread()]
+
+def test_errors_go_to_on_error(worker):
+    """ an exception in a job is delivered to on_error """
+    errors = []
+    worker.submit(database.add_habit, "Exercise", "Daily workout", "daily", datetime.now(), write=True)
+    worker.submit(database.add_habit, "Exercise", "Daily workout", "daily", datetime.now(), write=True,
+                  on_done=lambda _: errors.append(None), on_error=errors.append)
+    wait(worker)
+    assert len(errors) == 1 and isinstance(errors[0], Exception)
+
+def test_failing_callback_is_logged(worker, caplog):
+    """ a callback raising an exception doesn't stop the delivery of the next results """
+    def fail(result):
+        raise RuntimeError("callback failed")
+    results = []
+    worker.submit(database.get_completion_days, "Exercise", on_done=fail)
+    worker.submit(database.get_completion_days, "Exercise", on_done=results.append)
+    wait(worker)
+    assert results == [[]]
+    assert "callback failed" in caplog.text
+
+def test_superseded_jobs_are_dropped(worker):
+    """ only the latest job submitted with a key delivers its result """
+    started = threading.Event()
+    release = threading.Event()
+    results = []
+
+    def slow(db, value):
+        started.set()
+        release.wait(5)
+        return value
+
+    worker.submit(slow, "first", key="report", on_done=results.append)
+    started.wait(5)
+    worker.submit(lambda db: "second", key="report", on_done=results.append)
+    release.set()
+    wait(worker)
+    assert results == ["second"]
+
+def test_run_returns_a_future(worker):
+    """ run delivers through the future, with keyword arguments, and leaves process_results alone """
+    worker.run(database.add_habit, "Exercise", "Daily workout", "daily", datetime.now(), write=True,
+               user="alice").result(5)
+    assert worker.run(database.get_habit_id, "Exercise", user="alice").result(5) is not None
+    assert not worker.busy and worker.process_results() == 0
@@ -0,0 +1,165 @@
+"""
+Streaming import and export of the habits and completions of a user, as CSV or JSON Lines.
+
+The exports iterate over a cursor and the imports insert the rows one chunk at a time
+through the bulk insert path, one transaction per chunk, so the memory used does not
+depend on the size of the database:
+
+    export_completions(db, "completions.csv")
+    import_completions(other_db, "completions.csv", progress=print)
+
+The format is chosen by the file extension: .csv, or .jsonl / .ndjson for JSON Lines.
+CSV files start with a header row naming the fields.
+"""
+import csv
+import json
+import time
+from itertools import islice
+
+from database import DEFAULT_USER, add_completions_bulk, add_habits_bulk
+
+# Rows inserted per transaction by the imports
+CHUNK_SIZE = 50_000
+
+HABIT_FIELDS = ("habit_name", "habit_description", "periodicity", "creation_date")
+COMPLETION_FIELDS = ("habit_name", "completion_date")
+
+
+def file_format(path):
+    """
+    Format of a file, from its extension.
+    :returns:(str) "csv" or "jsonl"
+    """
+    if path.endswith(".csv"):
+        return "csv"
+    if path.endswith((".jsonl", ".ndjson")):
+        return "jsonl"
+    raise ValueError(f"Unknown file format of '{path}', use a .csv or .jsonl file")
+
+
+def _write_rows(path, fields, rows, fmt=None):
+    """ writes rows of tuples to a file, returns the number of rows written """
+    fmt = fmt or file_format(path)
+    written = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        if fmt == "csv":
+            writer = csv.writer(f)
+            writer.writerow(fields)
+            for row in rows:
+                writer.writerow(row)
+                written += 1
+        else:
+            for row in rows:
+                f.write(json.dumps(dict(zip(fields, row))) + "\n")
+                written += 1
+    return written
+
+
+def _read_rows(path, fields, fmt=None):
+    """ generator of the rows of a file as tuples of fields, read one line at a time """
+    fmt = fmt or file_format(path)
+    with open(path, newline="", encoding="utf-8") as f:
+        if fmt == "csv":
+            reader = csv.reader(f)
+            header = next(reader, None)
+            if header is None:
+                return
+            try:
+                positions = [header.index(field) for field in fields]
+            except ValueError:
+                raise ValueError(f"'{path}' must have the columns {', '.join(fields)}") from None
+            for row in reader:
+                if row:
+                    yield tuple(row[position] for position in positions)
+        else:
+            for number, line in enumerate(f, 1):
+                if line.strip():
+                    record = json.loads(line)
+                    try:
+                        yield tuple(record[field] for field in fields)
+                    except KeyError as e:
+                        raise ValueError(f"line {number} of '{path}' has no {e} field") from None
+
+
+def _import_rows(db, rows, insert, chunk_size, progress, user):
+    """ inserts rows one transaction per chunk, returns the transfer report """
+    start = time.perf_counter()
+    imported = 0
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        imported += insert(db, chunk, user)
+        if progress is not None:
+            progress(_report(imported, start))
+    return _report(imported, start)
+
+
+def _report(rows, start):
+    """ number of rows transferred since start, and the rate """
+    seconds = time.perf_counter() - start
+    return {"rows": rows, "seconds": seconds, "rows_per_second": rows / seconds if seconds else 0.0}
+
+
+def export_habits(db, path, fmt=None, user=DEFAULT_USER):
+    """
+    Writes the habits of a user to a file.
+    :param db: connection object to interact with the SQLite database.
+    :param path(str): the file written
+    :param fmt(str): "csv" or "jsonl", defaults to the format of the file extension
+    :param user(str): the user owning the habits
+    :returns:(dict) rows written, seconds and rows_per_second
+    """
+    start = time.perf_counter()
+    cur = db.cursor()
+    cur.execute("""
+        SELECT habit_name, habit_description, periodicity, creation_date
+        FROM habits WHERE user_id = ? ORDER BY habit_id
+    """, (user,))
+    return _report(_write_rows(path, HABIT_FIELDS, cur, fmt), start)
+
+def export_completions(db, path, fmt=None, user=DEFAULT_USER):
+    """
+    Writes the completions of a user to a file, in date order for each habit.
+    :param db: connection object to interact with the SQLite database.
+    :param path(str): the file written
+    :param fmt(str): "csv" or "jsonl", defaults to the format of the file extension
+    :param user(str): the user owning the habits
+    :returns:(dict) rows written, seconds and rows_per_second
+    """
+    start = time.perf_counter()
+    cur = db.cursor()
+    # in day order, so the import extends the streaks without recomputing them
+    cur.execute("""
+        SELECT habit_name, completion_date FROM completions
+        WHERE user_id = ? ORDER BY habit_name, completion_day, completion_date, rowid
+    """, (user,))
+    return _report(_write_rows(path, COMPLETION_FIELDS, cur, fmt), start)
+
+def import_habits(db, path, fmt=None, chunk_size=CHUNK_SIZE, progress=None, user=DEFAULT_USER):
+    """
+    Adds the habits of a file to the database, one transaction per chunk of rows.
+    :param db: connection object to interact with the SQLite database.
+    :param path(str): the file read
+    :param fmt(str): "csv" or "jsonl", defaults to the format of the file extension
+    :param chunk_size(int): rows per transaction
+    :param progress: called with the report of the rows imported so far after each chunk
+    :param user(str): the user owning the habits
+    :returns:(dict) rows imported, seconds and rows_per_second
+    """
+    return _import_rows(db, _read_rows(path, HABIT_FIELDS, fmt), add_habits_bulk, chunk_size, progress, user)
+
+def import_completions(db, path, fmt=None, chunk_size=CHUNK_SIZE, progress=None, user=DEFAULT_USER):
+    """
+    Adds the completions of a file to the database, one transaction per chunk of rows.
+    The habits must be imported first.
+    :param db: connection object to interact with the SQLite database.
+    :param path(str): the file read
+    :param fmt(str): "csv" or "jsonl", defaults to the format of the file extension
+    :param chunk_size(int): rows per transaction
+    :param progress: called with the report of the rows imported so far after each chunk
+    :param user(str): the user owning the habits
+    :returns:(dict) rows imported, seconds and rows_per_second
+    """
+    return _import_rows(db, _read_rows(path, COMPLETION_FIELDS, fmt), add_completions_bulk,
+                        chunk_size, progress, user)
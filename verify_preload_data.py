@@ -7,16 +7,13 @@ def verify_preload_data(db_path="db/preload_test_data.db"):
 
     # Query and print all data from the habit table
     print("Contents of habits table:")
-    cur.execute("SELECT * FROM habits")
-    habits = cur.fetchall()
-    for habit in habits :
+    # iterate over the cursor instead of fetching every row at once
+    for habit in cur.execute("SELECT * FROM habits"):
         print(habit)
 
     # Query and print all data from completions table
     print("\nContents of completions table:")
-    cur.execute("SELECT * FROM completions")
-    completions = cur.fetchall()
-    for completion in completions:
+    for completion in cur.execute("SELECT * FROM completions"):
         print(completion)
 
     # Close the database connection
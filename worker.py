@@ -0,0 +1,120 @@
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+import database
+from cache import CACHE_SIZE, HabitCache
+
+# Number of threads running read jobs, the writes always go through one writer thread
+READER_THREADS = 3
+
+
+class DatabaseWorker:
+    """
+    Runs database jobs in background threads so the GUI never waits for SQLite.
+
+    Reads run on a small thread pool, writes are serialized on a single writer thread.
+    Every job gets a pooled connection to the database as its first argument.
+    The results of submit are not delivered from the background threads: process_results has
+    to be called regularly from the GUI thread (with root.after), and it calls the callbacks there.
+    submit and process_results must both be called from that same thread. Callers with their
+    own event loop, such as the HTTP server, use run and wait for the future instead.
+
+    Attributes:
+        db_name(string): path of the database file used by the jobs.
+        cache(HabitCache): cache of the habit metadata and streaks of the database, its
+                           methods can be submitted as jobs.
+    """
+
+    def __init__(self, db_name=database.DEFAULT_DB, readers=READER_THREADS, cache_size=CACHE_SIZE):
+        self.db_name = db_name
+        self.cache = HabitCache(cache_size)
+        self._readers = ThreadPoolExecutor(readers, thread_name_prefix="db-reader")
+        self._writer = ThreadPoolExecutor(1, thread_name_prefix="db-writer")
+        self._results = queue.Queue() # finished jobs, waiting for process_results
+        self._latest = {} # key -> future of the latest job submitted with that key
+        self._pending = 0
+
+    @property
+    def busy(self):
+        """ True while some submitted jobs have not been processed yet """
+        return self._pending > 0
+
+    def submit(self, function, *args, write=False, key=None, on_done=None, on_error=None):
+        """
+        Runs function(db, *args) in the background.
+        :param function: the job, called with a pooled connection and args
+        :param write(bool): run on the writer thread
+        :param key: jobs submitted with the same key supersede each other, only the
+                    result of the latest one is delivered and older ones are cancelled if not started
+        :param on_done: called with the result, in the thread calling process_results
+        :param on_error: called with the exception if the job failed
+        :returns: the concurrent.futures.Future of the job
+        """
+        future = self.run(function, *args, write=write)
+        self._pending += 1
+
+        if key is not None:
+            previous = self._latest.get(key)
+            if previous is not None:
+                previous.cancel() # only possible while it is still queued
+            self._latest[key] = future
+
+        future.add_done_callback(lambda done: self._results.put((done, key, on_done, on_error)))
+        return future
+
+    def run(self, function, *args, write=False, **kwargs):
+        """
+        Runs function(db, *args, **kwargs) in the background, without going through process_results.
+        It can be called from any thread.
+        :param write(bool): run on the writer thread
+        :returns: the concurrent.futures.Future of the job
+        """
+        executor = self._writer if write else self._readers
+        return executor.submit(self._run, function, args, kwargs)
+
+    def _run(self, function, args, kwargs):
+        """ runs one job with a pooled connection, in a background thread """
+        with database.connection(self.db_name) as db:
+            return function(db, *args, **kwargs)
+
+    def process_results(self):
+        """
+        Calls the callbacks of the finished jobs, skipping cancelled and superseded ones.
+        A callback raising an exception is logged, the next jobs are still processed.
+        :returns:(int) number of finished jobs processed
+        """
+        processed = 0
+        while True:
+            try:
+                future, key, on_done, on_error = self._results.get_nowait()
+            except queue.Empty:
+                return processed
+            processed += 1
+            self._pending -= 1
+
+            if key is not None:
+                if self._latest.get(key) is not future:
+                    continue # superseded by a newer job with the same key
+                del self._latest[key]
+            if future.cancelled():
+                continue
+
+            try:
+                error = future.exception()
+                if error is not None:
+                    if on_error is not None:
+                        on_error(error)
+                elif on_done is not None:
+                    on_done(future.result())
+            except Exception:
+                # logging is only imported when a callback fails
+                import logging
+                logging.getLogger(__name__).exception("the callback of a database job failed")
+
+    def shutdown(self, cancel=True):
+        """
+        Waits for the running jobs.
+        :param cancel(bool): cancel the queued jobs, else run them first
+        """
+        self._readers.shutdown(wait=True, cancel_futures=cancel)
+        self._writer.shutdown(wait=True, cancel_futures=cancel)